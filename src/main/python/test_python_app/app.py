@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import yaml
 import os
@@ -9,9 +10,21 @@ from datetime import datetime
 
 from .controller.routes.v1 import operations, conversations, users, documents
 from .config.settings import Settings
-from .core.database import init_database, get_db_manager
+from .core import database
+from .core.database import init_database, init_async_database, get_db_manager
+from .core.http_client import PooledHTTPClient
+from .services.history_cache import HistoryCache
 from .services.llm_service import LLMService
-from .services.rag_service import RAGService
+from .services.message_index import MessageIndex
+from .services.providers import load_provider_configs_from_env
+from .services.pruned_engine import PrunedRetrievalEngine
+from .services.rag_service import STAGE_LEXICAL, STAGE_VECTOR, RAGService
+from .services.sparse_engine import SparseRetrievalEngine, sparse_engine_available
+from .services.vector_engine import HashingEmbedder, VectorRetrievalEngine, vector_engine_available
+from .services.response_cache import ResponseCache
+from .services.rate_limiter import RateLimiter
+from .services.summary_memory import SummaryMemory, MEMORY_MODES, MEMORY_SUMMARY
+from .services.resilience import RetryPolicy, CircuitBreaker
 from .models.schemas.request_schemas import HealthCheckResponse
 
 logging.basicConfig(
@@ -54,9 +67,84 @@ def load_settings() -> Settings:
         return Settings()
 
 
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def build_response_cache():
+    if not env_bool("LLM_CACHE_ENABLED"):
+        return None
+    
+    modes = [m.strip() for m in os.getenv("LLM_CACHE_MODES", "").split(",") if m.strip()]
+    return ResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+        sqlite_path=os.getenv("LLM_CACHE_SQLITE_PATH") or None,
+        modes=modes or None,
+        zero_temperature_only=env_bool("LLM_CACHE_ZERO_TEMPERATURE_ONLY")
+    )
+
+
+def build_llm_service() -> LLMService:
+    http_client = PooledHTTPClient(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")),
+        timeout=float(os.getenv("LLM_HTTP_TIMEOUT", "60")),
+        http2=env_bool("LLM_HTTP2")
+    )
+    
+    llm_provider = os.getenv("LLM_PROVIDER", "mock").lower()
+    llm_api_key = os.getenv("LLM_API_KEY")
+    fallback_providers = [p.strip().lower() for p in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(",") if p.strip()]
+    return LLMService(
+        provider=llm_provider,
+        api_key=llm_api_key,
+        http_client=http_client,
+        warmup_connections=int(os.getenv("LLM_HTTP_WARMUP_CONNECTIONS", "2")),
+        mock_stream_delay=float(os.getenv("LLM_MOCK_STREAM_DELAY", "0")),
+        response_cache=build_response_cache(),
+        coalesce_requests=env_bool("LLM_COALESCE_REQUESTS", default=True),
+        rate_limiter=RateLimiter(
+            requests_per_minute=float(os.getenv("LLM_RATE_LIMIT_RPM", "30")),
+            tokens_per_minute=float(os.getenv("LLM_RATE_LIMIT_TPM", "6000")),
+            initial_concurrency=int(os.getenv("LLM_CONCURRENCY_INITIAL", "4")),
+            max_concurrency=int(os.getenv("LLM_CONCURRENCY_MAX", "32")),
+            latency_target=float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "5"))
+        ),
+        retry_policy=RetryPolicy(
+            max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+        ),
+        circuit_breaker=CircuitBreaker(
+            name=llm_provider,
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+            recovery_timeout=float(os.getenv("LLM_BREAKER_RECOVERY_SECONDS", "30"))
+        ),
+        provider_configs=load_provider_configs_from_env([llm_provider] + fallback_providers),
+        fallback_providers=fallback_providers,
+        hedging_enabled=env_bool("LLM_HEDGING_ENABLED"),
+        hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05")),
+        hedge_initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "2"))
+    )
+
+
+async def poll_replica_lag(interval: float):
+    while True:
+        await asyncio.to_thread(database.db_manager.measure_replica_lag)
+        await database.async_db_manager.measure_replica_lag()
+        await asyncio.sleep(interval)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global settings
+    llm_service = None
+    lag_poller = None
     
     logger.info("Starting BOT GPT Backend...")
     
@@ -65,19 +153,112 @@ async def lifespan(app: FastAPI):
         logger.info(f"Port: {settings.server.port}")
         
         database_url = os.getenv("DATABASE_URL")
-        init_database(database_url)
+        sqlite_profile = os.getenv("SQLITE_PROFILE", "default")
+        replica_urls = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+        database.read_your_writes.window_seconds = float(os.getenv("READ_YOUR_WRITES_WINDOW_SECONDS", "5"))
+        init_database(
+            database_url,
+            sqlite_profile=sqlite_profile,
+            read_pool_size=int(os.getenv("SQLITE_READ_POOL_SIZE", "8")),
+            write_batch_size=int(os.getenv("SQLITE_WRITE_BATCH_SIZE", "64")),
+            replica_urls=replica_urls
+        )
+        await init_async_database(
+            database_url,
+            sqlite_profile=sqlite_profile,
+            read_pool_size=int(os.getenv("SQLITE_READ_POOL_SIZE", "8")),
+            replica_urls=replica_urls
+        )
+        if replica_urls:
+            lag_poller = asyncio.create_task(
+                poll_replica_lag(float(os.getenv("REPLICA_LAG_POLL_SECONDS", "5")))
+            )
         logger.info("Database initialized")
         
-        llm_provider = os.getenv("LLM_PROVIDER", "mock")
-        llm_api_key = os.getenv("LLM_API_KEY") or os.getenv("GROQ_API_KEY")
-        llm_service = LLMService(provider=llm_provider, api_key=llm_api_key)
+        llm_service = build_llm_service()
+        await llm_service.startup()
+        
+        cache_warm_file = os.getenv("LLM_CACHE_WARM_FILE")
+        if cache_warm_file and llm_service.response_cache is not None:
+            await llm_service.warm_response_cache(cache_warm_file)
+        
+        search_engine = os.getenv("RAG_SEARCH_ENGINE", "sql")
+        if search_engine not in ("sql", "pruned", "sparse", "vector", "hybrid"):
+            raise ValueError(f"Unknown RAG search engine: {search_engine}")
+        sparse_engine = None
+        vector_engine = None
+        pruned_engine = None
+        if search_engine == "pruned":
+            pruned_engine = PrunedRetrievalEngine(
+                max_bytes=int(os.getenv("RAG_PRUNED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+            )
+        elif search_engine == "sparse":
+            if sparse_engine_available():
+                sparse_engine = SparseRetrievalEngine(
+                    max_bytes=int(os.getenv("RAG_SPARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+                )
+            else:
+                logger.warning("RAG_SEARCH_ENGINE=sparse requires 'numpy' and 'scipy'. Using the SQL BM25 index.")
+        elif search_engine in ("vector", "hybrid"):
+            if vector_engine_available():
+                vector_engine = VectorRetrievalEngine(
+                    embedder=HashingEmbedder(dimensions=int(os.getenv("RAG_VECTOR_DIMENSIONS", "256"))),
+                    max_bytes=int(os.getenv("RAG_VECTOR_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    nprobe=int(os.getenv("RAG_VECTOR_NPROBE", "16")),
+                    min_similarity=float(os.getenv("RAG_VECTOR_MIN_SIMILARITY", "0.2"))
+                )
+            else:
+                logger.warning(f"RAG_SEARCH_ENGINE={search_engine} requires 'numpy'. Using the SQL BM25 index.")
+        rag_service = RAGService(
+            chunk_size=500,
+            chunk_overlap=50,
+            sparse_engine=sparse_engine,
+            vector_engine=vector_engine,
+            pruned_engine=pruned_engine,
+            hybrid=search_engine == "hybrid",
+            session_factory=get_db_manager().get_read_session,
+            stage_budgets={
+                STAGE_LEXICAL: float(os.getenv("RAG_LEXICAL_BUDGET_SECONDS", "1")),
+                STAGE_VECTOR: float(os.getenv("RAG_VECTOR_BUDGET_SECONDS", "1"))
+            },
+            fusion_candidates=int(os.getenv("RAG_FUSION_CANDIDATES", "20")),
+            rrf_k=int(os.getenv("RAG_RRF_K", "60"))
+        )
+        history_cache_bytes = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        history_cache = HistoryCache(max_bytes=history_cache_bytes) if history_cache_bytes > 0 else None
+        
+        memory_mode = os.getenv("CONVERSATION_MEMORY_MODE", "window")
+        if memory_mode not in MEMORY_MODES:
+            raise ValueError(f"Unknown conversation memory mode: {memory_mode}")
+        summary_memory = None
+        if memory_mode == MEMORY_SUMMARY:
+            summary_memory = SummaryMemory(
+                llm_service,
+                trigger_tokens=int(os.getenv("CONVERSATION_SUMMARY_TRIGGER_TOKENS", "2000")),
+                recent_tokens=int(os.getenv("CONVERSATION_SUMMARY_RECENT_TOKENS", "1500")),
+                max_summary_tokens=int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "400"))
+            )
         
-        rag_service = RAGService(chunk_size=500, chunk_overlap=50)
+        recall_turns = int(os.getenv("CONVERSATION_RECALL_TURNS", "2"))
+        message_index = None
+        if recall_turns > 0:
+            message_index = MessageIndex(
+                max_turns=recall_turns,
+                recall_tokens=int(os.getenv("CONVERSATION_RECALL_TOKENS", "1000"))
+            )
         
         from .controller.routes.v1.conversations import init_conversation_service
         from .controller.routes.v1.documents import init_rag_service
-        init_conversation_service(llm_service, rag_service)
+        init_conversation_service(
+            llm_service,
+            rag_service,
+            disconnect_policy=os.getenv("CONVERSATION_DISCONNECT_POLICY", "discard"),
+            history_cache=history_cache,
+            memory=summary_memory,
+            message_index=message_index
+        )
         init_rag_service(rag_service)
+        operations.init_operations(llm_service, history_cache, summary_memory, message_index, rag_service)
         
         logger.info("BOT GPT Backend started successfully")
     except Exception as err:
@@ -87,6 +268,14 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("Shutting down BOT GPT Backend...")
+    if lag_poller is not None:
+        lag_poller.cancel()
+    if llm_service is not None:
+        await llm_service.shutdown()
+    if database.async_db_manager is not None:
+        await database.async_db_manager.dispose()
+    if database.db_manager is not None:
+        database.db_manager.close()
 
 
 app = FastAPI(
@@ -132,12 +321,16 @@ async def health_check():
         db_status = "disconnected"
     
     llm_provider = os.getenv("LLM_PROVIDER", "mock")
+    breaker_state = None
+    if operations.llm_service is not None:
+        breaker_state = operations.llm_service.circuit_breaker.state
     
     return HealthCheckResponse(
-        status="UP",
+        status="DEGRADED" if breaker_state == "open" else "UP",
         timestamp=datetime.now(),
         database=db_status,
-        llm_provider=llm_provider
+        llm_provider=llm_provider,
+        llm_circuit_breaker=breaker_state
     )
 
 
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Optional
-
-from ....core.database import get_db_manager
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, AsyncIterator, Awaitable, Dict
+import asyncio
+import json
+import logging
+
+from ....core.deadline import Deadline
+from ....core.exceptions import DeadlineExceededException, ClientDisconnectedException, InvalidCursorException
+from ....core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 from ....models.schemas.request_schemas import (
     CreateConversationRequest,
     AddMessageRequest,
@@ -11,12 +16,20 @@ from ....models.schemas.request_schemas import (
     PaginatedResponse,
     ErrorResponse
 )
-from ....services.conversation_service import ConversationService
+from ....services.conversation_service import ConversationService, DISCONNECT_DISCARD
+from ....services.history_cache import HistoryCache
 from ....services.llm_service import LLMService
+from ....services.message_index import MessageIndex
 from ....services.rag_service import RAGService
+from ....services.summary_memory import SummaryMemory
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/conversations", tags=["Conversations"])
 
+DISCONNECT_POLL_INTERVAL = 0.25
+CLIENT_CLOSED_REQUEST = 499
+
 # Service instances (will be initialized in app startup)
 conversation_service: Optional[ConversationService] = None
 
@@ -27,9 +40,50 @@ def get_conversation_service() -> ConversationService:
     return conversation_service
 
 
-def init_conversation_service(llm_service: LLMService, rag_service: RAGService):
+def get_request_deadline(
+    x_request_timeout: Optional[str] = Header(default=None, description="Request budget in seconds")
+) -> Deadline:
+    return Deadline.from_header(x_request_timeout)
+
+
+def init_conversation_service(
+    llm_service: LLMService,
+    rag_service: RAGService,
+    disconnect_policy: str = DISCONNECT_DISCARD,
+    history_cache: Optional[HistoryCache] = None,
+    memory: Optional[SummaryMemory] = None,
+    message_index: Optional[MessageIndex] = None
+):
     global conversation_service
-    conversation_service = ConversationService(llm_service, rag_service)
+    conversation_service = ConversationService(
+        llm_service,
+        rag_service,
+        disconnect_policy=disconnect_policy,
+        history_cache=history_cache,
+        memory=memory,
+        message_index=message_index
+    )
+
+
+async def cancel_on_disconnect(http_request: Request, awaitable: Awaitable, poll_interval: float = DISCONNECT_POLL_INTERVAL):
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            
+            if await http_request.is_disconnected():
+                logger.info(f"Client disconnected from {http_request.url.path}, cancelling generation")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnectedException("Client disconnected before the response was ready")
+    finally:
+        if not task.done():
+            task.cancel()
 
 
 @router.post(
@@ -41,14 +95,16 @@ def init_conversation_service(llm_service: LLMService, rag_service: RAGService):
 )
 async def create_conversation(
     request: CreateConversationRequest,
-    service: ConversationService = Depends(get_conversation_service)
+    http_request: Request,
+    service: ConversationService = Depends(get_conversation_service),
+    deadline: Deadline = Depends(get_request_deadline)
 ):
-    db_manager = get_db_manager()
-    
     try:
-        with db_manager.get_session() as db:
-            result = await service.create_conversation(db, request)
-            return result
+        return await cancel_on_disconnect(http_request, service.create_conversation(request, deadline=deadline))
+    except ClientDisconnectedException as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+    except DeadlineExceededException as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -59,20 +115,25 @@ async def create_conversation(
     "",
     response_model=PaginatedResponse,
     summary="List conversations",
-    description="Get paginated list of conversations for a user"
+    description="Get a page of a user's conversations, most recently updated first; the next page's cursor is returned in X-Next-Cursor"
 )
-def list_conversations(
+async def list_conversations(
+    response: Response,
     user_id: str = Query(..., description="User ID"),
-    page: int = Query(1, ge=1, description="Page number"),
-    page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor"),
+    include_total: bool = Query(False, description="Also return the conversation count in X-Total-Count"),
     service: ConversationService = Depends(get_conversation_service)
 ):
-    db_manager = get_db_manager()
-    
     try:
-        with db_manager.get_session() as db:
-            result = service.get_conversations(db, user_id, page, page_size)
-            return PaginatedResponse(**result)
+        result = await service.get_conversations(user_id, page_size, cursor=cursor, include_total=include_total)
+        if result["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = result["next_cursor"]
+        if result["total"] is not None:
+            response.headers[TOTAL_COUNT_HEADER] = str(result["total"])
+        return PaginatedResponse(items=result["items"], page_size=result["page_size"])
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list conversations: {str(e)}")
 
@@ -83,15 +144,12 @@ def list_conversations(
     summary="Get conversation details",
     description="Get full conversation with message history"
 )
-def get_conversation(
+async def get_conversation(
     conversation_id: str,
     service: ConversationService = Depends(get_conversation_service)
 ):
-    db_manager = get_db_manager()
-    
     try:
-        with db_manager.get_session() as db:
-            return service.get_conversation_detail(db, conversation_id)
+        return await service.get_conversation_detail(conversation_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -107,18 +165,67 @@ def get_conversation(
 async def add_message(
     conversation_id: str,
     request: AddMessageRequest,
-    service: ConversationService = Depends(get_conversation_service)
+    http_request: Request,
+    service: ConversationService = Depends(get_conversation_service),
+    deadline: Deadline = Depends(get_request_deadline)
 ):
-    db_manager = get_db_manager()
+    try:
+        return await cancel_on_disconnect(
+            http_request, service.add_message(conversation_id, request, deadline=deadline)
+        )
+    except ClientDisconnectedException as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+    except DeadlineExceededException as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add message: {str(e)}")
+
+
+@router.post(
+    "/{conversation_id}/messages/stream",
+    response_class=StreamingResponse,
+    summary="Stream message response",
+    description="Add a user message and stream the AI assistant response as Server-Sent Events"
+)
+async def stream_message(
+    conversation_id: str,
+    request: AddMessageRequest,
+    http_request: Request,
+    service: ConversationService = Depends(get_conversation_service),
+    deadline: Deadline = Depends(get_request_deadline)
+):
+    events = service.stream_message(conversation_id, request, deadline=deadline)
     
     try:
-        with db_manager.get_session() as db:
-            result = await service.add_message(db, conversation_id, request)
-            return result
+        first_event = await cancel_on_disconnect(http_request, events.__anext__())
+    except ClientDisconnectedException as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add message: {str(e)}")
+    
+    async def sse_stream() -> AsyncIterator[str]:
+        yield format_sse(first_event)
+        try:
+            async for event in events:
+                yield format_sse(event)
+        except Exception as e:
+            yield format_sse({"event": "error", "data": {"detail": f"Failed to add message: {str(e)}"}})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        sse_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def format_sse(event: Dict[str, any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
 
 
 @router.delete(
@@ -127,16 +234,13 @@ async def add_message(
     summary="Delete conversation",
     description="Delete a conversation and all its messages"
 )
-def delete_conversation(
+async def delete_conversation(
     conversation_id: str,
     service: ConversationService = Depends(get_conversation_service)
 ):
-    db_manager = get_db_manager()
-    
     try:
-        with db_manager.get_session() as db:
-            service.delete_conversation(db, conversation_id)
-            return None
+        await service.delete_conversation(conversation_id)
+        return None
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
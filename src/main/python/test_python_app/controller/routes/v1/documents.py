@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from ....core.database import get_db_manager
-from ....models.domain.entities import Document, User
+from ....core.exceptions import InvalidCursorException
+from ....core.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, keyset_before, split_page
+)
+from ....models.domain.entities import Document, DocumentChunk, User
 from ....models.schemas.request_schemas import UploadDocumentRequest, DocumentResponse
 from ....services.rag_service import RAGService
 
@@ -37,36 +42,41 @@ def upload_document(
 ):
     db_manager = get_db_manager()
     
+    def insert_document(db: Session) -> DocumentResponse:
+        # Verify user exists
+        user = db.query(User).filter(User.id == request.user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        # Create document
+        document = Document(
+            user_id=request.user_id,
+            filename=request.filename,
+            content=request.content,
+            file_size=len(request.content),
+            mime_type=request.mime_type
+        )
+        db.add(document)
+        db.flush()
+        
+        # Process document and create chunks
+        chunk_count = service.process_document(db, document)
+        db.refresh(document)
+        
+        return DocumentResponse(
+            id=document.id,
+            user_id=document.user_id,
+            filename=document.filename,
+            file_size=document.file_size,
+            mime_type=document.mime_type,
+            chunk_count=chunk_count,
+            created_at=document.created_at
+        )
+    
     try:
-        with db_manager.get_session() as db:
-            # Verify user exists
-            user = db.query(User).filter(User.id == request.user_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            # Create document
-            document = Document(
-                user_id=request.user_id,
-                filename=request.filename,
-                content=request.content,
-                file_size=len(request.content),
-                mime_type=request.mime_type
-            )
-            db.add(document)
-            db.flush()
-            
-            # Process document and create chunks
-            chunk_count = service.process_document(db, document)
-            
-            return DocumentResponse(
-                id=document.id,
-                user_id=document.user_id,
-                filename=document.filename,
-                file_size=document.file_size,
-                mime_type=document.mime_type,
-                chunk_count=chunk_count,
-                created_at=document.created_at
-            )
+        response = db_manager.write(insert_document)
+        db_manager.mark_written(response.id, f"user:{response.user_id}")
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -77,20 +87,40 @@ def upload_document(
     "",
     response_model=List[DocumentResponse],
     summary="List documents",
-    description="Get list of documents for a user"
+    description="Get a page of a user's documents, newest first; the next page's cursor is returned in X-Next-Cursor"
 )
 def list_documents(
     user_id: str,
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor"),
+    include_total: bool = Query(False, description="Also return the document count in X-Total-Count"),
     service: RAGService = Depends(get_rag_service)
 ):
     db_manager = get_db_manager()
     
     try:
-        with db_manager.get_session() as db:
-            documents = db.query(Document).filter(
-                Document.user_id == user_id
-            ).order_by(Document.created_at.desc()).all()
+        with db_manager.get_read_session(f"user:{user_id}") as db:
+            query = db.query(Document).filter(Document.user_id == user_id)
+            after_cursor = keyset_before(Document.created_at, Document.id, cursor)
+            if after_cursor is not None:
+                query = query.filter(after_cursor)
+            rows = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(page_size + 1).all()
+            documents, next_cursor = split_page(rows, page_size, "created_at")
+            
+            chunk_counts = dict(
+                db.query(DocumentChunk.document_id, func.count(DocumentChunk.id))
+                .filter(DocumentChunk.document_id.in_([doc.id for doc in documents]))
+                .group_by(DocumentChunk.document_id)
+                .all()
+            ) if documents else {}
             
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+            if include_total:
+                response.headers[TOTAL_COUNT_HEADER] = str(
+                    db.query(func.count(Document.id)).filter(Document.user_id == user_id).scalar()
+                )
             return [
                 DocumentResponse(
                     id=doc.id,
@@ -98,11 +128,13 @@ def list_documents(
                     filename=doc.filename,
                     file_size=doc.file_size,
                     mime_type=doc.mime_type,
-                    chunk_count=len(doc.chunks),
+                    chunk_count=chunk_counts.get(doc.id, 0),
                     created_at=doc.created_at
                 )
                 for doc in documents
             ]
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
 
@@ -117,7 +149,7 @@ def get_document(document_id: str):
     db_manager = get_db_manager()
     
     try:
-        with db_manager.get_session() as db:
+        with db_manager.get_read_session(document_id) as db:
             document = db.query(Document).filter(Document.id == document_id).first()
             if not document:
                 raise HTTPException(status_code=404, detail="Document not found")
@@ -143,18 +175,25 @@ def get_document(document_id: str):
     summary="Delete document",
     description="Delete a document and its chunks"
 )
-def delete_document(document_id: str):
+def delete_document(
+    document_id: str,
+    service: RAGService = Depends(get_rag_service)
+):
     db_manager = get_db_manager()
     
+    def remove_document(db: Session):
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        service.remove_document_index(db, document_id)
+        db.delete(document)
+        return document.user_id
+    
     try:
-        with db_manager.get_session() as db:
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if not document:
-                raise HTTPException(status_code=404, detail="Document not found")
-            
-            db.delete(document)
-            db.commit()
-            return None
+        user_id = db_manager.write(remove_document)
+        db_manager.mark_written(document_id, f"user:{user_id}")
+        return None
     except HTTPException:
         raise
     except Exception as e:
@@ -1,11 +1,58 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from ....core import database
+from ....core.database import get_db_manager
+from ....services.history_cache import HistoryCache
+from ....services.llm_service import LLMService
+from ....services.message_index import MessageIndex
+from ....services.rag_service import RAGService
+from ....services.summary_memory import SummaryMemory
 
 router = APIRouter(prefix="/api/operations", tags=["operations"])
 
+# Service instances (will be initialized in app startup)
+llm_service: Optional[LLMService] = None
+history_cache: Optional[HistoryCache] = None
+summary_memory: Optional[SummaryMemory] = None
+message_index: Optional[MessageIndex] = None
+rag_service: Optional[RAGService] = None
+
+
+def init_operations(
+    service: LLMService,
+    cache: Optional[HistoryCache] = None,
+    memory: Optional[SummaryMemory] = None,
+    index: Optional[MessageIndex] = None,
+    rag: Optional[RAGService] = None
+):
+    global llm_service, history_cache, summary_memory, message_index, rag_service
+    llm_service = service
+    history_cache = cache
+    summary_memory = memory
+    message_index = index
+    rag_service = rag
+
 
 @router.get("/ping")
 async def ping():
     return {"message": "pong"}
 
 
-
+@router.get("/metrics")
+async def metrics():
+    if llm_service is None:
+        raise HTTPException(status_code=500, detail="LLM service not initialized")
+    
+    database_stats = get_db_manager().get_stats()
+    if database.async_db_manager is not None:
+        database_stats["async_routing"] = database.async_db_manager.get_stats()["routing"]
+    
+    return {
+        "llm": llm_service.get_stats(),
+        "database": database_stats,
+        "history_cache": history_cache.get_stats() if history_cache is not None else None,
+        "conversation_memory": summary_memory.get_stats() if summary_memory is not None else None,
+        "message_recall": message_index.get_stats() if message_index is not None else None,
+        "retrieval": rag_service.get_stats() if rag_service is not None else None
+    }
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from ....core.database import get_db_manager
+from ....core.exceptions import InvalidCursorException
+from ....core.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, keyset_before, split_page
+)
 from ....models.domain.entities import User
 from ....models.schemas.request_schemas import CreateUserRequest, UserResponse
 
@@ -19,29 +24,33 @@ router = APIRouter(prefix="/users", tags=["Users"])
 def create_user(request: CreateUserRequest):
     db_manager = get_db_manager()
     
+    def insert_user(db: Session) -> UserResponse:
+        # Check if username exists
+        existing = db.query(User).filter(User.username == request.username).first()
+        if existing:
+            raise HTTPException(status_code=400, detail="Username already exists")
+        
+        # Check if email exists
+        if request.email:
+            existing_email = db.query(User).filter(User.email == request.email).first()
+            if existing_email:
+                raise HTTPException(status_code=400, detail="Email already exists")
+        
+        # Create user
+        user = User(
+            username=request.username,
+            email=request.email
+        )
+        db.add(user)
+        db.flush()
+        db.refresh(user)
+        
+        return UserResponse.model_validate(user)
+    
     try:
-        with db_manager.get_session() as db:
-            # Check if username exists
-            existing = db.query(User).filter(User.username == request.username).first()
-            if existing:
-                raise HTTPException(status_code=400, detail="Username already exists")
-            
-            # Check if email exists
-            if request.email:
-                existing_email = db.query(User).filter(User.email == request.email).first()
-                if existing_email:
-                    raise HTTPException(status_code=400, detail="Email already exists")
-            
-            # Create user
-            user = User(
-                username=request.username,
-                email=request.email
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            
-            return UserResponse.model_validate(user)
+        response = db_manager.write(insert_user)
+        db_manager.mark_written(f"user:{response.id}")
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -52,15 +61,32 @@ def create_user(request: CreateUserRequest):
     "",
     response_model=List[UserResponse],
     summary="List users",
-    description="Get list of all users"
+    description="Get a page of users, newest first; the next page's cursor is returned in X-Next-Cursor"
 )
-def list_users():
+def list_users(
+    response: Response,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor"),
+    include_total: bool = Query(False, description="Also return the user count in X-Total-Count")
+):
     db_manager = get_db_manager()
     
     try:
-        with db_manager.get_session() as db:
-            users = db.query(User).order_by(User.created_at.desc()).all()
+        with db_manager.get_read_session() as db:
+            query = db.query(User)
+            after_cursor = keyset_before(User.created_at, User.id, cursor)
+            if after_cursor is not None:
+                query = query.filter(after_cursor)
+            rows = query.order_by(User.created_at.desc(), User.id.desc()).limit(page_size + 1).all()
+            users, next_cursor = split_page(rows, page_size, "created_at")
+            
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+            if include_total:
+                response.headers[TOTAL_COUNT_HEADER] = str(db.query(func.count(User.id)).scalar())
             return [UserResponse.model_validate(user) for user in users]
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list users: {str(e)}")
 
@@ -75,7 +101,7 @@ def get_user(user_id: str):
     db_manager = get_db_manager()
     
     try:
-        with db_manager.get_session() as db:
+        with db_manager.get_read_session(f"user:{user_id}") as db:
             user = db.query(User).filter(User.id == user_id).first()
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
@@ -1,32 +1,99 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from contextlib import contextmanager
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List, Optional, TypeVar
 import logging
 import os
 
 from ..models.domain.entities import Base
+from .migrations import run_migrations
+from .routing import (
+    ReadYourWritesGuard, ReplicaSet, RoutingSession, measure_postgres_lag, measure_postgres_lag_async, read_your_writes
+)
+from .sqlite_profile import (
+    PRODUCTION_PRAGMAS, SQLITE_PROFILE_DEFAULT, SQLITE_PROFILE_PRODUCTION, SQLiteWriteQueue, apply_sqlite_pragmas
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg"
+}
+
+
+def resolve_database_url(database_url: str = None) -> str:
+    if database_url is None:
+        db_path = os.getenv("DATABASE_PATH", "./data/botgpt.db")
+        os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
+        database_url = f"sqlite:///{db_path}"
+    return database_url
+
+
+def is_memory_url(database_url: str) -> bool:
+    return make_url(database_url).database in (None, "", ":memory:")
+
+
+def to_async_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if url.drivername == backend and backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
 
 class DatabaseManager:
     
-    def __init__(self, database_url: str = None):
-        if database_url is None:
-            db_path = os.getenv("DATABASE_PATH", "./data/botgpt.db")
-            os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
-            database_url = f"sqlite:///{db_path}"
-        
+    def __init__(
+        self,
+        database_url: str = None,
+        sqlite_profile: str = SQLITE_PROFILE_DEFAULT,
+        read_pool_size: int = 8,
+        write_batch_size: int = 64,
+        replica_urls: Optional[List[str]] = None,
+        consistency_guard: ReadYourWritesGuard = read_your_writes
+    ):
+        database_url = resolve_database_url(database_url)
         self.database_url = database_url
+        self.sqlite_profile = sqlite_profile
+        self.consistency_guard = consistency_guard
+        self.writer: Optional[SQLiteWriteQueue] = None
+        replica_engines = []
         
-        if database_url.startswith("sqlite"):
+        if database_url.startswith("sqlite") and sqlite_profile == SQLITE_PROFILE_PRODUCTION and not is_memory_url(database_url):
+            self.engine = create_engine(
+                database_url,
+                connect_args={"check_same_thread": False},
+                pool_size=1,
+                max_overflow=0,
+                pool_timeout=30,
+                echo=False
+            )
+            apply_sqlite_pragmas(self.engine, PRODUCTION_PRAGMAS, immediate=True)
+            
+            self.read_engine = create_engine(
+                database_url,
+                connect_args={"check_same_thread": False},
+                pool_size=read_pool_size,
+                max_overflow=0,
+                pool_timeout=30,
+                echo=False
+            )
+            apply_sqlite_pragmas(self.read_engine, PRODUCTION_PRAGMAS, read_only=True)
+        elif database_url.startswith("sqlite"):
             self.engine = create_engine(
                 database_url,
                 connect_args={"check_same_thread": False},
                 poolclass=StaticPool,
                 echo=False
             )
+            self.read_engine = self.engine
         else:
             self.engine = create_engine(
                 database_url,
@@ -35,18 +102,44 @@ class DatabaseManager:
                 max_overflow=20,
                 echo=False
             )
+            self.read_engine = self.engine
+            replica_engines = [
+                create_engine(url, pool_pre_ping=True, pool_size=10, max_overflow=20, echo=False)
+                for url in replica_urls or []
+            ]
+        
+        if self.read_engine is not self.engine:
+            replica_engines = [self.read_engine]
+        self.replica_set = ReplicaSet(self.engine, replica_engines)
         
         self.SessionLocal = sessionmaker(
             autocommit=False,
             autoflush=False,
             bind=self.engine
         )
+        self.ReadSessionLocal = sessionmaker(
+            class_=RoutingSession,
+            replica_set=self.replica_set,
+            autocommit=False,
+            autoflush=False
+        )
+        
+        if replica_urls and not replica_engines:
+            logger.warning("Replica URLs are only used with a client/server database, ignoring")
+        elif replica_urls:
+            logger.info(f"Routing reads across {len(replica_engines)} replicas")
+        
+        if self.read_engine is not self.engine:
+            self.writer = SQLiteWriteQueue(self.SessionLocal, batch_size=write_batch_size)
+            logger.info(f"SQLite production profile: {read_pool_size} readers, 1 writer (batch {write_batch_size})")
         
         logger.info(f"Database initialized: {database_url}")
     
     def create_tables(self):
         try:
             Base.metadata.create_all(bind=self.engine)
+            with self.engine.begin() as conn:
+                run_migrations(conn)
             logger.info("Database tables created successfully")
         except Exception as e:
             logger.error(f"Failed to create tables: {str(e)}")
@@ -69,6 +162,47 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @contextmanager
+    def get_read_session(self, consistency_key: Optional[str] = None) -> Session:
+        session = self.ReadSessionLocal()
+        if self.consistency_guard.requires_primary(consistency_key, self.replica_set.max_lag()):
+            session.info["use_primary"] = True
+            self.replica_set.pinned_sessions += 1
+        try:
+            yield session
+        finally:
+            session.rollback()
+            session.close()
+    
+    def write(self, fn: Callable[[Session], T]) -> T:
+        if self.writer is None:
+            with self.get_session() as db:
+                return fn(db)
+        return self.writer.submit(fn).result()
+    
+    def mark_written(self, *consistency_keys: str):
+        for key in consistency_keys:
+            self.consistency_guard.mark_written(key)
+    
+    def measure_replica_lag(self):
+        for index, engine in enumerate(self.replica_set.replicas):
+            self.replica_set.record_lag(index, measure_postgres_lag(engine))
+    
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "sqlite_profile": self.sqlite_profile if self.database_url.startswith("sqlite") else None,
+            "read_pool": self.read_engine.pool.status(),
+            "writer": self.writer.get_stats() if self.writer else None,
+            "routing": self.replica_set.get_stats()
+        }
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.engine.dispose()
+        for engine in self.replica_set.replicas:
+            engine.dispose()
+    
     def get_db(self):
         db = self.SessionLocal()
         try:
@@ -77,12 +211,151 @@ class DatabaseManager:
             db.close()
 
 
+class AsyncDatabaseManager:
+    
+    def __init__(
+        self,
+        database_url: str = None,
+        sqlite_profile: str = SQLITE_PROFILE_DEFAULT,
+        read_pool_size: int = 8,
+        replica_urls: Optional[List[str]] = None,
+        consistency_guard: ReadYourWritesGuard = read_your_writes
+    ):
+        self.database_url = to_async_url(resolve_database_url(database_url))
+        self.sqlite_profile = sqlite_profile
+        self.consistency_guard = consistency_guard
+        self.replica_engines = []
+        
+        if self.database_url.startswith("sqlite") and is_memory_url(self.database_url):
+            self.engine = create_async_engine(
+                self.database_url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                echo=False
+            )
+        elif self.database_url.startswith("sqlite") and sqlite_profile == SQLITE_PROFILE_PRODUCTION:
+            # Group commit needs the sync writer thread; async turns get the same single serialized
+            # writer connection and query_only reader pool, committing each transaction on its own.
+            self.engine = create_async_engine(
+                self.database_url,
+                connect_args={"check_same_thread": False, "timeout": 30},
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=1,
+                max_overflow=0,
+                pool_timeout=30,
+                echo=False
+            )
+            apply_sqlite_pragmas(self.engine.sync_engine, PRODUCTION_PRAGMAS, immediate=True)
+            
+            read_engine = create_async_engine(
+                self.database_url,
+                connect_args={"check_same_thread": False, "timeout": 30},
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=read_pool_size,
+                max_overflow=0,
+                pool_timeout=30,
+                echo=False
+            )
+            apply_sqlite_pragmas(read_engine.sync_engine, PRODUCTION_PRAGMAS, read_only=True)
+            self.replica_engines = [read_engine]
+        elif self.database_url.startswith("sqlite"):
+            self.engine = create_async_engine(
+                self.database_url,
+                connect_args={"check_same_thread": False, "timeout": 30},
+                echo=False
+            )
+        else:
+            self.engine = create_async_engine(
+                self.database_url,
+                pool_pre_ping=True,
+                pool_size=10,
+                max_overflow=20,
+                echo=False
+            )
+            self.replica_engines = [
+                create_async_engine(to_async_url(url), pool_pre_ping=True, pool_size=10, max_overflow=20, echo=False)
+                for url in replica_urls or []
+            ]
+        
+        self.replica_set = ReplicaSet(self.engine.sync_engine, [e.sync_engine for e in self.replica_engines])
+        
+        self.SessionLocal = async_sessionmaker(
+            bind=self.engine,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        self.ReadSessionLocal = async_sessionmaker(
+            sync_session_class=RoutingSession,
+            replica_set=self.replica_set,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        
+        logger.info(f"Async database initialized: {make_url(self.database_url).render_as_string(hide_password=True)}")
+    
+    async def create_tables(self):
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(run_migrations)
+            logger.info("Database tables created successfully")
+        except Exception as e:
+            logger.error(f"Failed to create tables: {str(e)}")
+            raise
+    
+    @asynccontextmanager
+    async def get_session(self) -> AsyncSession:
+        session = self.SessionLocal()
+        try:
+            yield session
+            await session.commit()
+        except BaseException as e:
+            await session.rollback()
+            if isinstance(e, Exception):
+                logger.error(f"Database session error: {str(e)}")
+            raise
+        finally:
+            await session.close()
+    
+    @asynccontextmanager
+    async def get_read_session(self, consistency_key: Optional[str] = None) -> AsyncSession:
+        session = self.ReadSessionLocal()
+        if self.consistency_guard.requires_primary(consistency_key, self.replica_set.max_lag()):
+            session.info["use_primary"] = True
+            self.replica_set.pinned_sessions += 1
+        try:
+            yield session
+        finally:
+            await session.rollback()
+            await session.close()
+    
+    def mark_written(self, *consistency_keys: str):
+        for key in consistency_keys:
+            self.consistency_guard.mark_written(key)
+    
+    async def measure_replica_lag(self):
+        for index, engine in enumerate(self.replica_engines):
+            self.replica_set.record_lag(index, await measure_postgres_lag_async(engine))
+    
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "sqlite_profile": self.sqlite_profile if self.database_url.startswith("sqlite") else None,
+            "routing": self.replica_set.get_stats()
+        }
+    
+    async def dispose(self):
+        await self.engine.dispose()
+        for engine in self.replica_engines:
+            await engine.dispose()
+
+
 db_manager: DatabaseManager = None
+async_db_manager: AsyncDatabaseManager = None
 
 
-def init_database(database_url: str = None) -> DatabaseManager:
+def init_database(database_url: str = None, **kwargs) -> DatabaseManager:
     global db_manager
-    db_manager = DatabaseManager(database_url)
+    db_manager = DatabaseManager(database_url, **kwargs)
     db_manager.create_tables()
     return db_manager
 
@@ -91,3 +364,16 @@ def get_db_manager() -> DatabaseManager:
     if db_manager is None:
         raise RuntimeError("Database not initialized. Call init_database() first.")
     return db_manager
+
+
+async def init_async_database(database_url: str = None, **kwargs) -> AsyncDatabaseManager:
+    global async_db_manager
+    async_db_manager = AsyncDatabaseManager(database_url, **kwargs)
+    await async_db_manager.create_tables()
+    return async_db_manager
+
+
+def get_async_db_manager() -> AsyncDatabaseManager:
+    if async_db_manager is None:
+        raise RuntimeError("Async database not initialized. Call init_async_database() first.")
+    return async_db_manager
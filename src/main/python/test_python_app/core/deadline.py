@@ -0,0 +1,36 @@
+import os
+import time
+from typing import Optional
+
+from .exceptions import DeadlineExceededException
+
+
+class Deadline:
+    
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+    
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "Deadline":
+        default_timeout = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+        try:
+            requested = float(value) if value else default_timeout
+        except ValueError:
+            requested = default_timeout
+        return cls(min(max(requested, 0.0), default_timeout))
+    
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+    
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+    
+    def bound(self, timeout: float) -> float:
+        self.check()
+        return min(timeout, self.remaining())
+    
+    def check(self, operation: str = "request"):
+        if self.expired:
+            raise DeadlineExceededException(f"Deadline of {self.timeout_seconds}s exceeded during {operation}")
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class BaseAppException(Exception):
     pass
 
@@ -10,4 +13,32 @@ class DatabaseException(BaseAppException):
     pass
 
 
+class LLMProviderException(ServiceCallException):
+    
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
 
+
+class CircuitOpenException(ServiceCallException):
+    pass
+
+
+class DeadlineExceededException(ServiceCallException):
+    pass
+
+
+class ClientDisconnectedException(BaseAppException):
+    pass
+
+
+class InvalidCursorException(BaseAppException):
+    pass
@@ -0,0 +1,153 @@
+import asyncio
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class PooledHTTPClient:
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = min(max_keepalive_connections, max_connections)
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.transport = transport
+
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed. Using HTTP/1.1.")
+            http2 = False
+        self.http2 = http2
+
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total_requests = 0
+        self._saturated_requests = 0
+        self._failed_requests = 0
+
+    async def start(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            )
+            timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+            kwargs = {"limits": limits, "timeout": timeout, "http2": self.http2}
+            if self.transport is not None:
+                kwargs["transport"] = self.transport
+
+            self.client = httpx.AsyncClient(**kwargs)
+            logger.info(
+                f"HTTP client pool started (max_connections={self.max_connections}, "
+                f"keepalive={self.max_keepalive_connections}, expiry={self.keepalive_expiry}s, http2={self.http2})"
+            )
+        return self.client
+
+    async def close(self):
+        if self.client is not None and not self.client.is_closed:
+            await self.client.aclose()
+            logger.info("HTTP client pool closed")
+        self.client = None
+
+    async def warmup(self, urls: List[str], connections_per_host: int = 1) -> int:
+        client = await self.start()
+
+        async def _touch(url: str) -> bool:
+            try:
+                await client.head(url)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"Connection warmup failed for {url}: {str(e)}")
+                return False
+
+        attempts = [_touch(url) for url in urls for _ in range(max(connections_per_host, 0))]
+        if not attempts:
+            return 0
+
+        results = await asyncio.gather(*attempts)
+        warmed = sum(1 for ok in results if ok)
+        logger.info(f"Warmed {warmed}/{len(attempts)} upstream connections")
+        return warmed
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = await self.start()
+        self._enter()
+        try:
+            return await client.request(method, url, **kwargs)
+        except Exception:
+            self._failed_requests += 1
+            raise
+        finally:
+            self._exit()
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        client = await self.start()
+        self._enter()
+        try:
+            async with client.stream(method, url, **kwargs) as response:
+                yield response
+        except Exception:
+            self._failed_requests += 1
+            raise
+        finally:
+            self._exit()
+
+    def _enter(self):
+        self._total_requests += 1
+        if self._in_flight >= self.max_connections:
+            self._saturated_requests += 1
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _exit(self):
+        self._in_flight -= 1
+
+    def _connection_counts(self) -> Dict[str, int]:
+        transport = getattr(self.client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {"open": 0, "idle": 0}
+
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open": len(connections), "idle": idle}
+
+    def get_stats(self) -> Dict[str, any]:
+        counts = self._connection_counts()
+        return {
+            "started": self.client is not None and not self.client.is_closed,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "open_connections": counts["open"],
+            "idle_connections": counts["idle"],
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "saturation": round(self._in_flight / self.max_connections, 3) if self.max_connections else 0.0,
+            "total_requests": self._total_requests,
+            "saturated_requests": self._saturated_requests,
+            "failed_requests": self._failed_requests
+        }
@@ -0,0 +1,196 @@
+from typing import Callable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, insert, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Update
+
+from ..models.domain.entities import (
+    ChunkTerm, Conversation, Document, DocumentChunk, Message, MessageTerm, User, MESSAGE_PREVIEW_LENGTH
+)
+from .terms import chunk_term_rows, message_term_rows
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", String(100), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False)
+)
+
+
+def refresh_conversation_counters(conversation_ids: Optional[List[str]] = None) -> Update:
+    in_conversation = Message.conversation_id == Conversation.id
+    last_message = (
+        select(func.substr(Message.content, 1, MESSAGE_PREVIEW_LENGTH))
+        .where(in_conversation)
+        .order_by(Message.sequence_number.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    statement = update(Conversation).values(
+        message_count=select(func.count(Message.id)).where(in_conversation).scalar_subquery(),
+        last_sequence_number=func.coalesce(
+            select(func.max(Message.sequence_number)).where(in_conversation).scalar_subquery(), 0
+        ),
+        last_message_preview=last_message,
+        updated_at=Conversation.updated_at
+    )
+    if conversation_ids is not None:
+        statement = statement.where(Conversation.id.in_(conversation_ids))
+    return statement.execution_options(synchronize_session=False)
+
+
+def create_model_indexes(connection: Connection, *models):
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def add_conversation_counters(connection: Connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("conversations")}
+    columns = [
+        ("message_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("last_sequence_number", "INTEGER NOT NULL DEFAULT 0"),
+        ("last_message_preview", f"VARCHAR({MESSAGE_PREVIEW_LENGTH})")
+    ]
+    for name, ddl in columns:
+        if name not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE conversations ADD COLUMN {name} {ddl}")
+    create_model_indexes(connection, Conversation)
+
+    result = connection.execute(refresh_conversation_counters())
+    logger.info(f"Backfilled message counters for {result.rowcount} conversations")
+
+
+def add_keyset_indexes(connection: Connection):
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_conversations_user_updated")
+    create_model_indexes(connection, Conversation, User, Document)
+
+
+def renumber_duplicate_sequences(connection: Connection):
+    duplicated = connection.execute(
+        select(Message.conversation_id)
+        .group_by(Message.conversation_id)
+        .having(func.count(Message.id) > func.count(func.distinct(Message.sequence_number)))
+    ).scalars().all()
+
+    for conversation_id in duplicated:
+        message_ids = connection.execute(
+            select(Message.id)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.sequence_number, Message.created_at, Message.id)
+        ).scalars().all()
+        for sequence_number, message_id in enumerate(message_ids, 1):
+            connection.execute(update(Message).where(Message.id == message_id).values(sequence_number=sequence_number))
+        logger.warning(f"Renumbered {len(message_ids)} messages with duplicate sequence numbers in {conversation_id}")
+
+    if duplicated:
+        connection.execute(refresh_conversation_counters(list(duplicated)))
+
+
+def add_sequence_allocator(connection: Connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("conversations")}
+    if "sequence_counter" not in existing:
+        connection.exec_driver_sql("ALTER TABLE conversations ADD COLUMN sequence_counter INTEGER NOT NULL DEFAULT 0")
+
+    renumber_duplicate_sequences(connection)
+    create_model_indexes(connection, Message)
+    connection.execute(
+        update(Conversation)
+        .values(
+            sequence_counter=func.coalesce(
+                select(func.max(Message.sequence_number))
+                .where(Message.conversation_id == Conversation.id)
+                .scalar_subquery(),
+                0
+            ),
+            updated_at=Conversation.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def index_message_terms(connection: Connection):
+    MessageTerm.__table__.create(bind=connection, checkfirst=True)
+    indexed = 0
+    last_id = ""
+    while True:
+        batch = connection.execute(
+            select(Message.id, Message.conversation_id, Message.sequence_number, Message.content)
+            .where(Message.id > last_id)
+            .order_by(Message.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        rows = [row for m in batch for row in message_term_rows(m.conversation_id, m.sequence_number, m.content)]
+        if rows:
+            connection.execute(insert(MessageTerm), rows)
+        indexed += len(batch)
+        last_id = batch[-1].id
+    logger.info(f"Indexed terms of {indexed} existing messages")
+
+
+def index_chunk_terms(connection: Connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("documents")}
+    for name in ("chunk_count", "term_count"):
+        if name not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE documents ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0")
+    ChunkTerm.__table__.create(bind=connection, checkfirst=True)
+    
+    last_id = ""
+    while True:
+        batch = connection.execute(
+            select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content)
+            .where(DocumentChunk.id > last_id)
+            .order_by(DocumentChunk.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        rows = [row for c in batch for row in chunk_term_rows(c.document_id, c.id, c.content)]
+        if rows:
+            connection.execute(insert(ChunkTerm), rows)
+        last_id = batch[-1].id
+    
+    result = connection.execute(
+        update(Document)
+        .values(
+            chunk_count=select(func.count(DocumentChunk.id))
+            .where(DocumentChunk.document_id == Document.id)
+            .scalar_subquery(),
+            term_count=func.coalesce(
+                select(func.sum(ChunkTerm.frequency)).where(ChunkTerm.document_id == Document.id).scalar_subquery(),
+                0
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    logger.info(f"Indexed chunk terms of {result.rowcount} documents")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_conversation_counters", add_conversation_counters),
+    ("0002_keyset_indexes", add_keyset_indexes),
+    ("0003_sequence_allocator", add_sequence_allocator),
+    ("0004_message_terms", index_message_terms),
+    ("0005_chunk_terms", index_chunk_terms),
+]
+
+
+def run_migrations(connection: Connection):
+    migration_metadata.create_all(bind=connection)
+    applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(connection)
+        connection.execute(schema_migrations.insert().values(version=version))
+        logger.info(f"Applied migration {version}")
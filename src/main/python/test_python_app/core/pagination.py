@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+import base64
+import json
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import ColumnElement
+
+from .exceptions import InvalidCursorException
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), str(row_id)
+    except Exception:
+        raise InvalidCursorException(f"Invalid pagination cursor: {cursor}")
+
+
+def keyset_before(sort_column, id_column, cursor: Optional[str]) -> Optional[ColumnElement]:
+    if not cursor:
+        return None
+    sort_value, row_id = decode_cursor(cursor)
+    return or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id))
+
+
+def split_page(rows: Sequence[Any], page_size: int, sort_attribute: str) -> Tuple[List[Any], Optional[str]]:
+    items = list(rows[:page_size])
+    if len(rows) <= page_size:
+        return items, None
+    last = items[-1]
+    return items, encode_cursor(getattr(last, sort_attribute), last.id)
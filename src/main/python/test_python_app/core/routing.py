@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional
+import itertools
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_REPLICA_LAG_QUERY = text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+)
+
+
+class ReplicaSet:
+
+    def __init__(self, primary: Engine, replicas: Optional[List[Engine]] = None):
+        self.primary = primary
+        self.replicas = replicas or []
+        self._next = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+
+        self.primary_statements = 0
+        self.pinned_sessions = 0
+        self.replica_reads = [0] * len(self.replicas)
+        self.replica_lag: List[Optional[float]] = [None] * len(self.replicas)
+
+    def choose_replica(self) -> Engine:
+        if not self.replicas:
+            self.primary_statements += 1
+            return self.primary
+
+        index = next(self._next)
+        self.replica_reads[index] += 1
+        return self.replicas[index]
+
+    def route_to_primary(self) -> Engine:
+        self.primary_statements += 1
+        return self.primary
+
+    def max_lag(self) -> float:
+        lags = [lag for lag in self.replica_lag if lag is not None]
+        return max(lags) if lags else 0.0
+
+    def record_lag(self, index: int, seconds: Optional[float]):
+        self.replica_lag[index] = seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "primary_statements": self.primary_statements,
+            "replica_reads": sum(self.replica_reads),
+            "pinned_sessions": self.pinned_sessions,
+            "replicas": [
+                {
+                    "url": engine.url.render_as_string(hide_password=True),
+                    "reads": reads,
+                    "lag_seconds": round(lag, 3) if lag is not None else None
+                }
+                for engine, reads, lag in zip(self.replicas, self.replica_reads, self.replica_lag)
+            ]
+        }
+
+
+class ReadYourWritesGuard:
+
+    def __init__(self, window_seconds: float = 5.0, max_keys: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._written_at: Dict[str, float] = {}
+
+    def mark_written(self, key: str):
+        now = time.monotonic()
+        self._written_at.pop(key, None)
+        self._written_at[key] = now
+
+        if len(self._written_at) > self.max_keys:
+            for stale in list(itertools.islice(self._written_at, len(self._written_at) - self.max_keys)):
+                del self._written_at[stale]
+
+    def requires_primary(self, key: Optional[str], replica_lag: float = 0.0) -> bool:
+        if key is None:
+            return False
+        written_at = self._written_at.get(key)
+        if written_at is None:
+            return False
+        return time.monotonic() - written_at < max(self.window_seconds, replica_lag)
+
+
+read_your_writes = ReadYourWritesGuard()
+
+
+class RoutingSession(Session):
+
+    def __init__(self, replica_set: ReplicaSet, **kwargs):
+        super().__init__(**kwargs)
+        self.replica_set = replica_set
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("use_primary") or self._flushing or getattr(clause, "is_dml", False):
+            self.info["use_primary"] = True
+            return self.replica_set.route_to_primary()
+        return self.replica_set.choose_replica()
+
+
+def measure_postgres_lag(engine: Engine) -> Optional[float]:
+    if engine.dialect.name != "postgresql":
+        return None
+    try:
+        with engine.connect() as conn:
+            return float(conn.execute(POSTGRES_REPLICA_LAG_QUERY).scalar() or 0.0)
+    except Exception as e:
+        logger.warning(f"Failed to measure replica lag for {engine.url.host}: {str(e)}")
+        return None
+
+
+async def measure_postgres_lag_async(engine) -> Optional[float]:
+    if engine.dialect.name != "postgresql":
+        return None
+    try:
+        async with engine.connect() as conn:
+            return float((await conn.execute(POSTGRES_REPLICA_LAG_QUERY)).scalar() or 0.0)
+    except Exception as e:
+        logger.warning(f"Failed to measure replica lag for {engine.url.host}: {str(e)}")
+        return None
@@ -0,0 +1,135 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PROFILE_DEFAULT = "default"
+SQLITE_PROFILE_PRODUCTION = "production"
+
+PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -64000,
+    "temp_store": "MEMORY"
+}
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Any], read_only: bool = False, immediate: bool = False):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        if immediate:
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    if immediate:
+        @event.listens_for(engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class SQLiteWriteQueue:
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int = 64):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Tuple[Callable[[Session], Any], Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.commit_seconds = 0.0
+
+        self._thread.start()
+
+    def submit(self, fn: Callable[[Session], Any]) -> Future:
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            batch = [job]
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch: List[Tuple[Callable[[Session], Any], Future]]):
+        outcomes = []
+        session = self.session_factory()
+        try:
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        result = fn(session)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+            started = time.monotonic()
+            session.commit()
+            self.commit_seconds += time.monotonic() - started
+        except Exception as e:
+            session.rollback()
+            logger.error(f"SQLite group commit of {len(batch)} writes failed: {str(e)}")
+            outcomes = [(future, None, error or e) for future, _, error in outcomes]
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        for future, result, error in outcomes:
+            self.jobs += 1
+            if error is None:
+                future.set_result(result)
+            else:
+                self.failed_jobs += 1
+                future.set_exception(error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "jobs": self.jobs,
+            "failed_jobs": self.failed_jobs,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "avg_batch": round(self.jobs / self.batches, 2) if self.batches else 0.0,
+            "avg_commit_seconds": round(self.commit_seconds / self.batches, 5) if self.batches else 0.0
+        }
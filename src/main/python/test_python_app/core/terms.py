@@ -0,0 +1,53 @@
+from collections import Counter
+from typing import Dict, List
+import re
+import zlib
+
+MAX_QUERY_TERMS = 32
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'and', 'or', 'it', 'i', 'you', 'me', 'my', 'we', 'this', 'that', 'be', 'do', 'what', 'how', 'can'
+})
+
+
+def tokenize_terms(text: str) -> List[str]:
+    return [term for term in re.findall(r'\b\w+\b', text.lower()) if term not in STOP_WORDS]
+
+
+def term_hash(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+
+def term_frequencies(text: str) -> Dict[int, int]:
+    return dict(Counter(term_hash(term) for term in tokenize_terms(text)))
+
+
+def query_term_hashes(query: str) -> List[int]:
+    return list(term_frequencies(query))[:MAX_QUERY_TERMS]
+
+
+def chunk_term_rows(document_id: str, chunk_id: str, content: str) -> List[Dict[str, any]]:
+    terms = [term_hash(term) for term in tokenize_terms(content)]
+    return [
+        {
+            "term_hash": hashed,
+            "document_id": document_id,
+            "chunk_id": chunk_id,
+            "frequency": frequency,
+            "chunk_length": len(terms)
+        }
+        for hashed, frequency in Counter(terms).items()
+    ]
+
+
+def message_term_rows(conversation_id: str, sequence_number: int, content: str) -> List[Dict[str, any]]:
+    return [
+        {
+            "conversation_id": conversation_id,
+            "sequence_number": sequence_number,
+            "term_hash": hashed,
+            "frequency": frequency
+        }
+        for hashed, frequency in term_frequencies(content).items()
+    ]
@@ -1,12 +1,20 @@
 import enum
 import uuid
 
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Enum, Boolean, Float
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Enum, Boolean, Float, Index, LargeBinary
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+MESSAGE_PREVIEW_LENGTH = 100
+
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
 
 class ConversationMode(str, enum.Enum):
     OPEN_CHAT = "open_chat"
@@ -25,8 +33,12 @@ class User(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     username = Column(String(255), unique=True, nullable=False, index=True)
     email = Column(String(255), unique=True, nullable=True, index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_users_created_id", "created_at", "id"),
+    )
     
     # Relationships
     conversations = relationship("Conversation", back_populates="user", cascade="all, delete-orphan")
@@ -45,13 +57,22 @@ class Conversation(Base):
     mode = Column(Enum(ConversationMode), nullable=False, default=ConversationMode.OPEN_CHAT)
     is_active = Column(Boolean, default=True, nullable=False)
     total_tokens = Column(Integer, default=0, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_sequence_number = Column(Integer, default=0, server_default="0", nullable=False)
+    sequence_counter = Column(Integer, default=0, server_default="0", nullable=False)
+    last_message_preview = Column(String(MESSAGE_PREVIEW_LENGTH), nullable=True)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_conversations_user_updated_id", "user_id", "updated_at", "id"),
+    )
     
     # Relationships
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", order_by="Message.created_at")
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", order_by="Message.sequence_number")
     documents = relationship("Document", secondary="conversation_documents", back_populates="conversations")
+    memory = relationship("ConversationMemory", back_populates="conversation", cascade="all, delete-orphan", uselist=False)
     
     def __repr__(self):
         return f"<Conversation(id={self.id}, mode={self.mode}, title={self.title})>"
@@ -66,7 +87,11 @@ class Message(Base):
     content = Column(Text, nullable=False)
     tokens = Column(Integer, default=0, nullable=False)
     sequence_number = Column(Integer, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ux_messages_conversation_sequence", "conversation_id", "sequence_number", unique=True),
+    )
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
@@ -75,6 +100,18 @@ class Message(Base):
         return f"<Message(id={self.id}, role={self.role}, seq={self.sequence_number})>"
 
 
+class MessageTerm(Base):
+    __tablename__ = "message_terms"
+    
+    conversation_id = Column(String(36), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    term_hash = Column(Integer, primary_key=True)
+    sequence_number = Column(Integer, primary_key=True)
+    frequency = Column(Integer, default=1, nullable=False)
+    
+    def __repr__(self):
+        return f"<MessageTerm(conversation_id={self.conversation_id}, term={self.term_hash}, seq={self.sequence_number})>"
+
+
 class Document(Base):
     __tablename__ = "documents"
     
@@ -84,7 +121,13 @@ class Document(Base):
     content = Column(Text, nullable=False)
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String(100), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    chunk_count = Column(Integer, default=0, server_default="0", nullable=False)
+    term_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_documents_user_created_id", "user_id", "created_at", "id"),
+    )
     
     # Relationships
     user = relationship("User", back_populates="documents")
@@ -112,9 +155,55 @@ class DocumentChunk(Base):
         return f"<DocumentChunk(id={self.id}, doc_id={self.document_id}, index={self.chunk_index})>"
 
 
+class ChunkTerm(Base):
+    __tablename__ = "chunk_terms"
+    
+    term_hash = Column(Integer, primary_key=True)
+    document_id = Column(String(36), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    chunk_id = Column(String(36), ForeignKey("document_chunks.id", ondelete="CASCADE"), primary_key=True)
+    frequency = Column(Integer, nullable=False)
+    chunk_length = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_chunk_terms_document", "document_id"),
+    )
+    
+    def __repr__(self):
+        return f"<ChunkTerm(term={self.term_hash}, chunk_id={self.chunk_id}, tf={self.frequency})>"
+
+
+class ChunkEmbedding(Base):
+    __tablename__ = "chunk_embeddings"
+    
+    chunk_id = Column(String(36), ForeignKey("document_chunks.id", ondelete="CASCADE"), primary_key=True)
+    document_id = Column(String(36), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    model = Column(String(100), nullable=False)
+    embedding = Column(LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f"<ChunkEmbedding(chunk_id={self.chunk_id}, model={self.model})>"
+
+
 class ConversationDocument(Base):
     __tablename__ = "conversation_documents"
     
     conversation_id = Column(String(36), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
     document_id = Column(String(36), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+
+
+class ConversationMemory(Base):
+    __tablename__ = "conversation_summaries"
+    
+    conversation_id = Column(String(36), ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    summarized_through = Column(Integer, nullable=False)
+    summarized_tokens = Column(Integer, default=0, nullable=False)
+    summary_tokens = Column(Integer, default=0, nullable=False)
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Relationships
+    conversation = relationship("Conversation", back_populates="memory")
+    
+    def __repr__(self):
+        return f"<ConversationMemory(conversation_id={self.conversation_id}, through={self.summarized_through})>"
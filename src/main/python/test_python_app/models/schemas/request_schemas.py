@@ -115,10 +115,7 @@ class DocumentResponse(BaseModel):
 
 class PaginatedResponse(BaseModel):
     items: List[ConversationSummary]
-    total: int
-    page: int
     page_size: int
-    total_pages: int
 
 
 class ErrorResponse(BaseModel):
@@ -132,3 +129,4 @@ class HealthCheckResponse(BaseModel):
     timestamp: datetime
     database: str
     llm_provider: str
+    llm_circuit_breaker: Optional[str] = None
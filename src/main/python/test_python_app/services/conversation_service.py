@@ -1,14 +1,26 @@
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, List, AsyncIterator, Optional, Tuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+import anyio
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from ..core.database import AsyncDatabaseManager, get_async_db_manager
+from ..core.deadline import Deadline
+from ..core.migrations import refresh_conversation_counters
+from ..core.pagination import DEFAULT_PAGE_SIZE, keyset_before, split_page
+from ..core.exceptions import DeadlineExceededException
+from .history_cache import HistoryCache, trim_to_budget
 from .llm_service import LLMService
+from .message_index import MessageIndex
 from .rag_service import RAGService
+from .summary_memory import SummaryMemory
 from ..models.domain.entities import (
-    User, Conversation, Message, Document,
-    ConversationMode, MessageRole, ConversationDocument
+    User, Conversation, ConversationMemory, Message, MessageTerm, Document,
+    ConversationMode, MessageRole, ConversationDocument, MESSAGE_PREVIEW_LENGTH
 )
 from ..models.schemas.request_schemas import (
     CreateConversationRequest, AddMessageRequest,
@@ -18,147 +30,554 @@ from ..models.schemas.request_schemas import (
 
 logger = logging.getLogger(__name__)
 
+DISCONNECT_DISCARD = "discard"
+DISCONNECT_PERSIST_PARTIAL = "persist_partial"
+DISCONNECT_POLICIES = (DISCONNECT_DISCARD, DISCONNECT_PERSIST_PARTIAL)
+
+TURN_SEQUENCE_SLOTS = 2
+MAX_RESPONSE_TOKENS = 1000
+HISTORY_BATCH_SIZE = 50
+
+APOLOGY_MESSAGE = "I apologize, but I'm having trouble generating a response right now. Please try again."
+
+
+class PendingTurn:
+    
+    def __init__(
+        self,
+        conversation_id: str,
+        user_id: str,
+        mode: str,
+        user_message_id: str,
+        user_tokens: int,
+        assistant_sequence: int,
+        llm_messages: List[Dict[str, any]],
+        new_conversation: bool = False,
+        summarized_tokens: int = 0
+    ):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.mode = mode
+        self.user_message_id = user_message_id
+        self.user_tokens = user_tokens
+        self.assistant_sequence = assistant_sequence
+        self.llm_messages = llm_messages
+        self.new_conversation = new_conversation
+        self.summarized_tokens = summarized_tokens
+
 
 class ConversationService:
     
-    def __init__(self, llm_service: LLMService, rag_service: RAGService):
+    def __init__(
+        self,
+        llm_service: LLMService,
+        rag_service: RAGService,
+        disconnect_policy: str = DISCONNECT_DISCARD,
+        db_manager: Optional[AsyncDatabaseManager] = None,
+        history_cache: Optional[HistoryCache] = None,
+        memory: Optional[SummaryMemory] = None,
+        message_index: Optional[MessageIndex] = None
+    ):
+        if disconnect_policy not in DISCONNECT_POLICIES:
+            raise ValueError(f"Unknown disconnect policy: {disconnect_policy}")
+        
         self.llm_service = llm_service
         self.rag_service = rag_service
-        logger.info("Conversation Service initialized")
+        self.disconnect_policy = disconnect_policy
+        self._db_manager = db_manager
+        self.history_cache = history_cache
+        self.memory = memory
+        self.message_index = message_index
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        logger.info(
+            f"Conversation Service initialized (disconnect policy: {disconnect_policy}, "
+            f"memory: {'summary' if memory is not None else 'window'})"
+        )
+    
+    @property
+    def db_manager(self) -> AsyncDatabaseManager:
+        return self._db_manager or get_async_db_manager()
     
     async def create_conversation(
         self,
-        db: Session,
-        request: CreateConversationRequest
+        request: CreateConversationRequest,
+        deadline: Optional[Deadline] = None
     ) -> ConversationResponse:
-        user = db.query(User).filter(User.id == request.user_id).first()
-        if not user:
-            raise ValueError(f"User not found: {request.user_id}")
-        
-        if request.mode == "grounded_rag" and request.document_ids:
-            doc_count = db.query(Document).filter(
-                Document.id.in_(request.document_ids),
-                Document.user_id == request.user_id
-            ).count()
-            if doc_count != len(request.document_ids):
-                raise ValueError("One or more documents not found or don't belong to user")
-        
-        conversation = Conversation(
-            user_id=request.user_id,
-            title=request.title or self._generate_title(request.first_message),
-            mode=ConversationMode(request.mode.value),
-            is_active=True,
-            total_tokens=0
-        )
-        db.add(conversation)
-        db.flush()
-        
-        if request.mode == "grounded_rag" and request.document_ids:
-            for doc_id in request.document_ids:
-                conv_doc = ConversationDocument(
-                    conversation_id=conversation.id,
-                    document_id=doc_id
-                )
-                db.add(conv_doc)
-        
-        user_message = Message(
-            conversation_id=conversation.id,
-            role=MessageRole.USER,
-            content=request.first_message,
-            tokens=self.llm_service.estimate_tokens(request.first_message),
-            sequence_number=1
-        )
-        db.add(user_message)
-        db.flush()
-        
-        assistant_message = await self._generate_assistant_response(
-            db=db,
-            conversation=conversation,
-            user_message_content=request.first_message,
-            sequence_number=2
-        )
-        
-        conversation.total_tokens = user_message.tokens + assistant_message.tokens
-        db.commit()
-        
-        logger.info(f"Created conversation {conversation.id} with mode {conversation.mode}")
-        
-        return ConversationResponse(
-            conversation_id=conversation.id,
-            message=MessageResponse.model_validate(assistant_message),
-            total_tokens=conversation.total_tokens
-        )
+        turn = await self._begin_conversation(request)
+        try:
+            content, tokens = await self._generate(turn, deadline)
+        except BaseException:
+            await self._abandon_turn(turn)
+            raise
+        
+        response = await self._complete_turn(turn, content, tokens)
+        logger.info(f"Created conversation {turn.conversation_id} with mode {turn.mode}")
+        return response
     
     async def add_message(
         self,
-        db: Session,
         conversation_id: str,
-        request: AddMessageRequest
+        request: AddMessageRequest,
+        deadline: Optional[Deadline] = None
     ) -> ConversationResponse:
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
-        
-        if not conversation:
-            raise ValueError(f"Conversation not found: {conversation_id}")
-        
-        if not conversation.is_active:
-            raise ValueError("Conversation is inactive")
+        turn = await self._begin_turn(conversation_id, request.content)
+        try:
+            content, tokens = await self._generate(turn, deadline)
+        except BaseException:
+            await self._abandon_turn(turn)
+            raise
         
-        max_seq = db.query(func.max(Message.sequence_number)).filter(
-            Message.conversation_id == conversation_id
-        ).scalar() or 0
+        response = await self._complete_turn(turn, content, tokens)
+        logger.info(f"Added message to conversation {conversation_id}")
+        return response
+    
+    async def stream_message(
+        self,
+        conversation_id: str,
+        request: AddMessageRequest,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, any]]:
+        turn = await self._begin_turn(conversation_id, request.content)
         
+        content_parts = []
+        tokens = None
+        try:
+            yield {
+                "event": "start",
+                "data": {"conversation_id": turn.conversation_id, "user_message_id": turn.user_message_id}
+            }
+            
+            async for event in self.llm_service.stream_response(
+                messages=turn.llm_messages,
+                temperature=0.7,
+                max_response_tokens=MAX_RESPONSE_TOKENS,
+                mode=turn.mode,
+                deadline=deadline
+            ):
+                if event["type"] == "delta":
+                    content_parts.append(event["content"])
+                    yield {"event": "delta", "data": {"content": event["content"]}}
+                else:
+                    tokens = event["completion_tokens"]
+        except DeadlineExceededException:
+            await self._abandon_turn(turn)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            await self._abandon_turn(turn, "".join(content_parts))
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {str(e)}")
+            if not content_parts:
+                content_parts.append(APOLOGY_MESSAGE)
+                yield {"event": "delta", "data": {"content": APOLOGY_MESSAGE}}
+        
+        response = await self._complete_turn(turn, "".join(content_parts), tokens)
+        logger.info(f"Streamed message to conversation {conversation_id}")
+        yield {"event": "done", "data": response.model_dump(mode="json")}
+    
+    async def _begin_conversation(self, request: CreateConversationRequest) -> PendingTurn:
+        async with self.db_manager.get_session() as db:
+            user = await db.scalar(select(User).where(User.id == request.user_id))
+            if not user:
+                raise ValueError(f"User not found: {request.user_id}")
+            
+            if request.mode == "grounded_rag" and request.document_ids:
+                doc_count = await db.scalar(select(func.count(Document.id)).where(
+                    Document.id.in_(request.document_ids),
+                    Document.user_id == request.user_id
+                ))
+                if doc_count != len(request.document_ids):
+                    raise ValueError("One or more documents not found or don't belong to user")
+            
+            conversation = Conversation(
+                user_id=request.user_id,
+                title=request.title or self._generate_title(request.first_message),
+                mode=ConversationMode(request.mode.value),
+                is_active=True,
+                total_tokens=0,
+                sequence_counter=TURN_SEQUENCE_SLOTS
+            )
+            db.add(conversation)
+            await db.flush()
+            
+            if request.mode == "grounded_rag" and request.document_ids:
+                for doc_id in request.document_ids:
+                    conv_doc = ConversationDocument(
+                        conversation_id=conversation.id,
+                        document_id=doc_id
+                    )
+                    db.add(conv_doc)
+            
+            return await self._write_user_message(
+                db, conversation, request.first_message, sequence_number=1, new_conversation=True
+            )
+    
+    async def _begin_turn(self, conversation_id: str, content: str) -> PendingTurn:
+        async with self.db_manager.get_session() as db:
+            conversation = await db.scalar(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(sequence_counter=Conversation.sequence_counter + TURN_SEQUENCE_SLOTS)
+                .returning(Conversation)
+                .execution_options(synchronize_session=False)
+            )
+            if not conversation:
+                raise ValueError(f"Conversation not found: {conversation_id}")
+            if not conversation.is_active:
+                raise ValueError("Conversation is inactive")
+            
+            sequence_number = conversation.sequence_counter - TURN_SEQUENCE_SLOTS + 1
+            return await self._write_user_message(db, conversation, content, sequence_number)
+    
+    async def _write_user_message(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        content: str,
+        sequence_number: int,
+        new_conversation: bool = False
+    ) -> PendingTurn:
+        persisted_through = conversation.last_sequence_number
         user_message = Message(
             conversation_id=conversation.id,
             role=MessageRole.USER,
-            content=request.content,
-            tokens=self.llm_service.estimate_tokens(request.content),
-            sequence_number=max_seq + 1
+            content=content,
+            tokens=self.llm_service.estimate_tokens(content),
+            sequence_number=sequence_number
         )
         db.add(user_message)
-        db.flush()
-        
-        assistant_message = await self._generate_assistant_response(
-            db=db,
-            conversation=conversation,
-            user_message_content=request.content,
-            sequence_number=max_seq + 2
+        await self._record_message(db, user_message)
+        await db.flush()
+        if self.message_index is not None:
+            await self.message_index.index(db, user_message)
+        
+        token_budget = self.llm_service.history_budget(MAX_RESPONSE_TOKENS)
+        memory = None
+        if self.memory is not None and not new_conversation:
+            memory = await db.get(ConversationMemory, conversation.id)
+        summarized_through = 0
+        if memory is not None:
+            token_budget -= memory.summary_tokens
+            summarized_through = memory.summarized_through
+        
+        history = None
+        if self.history_cache is not None:
+            cached = self.history_cache.get(conversation.id, sequence_number - 1)
+            if cached is not None:
+                recent = [m for m in cached if m["sequence_number"] > summarized_through]
+                history = trim_to_budget(recent + [self._prompt_message(user_message)], token_budget)
+        cache_hit = history is not None
+        if not cache_hit:
+            messages = await self._load_history_tail(
+                db, conversation.id, sequence_number, token_budget, after_sequence=summarized_through
+            )
+            history = [self._prompt_message(message) for message in messages]
+        
+        recalled = []
+        if self.message_index is not None and history and history[0]["sequence_number"] > 1:
+            recalled = [self._prompt_message(message) for message in await self.message_index.recall(
+                db,
+                conversation.id,
+                content,
+                before_sequence=history[0]["sequence_number"],
+                token_budget=min(self.message_index.recall_tokens, token_budget - user_message.tokens)
+            )]
+        
+        document_ids = []
+        if conversation.mode == ConversationMode.GROUNDED_RAG:
+            document_ids = (await db.scalars(
+                select(ConversationDocument.document_id).where(ConversationDocument.conversation_id == conversation.id)
+            )).all()
+        await db.commit()
+        self.db_manager.mark_written(conversation.id, f"user:{conversation.user_id}")
+        
+        if self.history_cache is not None:
+            if cache_hit or persisted_through == sequence_number - 1:
+                self.history_cache.put(conversation.id, sequence_number, history)
+            else:
+                self.history_cache.invalidate(conversation.id)
+        
+        turn = PendingTurn(
+            conversation_id=conversation.id,
+            user_id=conversation.user_id,
+            mode=conversation.mode.value,
+            user_message_id=user_message.id,
+            user_tokens=user_message.tokens,
+            assistant_sequence=sequence_number + 1,
+            llm_messages=[],
+            new_conversation=new_conversation,
+            summarized_tokens=memory.summarized_tokens if memory is not None else 0
         )
-        
-        conversation.total_tokens += user_message.tokens + assistant_message.tokens
-        db.commit()
-        
-        logger.info(f"Added message to conversation {conversation_id}")
-        
+        try:
+            context = await self._retrieve_context(conversation.user_id, document_ids, content)
+        except BaseException:
+            await self._abandon_turn(turn)
+            raise
+        summary = memory.summary if memory is not None else None
+        turn.llm_messages = self._build_llm_messages(conversation, history, content, context, summary, recalled)
+        return turn
+    
+    async def _generate(self, turn: PendingTurn, deadline: Optional[Deadline]) -> Tuple[str, int]:
+        try:
+            response = await self.llm_service.generate_response(
+                messages=turn.llm_messages,
+                temperature=0.7,
+                max_response_tokens=MAX_RESPONSE_TOKENS,
+                mode=turn.mode,
+                deadline=deadline
+            )
+            return response["content"], response["completion_tokens"]
+        except DeadlineExceededException:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating LLM response: {str(e)}")
+            return APOLOGY_MESSAGE, self.llm_service.estimate_tokens(APOLOGY_MESSAGE)
+    
+    async def _complete_turn(self, turn: PendingTurn, content: str, tokens: Optional[int]) -> ConversationResponse:
+        async with self.db_manager.get_session() as db:
+            assistant_message = Message(
+                conversation_id=turn.conversation_id,
+                role=MessageRole.ASSISTANT,
+                content=content,
+                tokens=tokens if tokens else self.llm_service.estimate_tokens(content),
+                sequence_number=turn.assistant_sequence
+            )
+            db.add(assistant_message)
+            total_tokens = await self._record_message(db, assistant_message)
+            await db.flush()
+            if self.message_index is not None:
+                await self.message_index.index(db, assistant_message)
+            await db.refresh(assistant_message, ["created_at"])
+            await db.commit()
+        
+        self.db_manager.mark_written(turn.conversation_id, f"user:{turn.user_id}")
+        if self.history_cache is not None:
+            self.history_cache.append(
+                turn.conversation_id,
+                expected_version=turn.assistant_sequence - 1,
+                message=self._prompt_message(assistant_message),
+                version=turn.assistant_sequence,
+                token_budget=self.llm_service.history_budget(MAX_RESPONSE_TOKENS)
+            )
+        if self.memory is not None and self.memory.should_refresh(total_tokens - turn.summarized_tokens):
+            self._schedule_summary_refresh(turn.conversation_id)
         return ConversationResponse(
-            conversation_id=conversation.id,
+            conversation_id=turn.conversation_id,
             message=MessageResponse.model_validate(assistant_message),
-            total_tokens=conversation.total_tokens
+            total_tokens=total_tokens
+        )
+    
+    async def _abandon_turn(self, turn: PendingTurn, partial_content: str = ""):
+        # A client disconnect cancels the response body through an anyio cancel scope, which would
+        # otherwise cancel the compensating writes at their first await as well.
+        with anyio.CancelScope(shield=True):
+            await self._compensate_turn(turn, partial_content)
+    
+    async def _compensate_turn(self, turn: PendingTurn, partial_content: str):
+        if self.disconnect_policy == DISCONNECT_PERSIST_PARTIAL:
+            if partial_content:
+                await self._complete_turn(turn, partial_content, None)
+            else:
+                self._invalidate_history(turn.conversation_id)
+            logger.info(f"Generation abandoned, kept partial turn in conversation {turn.conversation_id}")
+            return
+        
+        async with self.db_manager.get_session() as db:
+            if turn.new_conversation:
+                for model in (Message, MessageTerm, ConversationDocument):
+                    await db.execute(delete(model).where(model.conversation_id == turn.conversation_id))
+                await db.execute(delete(Conversation).where(Conversation.id == turn.conversation_id))
+            else:
+                await db.execute(delete(Message).where(Message.id == turn.user_message_id))
+                if self.message_index is not None:
+                    await self.message_index.remove(db, turn.conversation_id, turn.assistant_sequence - 1)
+                await db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == turn.conversation_id)
+                    .values(total_tokens=Conversation.total_tokens - turn.user_tokens)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(refresh_conversation_counters([turn.conversation_id]))
+        self._invalidate_history(turn.conversation_id)
+        self.db_manager.mark_written(turn.conversation_id, f"user:{turn.user_id}")
+        logger.info(f"Generation abandoned, discarded turn in conversation {turn.conversation_id}")
+    
+    def _invalidate_history(self, conversation_id: str):
+        if self.history_cache is not None:
+            self.history_cache.invalidate(conversation_id)
+    
+    def _prompt_message(self, message: Message) -> Dict[str, any]:
+        return {
+            "role": message.role.value,
+            "content": message.content,
+            "tokens": message.tokens,
+            "sequence_number": message.sequence_number
+        }
+    
+    async def _record_message(self, db: AsyncSession, message: Message) -> int:
+        is_latest = Conversation.last_sequence_number < message.sequence_number
+        return await db.scalar(
+            update(Conversation)
+            .where(Conversation.id == message.conversation_id)
+            .values(
+                total_tokens=Conversation.total_tokens + message.tokens,
+                message_count=Conversation.message_count + 1,
+                last_sequence_number=case(
+                    (is_latest, message.sequence_number), else_=Conversation.last_sequence_number
+                ),
+                last_message_preview=case(
+                    (is_latest, message.content[:MESSAGE_PREVIEW_LENGTH]), else_=Conversation.last_message_preview
+                )
+            )
+            .returning(Conversation.total_tokens)
+            .execution_options(synchronize_session=False)
         )
     
-    async def _generate_assistant_response(
+    async def _load_history_tail(
         self,
-        db: Session,
-        conversation: Conversation,
-        user_message_content: str,
-        sequence_number: int
-    ) -> Message:
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id
-        ).order_by(Message.sequence_number).all()
-        
-        context = None
-        if conversation.mode == ConversationMode.GROUNDED_RAG:
-            document_ids = [doc.id for doc in conversation.documents]
-            if document_ids:
-                context = self.rag_service.retrieve_context(
-                    db=db,
-                    document_ids=document_ids,
-                    query=user_message_content,
-                    top_k=3
+        db: AsyncSession,
+        conversation_id: str,
+        up_to_sequence: int,
+        token_budget: int,
+        after_sequence: int = 0
+    ) -> List[Message]:
+        tail = []
+        used_tokens = 0
+        before = up_to_sequence + 1
+        
+        while True:
+            batch = (await db.scalars(
+                select(Message)
+                .where(
+                    Message.conversation_id == conversation_id,
+                    Message.sequence_number < before,
+                    Message.sequence_number > after_sequence
                 )
+                .order_by(Message.sequence_number.desc())
+                .limit(HISTORY_BATCH_SIZE)
+            )).all()
+            
+            for message in batch:
+                if used_tokens + message.tokens > token_budget:
+                    tail.reverse()
+                    return tail
+                tail.append(message)
+                used_tokens += message.tokens
+            
+            if len(batch) < HISTORY_BATCH_SIZE:
+                tail.reverse()
+                return tail
+            before = batch[-1].sequence_number
+    
+    def _schedule_summary_refresh(self, conversation_id: str):
+        if conversation_id in self._summary_tasks:
+            return
+        task = asyncio.create_task(self._refresh_summary(conversation_id))
+        self._summary_tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(conversation_id, None))
+    
+    async def wait_for_summaries(self):
+        if self._summary_tasks:
+            await asyncio.gather(*self._summary_tasks.values(), return_exceptions=True)
+    
+    async def _refresh_summary(self, conversation_id: str):
+        try:
+            async with self.db_manager.get_session() as db:
+                conversation = await db.get(Conversation, conversation_id)
+                if conversation is None or conversation.sequence_counter != conversation.last_sequence_number:
+                    return
+                memory = await db.get(ConversationMemory, conversation_id)
+                summarized_through = memory.summarized_through if memory is not None else 0
+                unsummarized = (await db.scalars(
+                    select(Message)
+                    .where(Message.conversation_id == conversation_id, Message.sequence_number > summarized_through)
+                    .order_by(Message.sequence_number)
+                )).all()
+                messages = [self._prompt_message(message) for message in unsummarized]
+            
+            previous_summary = memory.summary if memory is not None else None
+            summarized_tokens = memory.summarized_tokens if memory is not None else 0
+            while self.memory.should_refresh(sum(m["tokens"] for m in messages)):
+                folded, messages = self.memory.split_for_folding(messages)
+                if not folded:
+                    break
+                
+                summary = await self.memory.summarize(previous_summary, folded)
+                values = {
+                    "summary": summary,
+                    "summarized_through": folded[-1]["sequence_number"],
+                    "summarized_tokens": summarized_tokens + sum(m["tokens"] for m in folded),
+                    "summary_tokens": self.memory.summary_message(summary)["tokens"]
+                }
+                if not await self._store_summary(conversation_id, summarized_through, previous_summary is None, values):
+                    logger.info(f"Summary of conversation {conversation_id} was refreshed concurrently, dropping ours")
+                    return
+                
+                previous_summary = summary
+                summarized_through = values["summarized_through"]
+                summarized_tokens = values["summarized_tokens"]
+                logger.info(f"Folded {len(folded)} messages into the summary of conversation {conversation_id}")
+        except Exception as e:
+            logger.warning(f"Summary refresh failed for conversation {conversation_id}: {str(e)}")
+    
+    async def _store_summary(
+        self,
+        conversation_id: str,
+        expected_through: int,
+        is_new: bool,
+        values: Dict[str, any]
+    ) -> bool:
+        try:
+            async with self.db_manager.get_session() as db:
+                if is_new:
+                    db.add(ConversationMemory(conversation_id=conversation_id, **values))
+                    await db.flush()
+                    return True
+                
+                result = await db.execute(
+                    update(ConversationMemory)
+                    .where(
+                        ConversationMemory.conversation_id == conversation_id,
+                        ConversationMemory.summarized_through == expected_through
+                    )
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                return result.rowcount == 1
+        except IntegrityError:
+            return False
+    
+    async def _retrieve_context(self, user_id: str, document_ids: List[str], query: str) -> Optional[str]:
+        if not document_ids:
+            return None
         
+        try:
+            if self.rag_service.session_factory is not None:
+                return await self.rag_service.retrieve_context_concurrently(
+                    list(document_ids), query, top_k=3, consistency_key=f"user:{user_id}"
+                )
+            async with self.db_manager.get_read_session(f"user:{user_id}") as db:
+                return await db.run_sync(
+                    lambda sync_db: self.rag_service.retrieve_context(
+                        db=sync_db,
+                        document_ids=list(document_ids),
+                        query=query,
+                        top_k=3
+                    )
+                )
+        except Exception as e:
+            logger.warning(f"Context retrieval failed, answering without documents: {str(e)}")
+            return None
+    
+    def _build_llm_messages(
+        self,
+        conversation: Conversation,
+        messages: List[Dict[str, any]],
+        user_message_content: str,
+        context: Optional[str] = None,
+        summary: Optional[str] = None,
+        recalled: Optional[List[Dict[str, any]]] = None
+    ) -> List[Dict[str, str]]:
         llm_messages = []
         
         system_prompt = self.llm_service.create_system_prompt(
@@ -167,119 +586,116 @@ class ConversationService:
         )
         llm_messages.append({"role": "system", "content": system_prompt})
         
-        for msg in messages:
-            llm_messages.append({
-                "role": msg.role.value,
-                "content": msg.content
-            })
+        if summary:
+            llm_messages.append(self.memory.summary_message(summary))
         
-        if not messages or messages[-1].role != MessageRole.USER:
-            llm_messages.append({"role": "user", "content": user_message_content})
+        if recalled:
+            reserved_tokens = sum(self.llm_service.message_tokens(m) for m in llm_messages + recalled)
+            window_budget = self.llm_service.history_budget(MAX_RESPONSE_TOKENS) - reserved_tokens
+            messages = recalled + trim_to_budget(messages, window_budget)
         
-        try:
-            response = await self.llm_service.generate_response(
-                messages=llm_messages,
-                temperature=0.7,
-                max_response_tokens=1000
-            )
-            
-            content = response["content"]
-            tokens = response["tokens_used"]
-            
-        except Exception as e:
-            logger.error(f"Error generating LLM response: {str(e)}")
-            content = "I apologize, but I'm having trouble generating a response right now. Please try again."
-            tokens = self.llm_service.estimate_tokens(content)
+        llm_messages.extend(messages)
         
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            role=MessageRole.ASSISTANT,
-            content=content,
-            tokens=tokens,
-            sequence_number=sequence_number
-        )
-        db.add(assistant_message)
+        if not messages or messages[-1]["role"] != MessageRole.USER.value:
+            llm_messages.append({"role": "user", "content": user_message_content})
         
-        return assistant_message
+        return llm_messages
     
-    def get_conversations(
+    async def get_conversations(
         self,
-        db: Session,
         user_id: str,
-        page: int = 1,
-        page_size: int = 20
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> Dict:
-        total = db.query(Conversation).filter(
-            Conversation.user_id == user_id
-        ).count()
-        
-        offset = (page - 1) * page_size
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user_id
-        ).order_by(Conversation.updated_at.desc()).offset(offset).limit(page_size).all()
-        
-        summaries = []
-        for conv in conversations:
-            message_count = len(conv.messages)
-            last_message = conv.messages[-1].content if conv.messages else None
+        query = select(Conversation).where(Conversation.user_id == user_id)
+        after_cursor = keyset_before(Conversation.updated_at, Conversation.id, cursor)
+        if after_cursor is not None:
+            query = query.where(after_cursor)
+        
+        async with self.db_manager.get_read_session(f"user:{user_id}") as db:
+            rows = (await db.scalars(
+                query
+                .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+                .limit(page_size + 1)
+            )).all()
             
-            summary = ConversationSummary(
-                id=conv.id,
-                title=conv.title,
-                mode=conv.mode,
-                is_active=conv.is_active,
-                message_count=message_count,
-                total_tokens=conv.total_tokens,
-                created_at=conv.created_at,
-                updated_at=conv.updated_at,
-                last_message=last_message[:100] if last_message else None
-            )
-            summaries.append(summary)
-        
-        total_pages = (total + page_size - 1) // page_size
+            total = None
+            if include_total:
+                total = await db.scalar(
+                    select(func.count(Conversation.id)).where(Conversation.user_id == user_id)
+                )
+            
+            conversations, next_cursor = split_page(rows, page_size, "updated_at")
+            summaries = []
+            for conv in conversations:
+                summary = ConversationSummary(
+                    id=conv.id,
+                    title=conv.title,
+                    mode=conv.mode,
+                    is_active=conv.is_active,
+                    message_count=conv.message_count,
+                    total_tokens=conv.total_tokens,
+                    created_at=conv.created_at,
+                    updated_at=conv.updated_at,
+                    last_message=conv.last_message_preview
+                )
+                summaries.append(summary)
         
         return {
             "items": summaries,
-            "total": total,
-            "page": page,
             "page_size": page_size,
-            "total_pages": total_pages
+            "next_cursor": next_cursor,
+            "total": total
         }
     
-    def get_conversation_detail(self, db: Session, conversation_id: str) -> ConversationDetail:
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
-        
-        if not conversation:
-            raise ValueError(f"Conversation not found: {conversation_id}")
-        
-        messages = [MessageResponse.model_validate(msg) for msg in conversation.messages]
-        document_ids = [doc.id for doc in conversation.documents] if conversation.documents else None
-        
-        return ConversationDetail(
-            id=conversation.id,
-            user_id=conversation.user_id,
-            title=conversation.title,
-            mode=conversation.mode,
-            is_active=conversation.is_active,
-            total_tokens=conversation.total_tokens,
-            created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            messages=messages,
-            document_ids=document_ids
-        )
+    async def get_conversation_detail(self, conversation_id: str) -> ConversationDetail:
+        async with self.db_manager.get_read_session(conversation_id) as db:
+            conversation = await db.scalar(
+                select(Conversation)
+                .where(Conversation.id == conversation_id)
+                .options(selectinload(Conversation.messages), selectinload(Conversation.documents))
+            )
+            
+            if not conversation:
+                raise ValueError(f"Conversation not found: {conversation_id}")
+            
+            messages = [MessageResponse.model_validate(msg) for msg in conversation.messages]
+            document_ids = [doc.id for doc in conversation.documents] if conversation.documents else None
+            
+            return ConversationDetail(
+                id=conversation.id,
+                user_id=conversation.user_id,
+                title=conversation.title,
+                mode=conversation.mode,
+                is_active=conversation.is_active,
+                total_tokens=conversation.total_tokens,
+                created_at=conversation.created_at,
+                updated_at=conversation.updated_at,
+                messages=messages,
+                document_ids=document_ids
+            )
     
-    def delete_conversation(self, db: Session, conversation_id: str) -> bool:
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
-        
-        if not conversation:
-            raise ValueError(f"Conversation not found: {conversation_id}")
-        
-        db.delete(conversation)
-        db.commit()
+    async def delete_conversation(self, conversation_id: str) -> bool:
+        async with self.db_manager.get_session() as db:
+            conversation = await db.scalar(
+                select(Conversation)
+                .where(Conversation.id == conversation_id)
+                .options(
+                    selectinload(Conversation.messages),
+                    selectinload(Conversation.documents),
+                    selectinload(Conversation.memory)
+                )
+            )
+            
+            if not conversation:
+                raise ValueError(f"Conversation not found: {conversation_id}")
+            
+            user_id = conversation.user_id
+            await db.execute(delete(MessageTerm).where(MessageTerm.conversation_id == conversation_id))
+            await db.delete(conversation)
+        self.db_manager.mark_written(conversation_id, f"user:{user_id}")
+        self._invalidate_history(conversation_id)
         
         logger.info(f"Deleted conversation {conversation_id}")
         return True
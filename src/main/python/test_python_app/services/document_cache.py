@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class DocumentIndexCache:
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_build(self, document_id: str, signature: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(document_id)
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        entry = build()
+        with self._lock:
+            self._put(document_id, entry)
+        return entry
+
+    def invalidate(self, document_id: str):
+        with self._lock:
+            if self._remove(document_id):
+                self._invalidations += 1
+
+    def _put(self, document_id: str, entry: Any):
+        self._remove(document_id)
+        if entry.size > self.max_bytes:
+            return
+
+        self._entries[document_id] = entry
+        self._resident_bytes += entry.size
+        while self._resident_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._resident_bytes -= evicted.size
+            self._evictions += 1
+
+    def _remove(self, document_id: str) -> bool:
+        entry: Optional[Any] = self._entries.pop(document_id, None)
+        if entry is None:
+            return False
+        self._resident_bytes -= entry.size
+        return True
+
+    def get_stats(self) -> Dict[str, any]:
+        lookups = self._hits + self._misses
+        return {
+            "documents": len(self._entries),
+            "resident_bytes": self._resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations
+        }
@@ -0,0 +1,110 @@
+import logging
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+def message_size(message: Dict[str, any]) -> int:
+    return MESSAGE_OVERHEAD_BYTES + sys.getsizeof(message.get("content", ""))
+
+
+def trim_to_budget(messages: List[Dict[str, any]], token_budget: int) -> List[Dict[str, any]]:
+    used_tokens = 0
+    start = len(messages)
+    while start > 0 and used_tokens + messages[start - 1]["tokens"] <= token_budget:
+        start -= 1
+        used_tokens += messages[start]["tokens"]
+    return messages[start:]
+
+
+class HistoryEntry:
+
+    def __init__(self, version: int, messages: List[Dict[str, any]]):
+        self.version = version
+        self.messages = messages
+        self.size = sum(message_size(m) for m in messages)
+
+
+class HistoryCache:
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, HistoryEntry]" = OrderedDict()
+        self._resident_bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+        logger.info(f"History cache initialized (max_bytes={max_bytes})")
+
+    def get(self, conversation_id: str, version: int) -> Optional[List[Dict[str, any]]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry.version != version:
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(conversation_id)
+        self._hits += 1
+        return list(entry.messages)
+
+    def put(self, conversation_id: str, version: int, messages: List[Dict[str, any]]):
+        self._remove(conversation_id)
+        entry = HistoryEntry(version, list(messages))
+        if entry.size > self.max_bytes:
+            return
+
+        self._entries[conversation_id] = entry
+        self._resident_bytes += entry.size
+        while self._resident_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._resident_bytes -= evicted.size
+            self._evictions += 1
+
+    def append(
+        self,
+        conversation_id: str,
+        expected_version: int,
+        message: Dict[str, any],
+        version: int,
+        token_budget: int
+    ):
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return
+        if entry.version != expected_version:
+            self.invalidate(conversation_id)
+            return
+        self.put(conversation_id, version, trim_to_budget(entry.messages + [message], token_budget))
+
+    def invalidate(self, conversation_id: str):
+        if self._remove(conversation_id):
+            self._invalidations += 1
+
+    def _remove(self, conversation_id: str) -> bool:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is None:
+            return False
+        self._resident_bytes -= entry.size
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "resident_bytes": self._resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations
+        }
@@ -1,35 +1,169 @@
 import os
+import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, AsyncIterator
 import httpx
 
+from ..core.deadline import Deadline
+from ..core.exceptions import LLMProviderException, CircuitOpenException, DeadlineExceededException
+from ..core.http_client import PooledHTTPClient
+from .tokenizer import TokenCounter, get_tokenizer
+from .response_cache import ResponseCache, build_prompt_key
+from .single_flight import SingleFlight
+from .rate_limiter import RateLimiter, RateLimitPermit, parse_duration
+from .resilience import RetryPolicy, CircuitBreaker
+from .providers import PROVIDER_PRESETS, ProviderTarget
+
 logger = logging.getLogger(__name__)
 
 
 class LLMService:
     
-    def __init__(self, provider: str = "groq", api_key: Optional[str] = None, max_tokens: int = 8000):
+    def __init__(
+        self,
+        provider: str = "groq",
+        api_key: Optional[str] = None,
+        max_tokens: int = 8000,
+        http_client: Optional[PooledHTTPClient] = None,
+        warmup_connections: int = 0,
+        mock_stream_delay: float = 0.0,
+        token_counter: Optional[TokenCounter] = None,
+        response_cache: Optional[ResponseCache] = None,
+        coalesce_requests: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        provider_configs: Optional[Dict[str, Dict[str, any]]] = None,
+        fallback_providers: Optional[List[str]] = None,
+        hedging_enabled: bool = False,
+        hedge_min_delay: float = 0.05,
+        hedge_initial_delay: float = 2.0,
+        hedge_min_samples: int = 20
+    ):
         self.provider = provider.lower()
-        self.api_key = api_key or os.getenv("LLM_API_KEY") or os.getenv("GROQ_API_KEY")
+        self.api_key = api_key or os.getenv("LLM_API_KEY") or os.getenv(f"{self.provider.upper()}_API_KEY")
         self.max_tokens = max_tokens
-        self.model = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
         
-        self.provider_configs = {
-            "groq": {
-                "base_url": "https://api.groq.com/openai/v1",
-                "chat_endpoint": "/chat/completions",
-                "default_model": "llama-3.1-8b-instant"
-            }
-        }
+        self.provider_configs = {name: dict(preset) for name, preset in PROVIDER_PRESETS.items()}
+        for name, config in (provider_configs or {}).items():
+            self.provider_configs.setdefault(name, {}).update(config)
         
-        if self.provider == "groq" and not self.api_key:
-            logger.warning("Groq API key not provided. Falling back to mock mode.")
+        primary_config = self.provider_configs.get(self.provider, {})
+        self.model = primary_config.get("model") or os.getenv("LLM_MODEL") or primary_config.get(
+            "default_model", "llama-3.1-8b-instant"
+        )
+        
+        self.http_client = http_client or PooledHTTPClient()
+        self.warmup_connections = warmup_connections
+        self.mock_stream_delay = mock_stream_delay
+        self.token_counter = token_counter or TokenCounter(get_tokenizer(self.model))
+        self.response_cache = response_cache
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        
+        self.hedging_enabled = hedging_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedges_sent = 0
+        self.failovers = 0
+        
+        self.targets = self._build_targets(fallback_providers or [], circuit_breaker)
+        if self.provider != "mock" and not self.targets:
+            logger.warning(f"No API key configured for provider '{self.provider}'. Falling back to mock mode.")
             self.provider = "mock"
+        self.circuit_breaker = self.targets[0].circuit_breaker if self.targets else (
+            circuit_breaker or CircuitBreaker(name=self.provider)
+        )
+        
+        logger.info(f"LLM Service initialized with provider: {self.provider} ({len(self.targets)} targets)")
+    
+    def _build_targets(
+        self,
+        fallback_providers: List[str],
+        circuit_breaker: Optional[CircuitBreaker]
+    ) -> List[ProviderTarget]:
+        if self.provider == "mock":
+            return []
+        
+        breaker_template = circuit_breaker or CircuitBreaker()
+        targets = []
         
-        logger.info(f"LLM Service initialized with provider: {self.provider}")
+        for name in [self.provider] + [p for p in fallback_providers if p != self.provider]:
+            config = self.provider_configs.get(name)
+            if config is None or "base_url" not in config:
+                logger.warning(f"Unknown LLM provider '{name}', skipping")
+                continue
+            
+            keys = list(config.get("api_keys") or ([config["api_key"]] if config.get("api_key") else []))
+            if name == self.provider and self.api_key:
+                keys = [self.api_key] + [k for k in keys if k != self.api_key]
+            
+            for index, key in enumerate(keys):
+                target_name = name if index == 0 else f"{name}#{index + 1}"
+                primary = not targets
+                targets.append(ProviderTarget(
+                    name=target_name,
+                    provider=name,
+                    base_url=config["base_url"],
+                    chat_endpoint=config.get("chat_endpoint", "/chat/completions"),
+                    model=self.model if name == self.provider else config.get("model", config.get("default_model")),
+                    api_key=key,
+                    circuit_breaker=circuit_breaker if primary and circuit_breaker else CircuitBreaker(
+                        name=target_name,
+                        failure_threshold=breaker_template.failure_threshold,
+                        recovery_timeout=breaker_template.recovery_timeout
+                    ),
+                    rate_limiter=self.rate_limiter if primary else None
+                ))
+        
+        return targets
+    
+    async def startup(self):
+        if not self.targets:
+            return
+        
+        await self.http_client.start()
+        if self.warmup_connections > 0:
+            base_urls = list(dict.fromkeys(t.base_url for t in self.targets))
+            await self.http_client.warmup(base_urls, connections_per_host=self.warmup_connections)
+    
+    async def shutdown(self):
+        await self.http_client.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+    
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "http_pool": self.http_client.get_stats(),
+            "tokenizer": self.token_counter.get_stats(),
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None,
+            "single_flight": self.single_flight.get_stats() if self.single_flight else None,
+            "rate_limiter": self.rate_limiter.get_stats() if self.rate_limiter else None,
+            "retries": self.retry_policy.retries,
+            "circuit_breaker": self.circuit_breaker.get_stats(),
+            "providers": {t.name: t.get_stats() for t in self.targets},
+            "hedging": {
+                "enabled": self.hedging_enabled,
+                "hedges_sent": self.hedges_sent,
+                "failovers": self.failovers
+            }
+        }
     
     def estimate_tokens(self, text: str) -> int:
-        return len(text) // 4
+        return self.token_counter.count(text)
+    
+    def message_tokens(self, message: Dict[str, any]) -> int:
+        tokens = message.get("tokens")
+        if tokens is None:
+            tokens = self.estimate_tokens(message.get("content", ""))
+        return tokens
     
     def truncate_history(self, messages: List[Dict[str, str]], max_context_tokens: int = 6000) -> List[Dict[str, str]]:
         if not messages:
@@ -38,77 +172,582 @@ class LLMService:
         system_messages = [m for m in messages if m.get("role") == "system"]
         non_system_messages = [m for m in messages if m.get("role") != "system"]
         
-        system_tokens = sum(self.estimate_tokens(m.get("content", "")) for m in system_messages)
+        system_tokens = sum(self.message_tokens(m) for m in system_messages)
         available_tokens = max_context_tokens - system_tokens
         
         truncated = []
         current_tokens = 0
         
         for message in reversed(non_system_messages):
-            message_tokens = self.estimate_tokens(message.get("content", ""))
+            message_tokens = self.message_tokens(message)
             if current_tokens + message_tokens <= available_tokens:
-                truncated.insert(0, message)
+                truncated.append(message)
                 current_tokens += message_tokens
             else:
                 break
+        truncated.reverse()
         
         result = system_messages + truncated
         logger.info(f"Truncated history: {len(messages)} -> {len(result)} messages ({current_tokens + system_tokens} tokens)")
         return result
     
+    def history_budget(self, max_response_tokens: int) -> int:
+        return self.max_tokens - max_response_tokens
+    
     async def generate_response(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_response_tokens: int = 1000
+        max_response_tokens: int = 1000,
+        mode: Optional[str] = None,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, any]:
-        truncated_messages = self.truncate_history(messages, max_context_tokens=self.max_tokens - max_response_tokens)
+        truncated_messages = self.truncate_history(messages, max_context_tokens=self.history_budget(max_response_tokens))
+        prompt_key = self._prompt_key(truncated_messages, temperature, max_response_tokens)
         
-        if self.provider == "groq":
-            return await self._call_groq_api(truncated_messages, temperature, max_response_tokens)
-        else:
-            return self._generate_mock_response(truncated_messages)
+        use_cache = self._cache_enabled_for(mode, temperature)
+        if use_cache:
+            cached = self.response_cache.get(prompt_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        async def fetch(fetch_deadline: Optional[Deadline]) -> Dict[str, any]:
+            if self.targets:
+                response = await self._call_provider_api(
+                    truncated_messages, temperature, max_response_tokens, fetch_deadline
+                )
+            else:
+                response = self._generate_mock_response(truncated_messages)
+            
+            if use_cache:
+                self.response_cache.set(prompt_key, response)
+            return response
+        
+        if self.single_flight is None:
+            return await self._within_deadline(fetch(deadline), deadline)
+        # A coalesced call is shared, so no single caller's deadline may bound it: each caller enforces
+        # its own while waiting, and the call is cancelled once the last waiter has given up.
+        shared = self.single_flight.do(prompt_key, lambda: fetch(None))
+        return dict(await self._within_deadline(shared, deadline))
+    
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_response_tokens: int = 1000,
+        mode: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, any]]:
+        truncated_messages = self.truncate_history(messages, max_context_tokens=self.history_budget(max_response_tokens))
+        prompt_key = self._prompt_key(truncated_messages, temperature, max_response_tokens)
+        
+        use_cache = self._cache_enabled_for(mode, temperature)
+        if use_cache:
+            cached = self.response_cache.get(prompt_key)
+            if cached is not None:
+                yield {"type": "delta", "content": cached["content"]}
+                yield {"type": "done", **cached, "cached": True}
+                return
+        
+        async def fetch(fetch_deadline: Optional[Deadline]) -> AsyncIterator[Dict[str, any]]:
+            if self.targets:
+                stream = self._stream_provider_api(
+                    truncated_messages, temperature, max_response_tokens, fetch_deadline
+                )
+            else:
+                stream = self._stream_mock_response(truncated_messages)
+            
+            async for event in stream:
+                if event["type"] == "done" and use_cache:
+                    self.response_cache.set(prompt_key, {k: v for k, v in event.items() if k != "type"})
+                yield event
+        
+        if self.single_flight is None:
+            async for event in fetch(deadline):
+                yield dict(event)
+            return
+        
+        stream = self.single_flight.stream(prompt_key, lambda: fetch(None))
+        try:
+            while True:
+                try:
+                    event = await self._within_deadline(stream.__anext__(), deadline)
+                except StopAsyncIteration:
+                    return
+                yield dict(event)
+        finally:
+            await stream.aclose()
+    
+    async def _within_deadline(self, awaitable, deadline: Optional[Deadline]):
+        if deadline is None:
+            return await awaitable
+        
+        try:
+            timeout = deadline.bound(float("inf"))
+        except DeadlineExceededException:
+            awaitable.close()
+            raise
+        
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededException(f"Deadline of {deadline.timeout_seconds}s exceeded waiting for LLM")
+    
+    def _prompt_key(self, messages: List[Dict[str, str]], temperature: float, max_response_tokens: int) -> str:
+        return build_prompt_key(messages, f"{self.provider}:{self.model}", temperature, max_response_tokens)
+    
+    def _cache_enabled_for(self, mode: Optional[str], temperature: float) -> bool:
+        return self.response_cache is not None and self.response_cache.is_cacheable(mode, temperature)
+    
+    async def warm_response_cache(self, path: str, default_mode: str = "open_chat") -> int:
+        if self.response_cache is None:
+            return 0
+        
+        warmed = 0
+        with open(path, "r") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                
+                try:
+                    entry = json.loads(line)
+                    mode = entry.get("mode", default_mode)
+                    temperature = entry.get("temperature", 0.7)
+                    max_response_tokens = entry.get("max_response_tokens", 1000)
+                    messages = [
+                        {"role": "system", "content": self.create_system_prompt(mode=mode)},
+                        {"role": "user", "content": entry["prompt"]}
+                    ]
+                    
+                    if entry.get("response"):
+                        if not self._cache_enabled_for(mode, temperature):
+                            continue
+                        key = self._prompt_key(messages, temperature, max_response_tokens)
+                        content = entry["response"]
+                        prompt_tokens = sum(self.message_tokens(m) for m in messages)
+                        completion_tokens = self.estimate_tokens(content)
+                        self.response_cache.set(key, {
+                            "content": content,
+                            "tokens_used": prompt_tokens + completion_tokens,
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "model": self.model
+                        })
+                    else:
+                        await self.generate_response(messages, temperature, max_response_tokens, mode=mode)
+                    warmed += 1
+                except Exception as e:
+                    logger.warning(f"Skipping cache warmup entry {line_number} in {path}: {str(e)}")
+        
+        logger.info(f"Warmed response cache with {warmed} entries from {path}")
+        return warmed
     
-    async def _call_groq_api(
+    async def _call_provider_api(
         self,
         messages: List[Dict[str, str]],
         temperature: float,
-        max_tokens: int
+        max_tokens: int,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, any]:
-        config = self.provider_configs["groq"]
-        url = f"{config['base_url']}{config['chat_endpoint']}"
+        candidates = self._available_targets()
         
+        if self.hedging_enabled and len(candidates) > 1:
+            return await self._hedged_call(candidates, messages, temperature, max_tokens, deadline)
+        return await self._failover_call(candidates, messages, temperature, max_tokens, deadline)
+    
+    async def _failover_call(
+        self,
+        candidates: List[ProviderTarget],
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[Deadline],
+        last_error: Optional[Exception] = None
+    ) -> Dict[str, any]:
+        for index, target in enumerate(candidates):
+            if index > 0 or last_error is not None:
+                self.failovers += 1
+                logger.warning(f"Failing over to LLM provider target '{target.name}'")
+            
+            try:
+                return await self._call_target(target, messages, temperature, max_tokens, deadline)
+            except Exception as e:
+                if not self._should_failover(e):
+                    raise
+                last_error = e
+        
+        raise last_error or CircuitOpenException("All LLM provider targets are unavailable")
+    
+    async def _hedged_call(
+        self,
+        candidates: List[ProviderTarget],
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[Deadline]
+    ) -> Dict[str, any]:
+        primary, backup = candidates[0], candidates[1]
+        started_at = time.monotonic()
+        tasks = {
+            asyncio.ensure_future(self._call_target(primary, messages, temperature, max_tokens, deadline)): primary
+        }
+        
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay(primary))
+            if not done:
+                self.hedges_sent += 1
+                logger.info(f"LLM target '{primary.name}' slower than hedge delay, hedging to '{backup.name}'")
+                tasks[asyncio.ensure_future(
+                    self._call_target(backup, messages, temperature, max_tokens, deadline)
+                )] = backup
+            
+            last_error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            tasks[task].hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+            
+            if not self._should_failover(last_error):
+                raise last_error
+            return await self._failover_call(
+                candidates[len(tasks):], messages, temperature, max_tokens, deadline, last_error=last_error
+            )
+        
+        finally:
+            for task, target in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    target.latency.record(time.monotonic() - started_at)
+                elif not task.cancelled():
+                    task.exception()
+    
+    def _hedge_delay(self, target: ProviderTarget) -> float:
+        if len(target.latency) < self.hedge_min_samples:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, target.latency.percentile(0.95))
+    
+    def _available_targets(self) -> List[ProviderTarget]:
+        available = [t for t in self.targets if t.circuit_breaker.state != CircuitBreaker.OPEN]
+        return available or self.targets[:1]
+    
+    def _should_failover(self, error: Exception) -> bool:
+        if isinstance(error, CircuitOpenException):
+            return True
+        if isinstance(error, LLMProviderException):
+            return error.retryable or error.status_code in (401, 403)
+        return False
+    
+    async def _call_target(
+        self,
+        target: ProviderTarget,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, any]:
         headers = {
-            "Authorization": f"Bearer {self.api_key}",
+            "Authorization": f"Bearer {target.api_key}",
             "Content-Type": "application/json"
         }
         
         payload = {
-            "model": self.model,
-            "messages": messages,
+            "model": target.model,
+            "messages": self._payload_messages(messages),
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
-        try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
+        estimated_tokens = sum(self.message_tokens(m) for m in messages) + max_tokens
+        
+        attempt = 0
+        while True:
+            try:
+                target.circuit_breaker.before_call()
+                target.requests += 1
+                started_at = time.monotonic()
+                try:
+                    result = await self._post_completion(target, payload, headers, messages, estimated_tokens, deadline)
+                except BaseException as e:
+                    self._record_provider_error(target, e)
+                    raise
+                target.circuit_breaker.record_success()
+                target.latency.record(time.monotonic() - started_at)
+                return result
+            
+            except Exception as e:
+                delay = self._retry_delay(target, attempt, e, deadline)
+                if delay is None:
+                    logger.error(f"Error calling {target.name} API: {str(e)}")
+                    raise
                 
+                logger.warning(f"{target.name} API call failed ({str(e)}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    async def _post_completion(
+        self,
+        target: ProviderTarget,
+        payload: Dict[str, any],
+        headers: Dict[str, str],
+        messages: List[Dict[str, str]],
+        estimated_tokens: int,
+        deadline: Optional[Deadline]
+    ) -> Dict[str, any]:
+        async with self._rate_limit_permit(target, estimated_tokens, deadline) as permit:
+            try:
+                response = await self.http_client.post(
+                    target.url, json=payload, headers=headers, timeout=self._attempt_timeout(deadline)
+                )
+            except httpx.TimeoutException as e:
+                raise LLMProviderException(f"LLM API timeout: {str(e)}", retryable=True)
+            except httpx.TransportError as e:
+                raise LLMProviderException(f"LLM service error: {str(e)}", retryable=True)
+            
+            self._observe_rate_limit(target, response, permit)
+            self._raise_for_status(target, response)
+            
+            try:
                 data = response.json()
+                content = data["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError) as e:
+                raise LLMProviderException(f"LLM service error: malformed response ({str(e)})")
+            
+            result = {
+                "content": content,
+                **self._usage_from_provider(messages, content, data.get("usage")),
+                "model": data.get("model", target.model)
+            }
+            permit.record_usage(result["tokens_used"])
+            return result
+    
+    async def _stream_provider_api(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, any]]:
+        last_error = None
+        for index, target in enumerate(self._available_targets()):
+            if index > 0:
+                self.failovers += 1
+                logger.warning(f"Failing over stream to LLM provider target '{target.name}'")
+            
+            emitted = False
+            try:
+                async for event in self._stream_target(target, messages, temperature, max_tokens, deadline):
+                    emitted = True
+                    yield event
+                return
+            except Exception as e:
+                if emitted or not self._should_failover(e):
+                    raise
+                last_error = e
+        
+        raise last_error
+    
+    async def _stream_target(
+        self,
+        target: ProviderTarget,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, any]]:
+        headers = {
+            "Authorization": f"Bearer {target.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        
+        payload = {
+            "model": target.model,
+            "messages": self._payload_messages(messages),
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        
+        estimated_tokens = sum(self.message_tokens(m) for m in messages) + max_tokens
+        
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                target.circuit_breaker.before_call()
+                target.requests += 1
+                started_at = time.monotonic()
+                try:
+                    async for event in self._stream_completion(
+                        target, payload, headers, messages, estimated_tokens, deadline
+                    ):
+                        if not emitted:
+                            target.latency.record(time.monotonic() - started_at)
+                        emitted = True
+                        yield event
+                except BaseException as e:
+                    self._record_provider_error(target, e)
+                    raise
+                target.circuit_breaker.record_success()
+                return
+            
+            except Exception as e:
+                delay = None if emitted else self._retry_delay(target, attempt, e, deadline)
+                if delay is None:
+                    logger.error(f"Error streaming from {target.name} API: {str(e)}")
+                    raise
                 
-                return {
-                    "content": data["choices"][0]["message"]["content"],
-                    "tokens_used": data.get("usage", {}).get("total_tokens", 0),
-                    "model": data.get("model", self.model)
-                }
-        
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Groq API error: {e.response.status_code} - {e.response.text}")
-            raise Exception(f"LLM API error: {e.response.status_code}")
-        except Exception as e:
-            logger.error(f"Error calling Groq API: {str(e)}")
-            raise Exception(f"LLM service error: {str(e)}")
+                logger.warning(f"{target.name} API stream failed ({str(e)}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    async def _stream_completion(
+        self,
+        target: ProviderTarget,
+        payload: Dict[str, any],
+        headers: Dict[str, str],
+        messages: List[Dict[str, str]],
+        estimated_tokens: int,
+        deadline: Optional[Deadline]
+    ) -> AsyncIterator[Dict[str, any]]:
+        content_parts = []
+        usage = {}
+        model = target.model
+        
+        async with self._rate_limit_permit(target, estimated_tokens, deadline) as permit:
+            try:
+                async with self.http_client.stream(
+                    "POST", target.url, json=payload, headers=headers, timeout=self._attempt_timeout(deadline)
+                ) as response:
+                    self._observe_rate_limit(target, response, permit)
+                    if response.status_code >= 400:
+                        await response.aread()
+                        self._raise_for_status(target, response)
+                    
+                    async for line in response.aiter_lines():
+                        if deadline is not None:
+                            deadline.check("LLM streaming")
+                        if not line.startswith("data:"):
+                            continue
+                        
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        
+                        chunk = json.loads(data)
+                        model = chunk.get("model", model)
+                        usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+                        
+                        for choice in chunk.get("choices", []):
+                            delta = choice.get("delta", {}).get("content")
+                            if delta:
+                                content_parts.append(delta)
+                                yield {"type": "delta", "content": delta}
+            
+            except httpx.TimeoutException as e:
+                raise LLMProviderException(f"LLM API timeout: {str(e)}", retryable=True)
+            except httpx.TransportError as e:
+                raise LLMProviderException(f"LLM service error: {str(e)}", retryable=True)
+            except ValueError as e:
+                raise LLMProviderException(f"LLM service error: malformed stream ({str(e)})")
+            
+            if usage.get("total_tokens"):
+                permit.record_usage(usage["total_tokens"])
+        
+        content = "".join(content_parts)
+        yield {
+            "type": "done",
+            "content": content,
+            **self._usage_from_provider(messages, content, usage),
+            "model": model
+        }
+    
+    def _retry_delay(
+        self,
+        target: ProviderTarget,
+        attempt: int,
+        error: Exception,
+        deadline: Optional[Deadline]
+    ) -> Optional[float]:
+        delay = self.retry_policy.next_delay(attempt, error, deadline)
+        if delay is not None and target.rate_limiter is not None and getattr(error, "status_code", None) == 429:
+            return 0.0
+        return delay
+    
+    def _attempt_timeout(self, deadline: Optional[Deadline]) -> float:
+        if deadline is None:
+            return self.http_client.timeout
+        return deadline.bound(self.http_client.timeout)
+    
+    def _raise_for_status(self, target: ProviderTarget, response: httpx.Response):
+        if response.status_code < 400:
+            return
+        
+        logger.error(f"{target.name} API error: {response.status_code} - {response.text}")
+        raise LLMProviderException(
+            f"LLM API error: {response.status_code}",
+            status_code=response.status_code,
+            retryable=response.status_code in (408, 429) or response.status_code >= 500,
+            retry_after=parse_duration(response.headers.get("retry-after"))
+        )
+    
+    def _record_provider_error(self, target: ProviderTarget, error: BaseException):
+        breaker = target.circuit_breaker
+        if isinstance(error, Exception):
+            target.failures += 1
+        
+        if isinstance(error, LLMProviderException) and error.status_code is not None and error.status_code < 500:
+            if error.status_code in (408, 429):
+                breaker.release()
+            else:
+                breaker.record_success()
+        elif isinstance(error, (LLMProviderException, httpx.HTTPError)):
+            breaker.record_failure()
+        else:
+            breaker.release()
+    
+    @asynccontextmanager
+    async def _rate_limit_permit(
+        self,
+        target: ProviderTarget,
+        estimated_tokens: int,
+        deadline: Optional[Deadline] = None
+    ):
+        if target.rate_limiter is None:
+            yield RateLimitPermit(estimated_tokens)
+            return
+        
+        timeout = deadline.bound(float("inf")) if deadline is not None else None
+        async with target.rate_limiter.acquire(estimated_tokens, timeout=timeout) as permit:
+            yield permit
+    
+    def _observe_rate_limit(self, target: ProviderTarget, response: httpx.Response, permit: RateLimitPermit) -> bool:
+        if target.rate_limiter is None:
+            return False
+        
+        target.rate_limiter.update_from_headers(response.headers, response.status_code)
+        if response.status_code == 429:
+            permit.mark_rate_limited()
+            return True
+        return False
+    
+    async def _stream_mock_response(self, messages: List[Dict[str, str]]) -> AsyncIterator[Dict[str, any]]:
+        response = self._generate_mock_response(messages)
+        
+        words = response["content"].split(" ")
+        for i, word in enumerate(words):
+            if self.mock_stream_delay > 0:
+                await asyncio.sleep(self.mock_stream_delay)
+            yield {"type": "delta", "content": word if i == 0 else " " + word}
+        
+        yield {"type": "done", **response}
     
     def _generate_mock_response(self, messages: List[Dict[str, str]]) -> Dict[str, any]:
         last_message = messages[-1]["content"] if messages else ""
@@ -120,14 +759,44 @@ class LLMService:
         else:
             response = f"Thank you for your message. I understand you're asking about: '{last_message[:50]}...'. [Mock LLM Response] This is a simulated response for development purposes."
         
-        tokens_used = self.estimate_tokens(last_message) + self.estimate_tokens(response)
+        prompt_tokens = sum(self.message_tokens(m) for m in messages)
+        completion_tokens = self.estimate_tokens(response)
         
         return {
             "content": response,
-            "tokens_used": tokens_used,
+            "tokens_used": prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
             "model": "mock-model"
         }
     
+    def _payload_messages(self, messages: List[Dict[str, any]]) -> List[Dict[str, str]]:
+        return [{"role": m["role"], "content": m["content"]} for m in messages]
+    
+    def _usage_from_provider(
+        self,
+        messages: List[Dict[str, any]],
+        content: str,
+        usage: Optional[Dict[str, int]]
+    ) -> Dict[str, int]:
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        
+        if prompt_tokens:
+            self.token_counter.observe_usage(self.token_counter.raw_count_messages(messages), prompt_tokens)
+        else:
+            prompt_tokens = sum(self.message_tokens(m) for m in messages)
+        
+        if not completion_tokens:
+            completion_tokens = self.estimate_tokens(content)
+        
+        return {
+            "tokens_used": usage.get("total_tokens") or prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens
+        }
+    
     def create_system_prompt(self, mode: str, context: Optional[str] = None) -> str:
         if mode == "grounded_rag" and context:
             return f"""You are BOT GPT, a helpful AI assistant. You are having a conversation that is grounded in specific documents.
@@ -0,0 +1,111 @@
+import logging
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.terms import message_term_rows, query_term_hashes
+from ..models.domain.entities import Message, MessageTerm
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+
+
+def turn_of(sequence_number: int) -> int:
+    return (sequence_number + 1) // 2
+
+
+class MessageIndex:
+
+    def __init__(self, max_turns: int = 2, recall_tokens: int = 1000):
+        self.max_turns = max_turns
+        self.recall_tokens = recall_tokens
+
+        self.recalls = 0
+        self.recalled_turns = 0
+
+        logger.info(f"Message index initialized (max_turns={max_turns}, recall_tokens={recall_tokens})")
+
+    async def index(self, db: AsyncSession, message: Message):
+        rows = message_term_rows(message.conversation_id, message.sequence_number, message.content)
+        if rows:
+            await db.execute(insert(MessageTerm), rows)
+
+    async def remove(self, db: AsyncSession, conversation_id: str, sequence_number: int):
+        await db.execute(delete(MessageTerm).where(
+            MessageTerm.conversation_id == conversation_id,
+            MessageTerm.sequence_number == sequence_number
+        ))
+
+    async def recall(
+        self,
+        db: AsyncSession,
+        conversation_id: str,
+        query: str,
+        before_sequence: int,
+        token_budget: int
+    ) -> List[Message]:
+        query_hashes = query_term_hashes(query)
+        older_turns = turn_of(before_sequence - 1)
+        if not query_hashes or older_turns == 0 or token_budget <= 0:
+            return []
+
+        postings = (await db.execute(
+            select(MessageTerm.sequence_number, MessageTerm.term_hash, MessageTerm.frequency).where(
+                MessageTerm.conversation_id == conversation_id,
+                MessageTerm.term_hash.in_(query_hashes),
+                MessageTerm.sequence_number < before_sequence
+            )
+        )).all()
+        if not postings:
+            return []
+
+        turn_frequencies: Dict[int, Counter] = defaultdict(Counter)
+        for sequence_number, hashed, frequency in postings:
+            turn_frequencies[turn_of(sequence_number)][hashed] += frequency
+
+        document_frequency = Counter(hashed for frequencies in turn_frequencies.values() for hashed in frequencies)
+        idf = {
+            hashed: math.log(1 + (older_turns - df + 0.5) / (df + 0.5))
+            for hashed, df in document_frequency.items()
+        }
+        scores = {
+            turn: sum(idf[h] * tf * (BM25_K1 + 1) / (tf + BM25_K1) for h, tf in frequencies.items())
+            for turn, frequencies in turn_frequencies.items()
+        }
+        ranked = sorted(scores, key=lambda turn: (-scores[turn], -turn))[:self.max_turns]
+
+        candidates = (await db.scalars(
+            select(Message).where(
+                Message.conversation_id == conversation_id,
+                Message.sequence_number.in_([s for turn in ranked for s in (2 * turn - 1, 2 * turn)]),
+                Message.sequence_number < before_sequence
+            )
+        )).all()
+        by_turn: Dict[int, List[Message]] = defaultdict(list)
+        for message in candidates:
+            by_turn[turn_of(message.sequence_number)].append(message)
+
+        recalled = []
+        used_tokens = 0
+        for turn in ranked:
+            turn_tokens = sum(message.tokens for message in by_turn[turn])
+            if used_tokens + turn_tokens > token_budget:
+                continue
+            recalled.extend(by_turn[turn])
+            used_tokens += turn_tokens
+
+        self.recalls += 1
+        self.recalled_turns += len({turn_of(message.sequence_number) for message in recalled})
+        return sorted(recalled, key=lambda message: message.sequence_number)
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "max_turns": self.max_turns,
+            "recall_tokens": self.recall_tokens,
+            "recalls": self.recalls,
+            "recalled_turns": self.recalled_turns
+        }
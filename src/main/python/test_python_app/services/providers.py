@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .rate_limiter import RateLimiter
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_PRESETS: Dict[str, Dict[str, any]] = {
+    "groq": {
+        "base_url": "https://api.groq.com/openai/v1",
+        "chat_endpoint": "/chat/completions",
+        "default_model": "llama-3.1-8b-instant"
+    },
+    "openai": {
+        "base_url": "https://api.openai.com/v1",
+        "chat_endpoint": "/chat/completions",
+        "default_model": "gpt-4o-mini"
+    },
+    "together": {
+        "base_url": "https://api.together.xyz/v1",
+        "chat_endpoint": "/chat/completions",
+        "default_model": "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"
+    },
+    "openrouter": {
+        "base_url": "https://openrouter.ai/api/v1",
+        "chat_endpoint": "/chat/completions",
+        "default_model": "meta-llama/llama-3.1-8b-instruct"
+    }
+}
+
+
+def load_provider_configs_from_env(names: List[str]) -> Dict[str, Dict[str, any]]:
+    configs = json.loads(os.getenv("LLM_PROVIDERS_JSON", "{}") or "{}")
+
+    for name in names:
+        prefix = name.upper().replace("-", "_")
+        config = configs.setdefault(name, {})
+
+        keys = os.getenv(f"{prefix}_API_KEYS") or os.getenv(f"{prefix}_API_KEY")
+        if keys and "api_keys" not in config:
+            config["api_keys"] = [k.strip() for k in keys.split(",") if k.strip()]
+        if os.getenv(f"{prefix}_BASE_URL"):
+            config["base_url"] = os.getenv(f"{prefix}_BASE_URL")
+        if os.getenv(f"{prefix}_MODEL"):
+            config["model"] = os.getenv(f"{prefix}_MODEL")
+
+    return configs
+
+
+class LatencyTracker:
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class ProviderTarget:
+
+    def __init__(
+        self,
+        name: str,
+        provider: str,
+        base_url: str,
+        chat_endpoint: str,
+        model: str,
+        api_key: str,
+        circuit_breaker: CircuitBreaker,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        self.name = name
+        self.provider = provider
+        self.base_url = base_url.rstrip("/")
+        self.chat_endpoint = chat_endpoint
+        self.model = model
+        self.api_key = api_key
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.latency = LatencyTracker()
+        self.requests = 0
+        self.failures = 0
+        self.hedge_wins = 0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.chat_endpoint}"
+
+    def get_stats(self) -> Dict[str, any]:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "requests": self.requests,
+            "failures": self.failures,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50": round(p50, 4) if p50 is not None else None,
+            "latency_p95": round(p95, 4) if p95 is not None else None,
+            "circuit_breaker": self.circuit_breaker.state
+        }
@@ -0,0 +1,216 @@
+import heapq
+import logging
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.terms import query_term_hashes
+from ..models.domain.entities import ChunkTerm, Document, DocumentChunk
+from .document_cache import DocumentIndexCache
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+ENTRY_OVERHEAD_BYTES = 100
+
+
+def saturation(frequency: int, chunk_length: int, average_length: float) -> float:
+    return frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * chunk_length / average_length))
+
+
+class TermPostings:
+
+    def __init__(self, ordinals: array, frequencies: array, max_frequency: int, min_length: int):
+        self.ordinals = ordinals
+        self.frequencies = frequencies
+        self.max_frequency = max_frequency
+        self.min_length = min_length
+
+
+class DocumentPostings:
+
+    def __init__(
+        self,
+        signature: Tuple[int, int],
+        chunk_ids: List[str],
+        chunk_lengths: List[int],
+        postings: Dict[int, List[Tuple[int, int]]]
+    ):
+        self.signature = signature
+        self.chunk_ids = chunk_ids
+        self.chunk_lengths = array("i", chunk_lengths)
+        self.terms: Dict[int, TermPostings] = {}
+        for hashed, entries in postings.items():
+            entries.sort()
+            ordinals = array("i", [ordinal for ordinal, _ in entries])
+            frequencies = array("i", [frequency for _, frequency in entries])
+            self.terms[hashed] = TermPostings(
+                ordinals,
+                frequencies,
+                max(frequencies),
+                min(self.chunk_lengths[ordinal] for ordinal in ordinals)
+            )
+
+        self.postings = sum(len(term.ordinals) for term in self.terms.values())
+        self.size = (
+            self.postings * 2 * 4 + self.chunk_lengths.itemsize * len(self.chunk_lengths)
+            + ENTRY_OVERHEAD_BYTES * (len(self.terms) + len(chunk_ids) + 1)
+        )
+
+
+def maxscore_top_k(
+    indexes: List[DocumentPostings],
+    idf: Dict[int, float],
+    average_length: float,
+    top_k: int
+) -> Tuple[List[Tuple[float, str]], int]:
+    heap: List[Tuple[float, str]] = []
+    scored = 0
+
+    plans = []
+    for index in indexes:
+        lists = []
+        for hashed, weight in idf.items():
+            postings = index.terms.get(hashed)
+            if postings is not None:
+                bound = weight * saturation(postings.max_frequency, postings.min_length, average_length)
+                lists.append((bound, weight, postings))
+        if lists:
+            lists.sort(key=lambda entry: entry[0])
+            plans.append((list(accumulate(entry[0] for entry in lists)), lists, index))
+    plans.sort(key=lambda plan: -plan[0][-1])
+
+    for prefix, lists, index in plans:
+        threshold = heap[0][0] if len(heap) >= top_k else 0.0
+        essential = bisect_right(prefix, threshold)
+        pointers = [0] * len(lists)
+
+        while essential < len(lists):
+            candidate = None
+            for i in range(essential, len(lists)):
+                ordinals = lists[i][2].ordinals
+                if pointers[i] < len(ordinals) and (candidate is None or ordinals[pointers[i]] < candidate):
+                    candidate = ordinals[pointers[i]]
+            if candidate is None:
+                break
+
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index.chunk_lengths[candidate] / average_length)
+            score = 0.0
+            for i in range(essential, len(lists)):
+                _, weight, postings = lists[i]
+                position = pointers[i]
+                if position < len(postings.ordinals) and postings.ordinals[position] == candidate:
+                    frequency = postings.frequencies[position]
+                    score += weight * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    pointers[i] = position + 1
+                    scored += 1
+
+            for i in range(essential - 1, -1, -1):
+                if score + prefix[i] <= threshold:
+                    break
+                _, weight, postings = lists[i]
+                position = bisect_left(postings.ordinals, candidate, pointers[i])
+                pointers[i] = position
+                if position < len(postings.ordinals) and postings.ordinals[position] == candidate:
+                    frequency = postings.frequencies[position]
+                    score += weight * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    scored += 1
+
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, index.chunk_ids[candidate]))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, index.chunk_ids[candidate]))
+            else:
+                continue
+            if len(heap) >= top_k:
+                threshold = heap[0][0]
+                essential = bisect_right(prefix, threshold)
+
+    return sorted(heap, key=lambda entry: (-entry[0], entry[1])), scored
+
+
+class PrunedRetrievalEngine:
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._cache = DocumentIndexCache(max_bytes)
+
+        self.queries = 0
+        self.postings = 0
+        self.scored_postings = 0
+
+        logger.info(f"Pruned retrieval engine initialized (max_bytes={max_bytes})")
+
+    def rank(self, db: Session, document_ids: List[str], query: str, top_k: int = 3) -> List[str]:
+        query_hashes = query_term_hashes(query)
+        if not query_hashes or not document_ids:
+            return []
+
+        signatures = db.query(Document.id, Document.chunk_count, Document.term_count).filter(
+            Document.id.in_(document_ids)
+        ).all()
+        chunk_total = sum(chunk_count for _, chunk_count, _ in signatures)
+        if not chunk_total:
+            return []
+        average_length = sum(term_count for _, _, term_count in signatures) / chunk_total
+
+        indexes = [
+            self._postings(db, document_id, (chunk_count, term_count))
+            for document_id, chunk_count, term_count in signatures
+        ]
+        document_frequency: Dict[int, int] = defaultdict(int)
+        for index in indexes:
+            for hashed in query_hashes:
+                postings = index.terms.get(hashed)
+                if postings is not None:
+                    document_frequency[hashed] += len(postings.ordinals)
+        idf = {
+            hashed: math.log(1 + (chunk_total - df + 0.5) / (df + 0.5))
+            for hashed, df in document_frequency.items()
+        }
+
+        ranked, scored = maxscore_top_k(indexes, idf, average_length, top_k)
+        self.queries += 1
+        self.postings += sum(document_frequency.values())
+        self.scored_postings += scored
+        return [chunk_id for _, chunk_id in ranked]
+
+    def invalidate(self, document_id: str):
+        self._cache.invalidate(document_id)
+
+    def _postings(self, db: Session, document_id: str, signature: Tuple[int, int]) -> DocumentPostings:
+        def build() -> DocumentPostings:
+            chunk_ids = [
+                chunk_id for chunk_id, in db.query(DocumentChunk.id).filter(
+                    DocumentChunk.document_id == document_id
+                ).order_by(DocumentChunk.chunk_index)
+            ]
+            ordinals = {chunk_id: ordinal for ordinal, chunk_id in enumerate(chunk_ids)}
+            chunk_lengths = [0] * len(chunk_ids)
+            postings: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+            for hashed, chunk_id, frequency, chunk_length in db.query(
+                ChunkTerm.term_hash, ChunkTerm.chunk_id, ChunkTerm.frequency, ChunkTerm.chunk_length
+            ).filter(ChunkTerm.document_id == document_id):
+                ordinal = ordinals.get(chunk_id)
+                if ordinal is None:
+                    continue
+                chunk_lengths[ordinal] = chunk_length
+                postings[hashed].append((ordinal, frequency))
+            return DocumentPostings(signature, chunk_ids, chunk_lengths, postings)
+
+        return self._cache.get_or_build(document_id, signature, build)
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "queries": self.queries,
+            "postings": self.postings,
+            "scored_postings": self.scored_postings,
+            "scored_ratio": round(self.scored_postings / self.postings, 4) if self.postings else 0.0,
+            **self._cache.get_stats()
+        }
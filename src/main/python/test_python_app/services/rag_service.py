@@ -1,20 +1,147 @@
+import asyncio
 import logging
+import math
 import re
-from typing import List, Dict
+import time
+from contextlib import nullcontext
+from typing import Callable, ContextManager, List, Dict, Optional, Set
 
+from sqlalchemy import case, func, insert
 from sqlalchemy.orm import Session
 
-from ..models.domain.entities import Document, DocumentChunk
+from ..core.terms import chunk_term_rows, query_term_hashes
+from ..models.domain.entities import ChunkEmbedding, ChunkTerm, Document, DocumentChunk
+from .providers import LatencyTracker
+from .pruned_engine import PrunedRetrievalEngine
+from .sparse_engine import SparseRetrievalEngine
+from .vector_engine import VectorRetrievalEngine
 
 logger = logging.getLogger(__name__)
 
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+FUSION_CANDIDATES = 20
+DEFAULT_STAGE_BUDGET = 1.0
+
+STAGE_LEXICAL = "lexical"
+STAGE_VECTOR = "vector"
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K, limit: int = 3) -> List[str]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))[:limit]
+
+
+class RetrievalStage:
+    
+    def __init__(self, name: str, rank: Callable[..., List[str]], budget: float = DEFAULT_STAGE_BUDGET):
+        self.name = name
+        self.rank = rank
+        self.budget = budget
+        self.latency = LatencyTracker()
+        self.runs = 0
+        self.skipped = 0
+        self.late_results = 0
+        self.failures = 0
+        self.candidates = 0
+    
+    def run(
+        self,
+        open_session: Callable[[], ContextManager[Session]],
+        document_ids: List[str],
+        query: str,
+        top_k: int
+    ) -> Optional[List[str]]:
+        self.runs += 1
+        started_at = time.monotonic()
+        try:
+            with open_session() as db:
+                ranked = self.rank(db, document_ids, query, top_k=top_k)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Retrieval stage '{self.name}' failed: {str(e)}")
+            return None
+        finally:
+            self.latency.record(time.monotonic() - started_at)
+        
+        self.candidates += len(ranked)
+        return ranked
+    
+    def get_stats(self) -> Dict[str, any]:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        completed = self.runs - self.failures
+        return {
+            "budget_seconds": self.budget,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "late_results": self.late_results,
+            "failures": self.failures,
+            "mean_candidates": round(self.candidates / completed, 2) if completed else 0.0,
+            "latency_p50": round(p50, 4) if p50 is not None else None,
+            "latency_p95": round(p95, 4) if p95 is not None else None
+        }
+
 
 class RAGService:
     
-    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        sparse_engine: Optional[SparseRetrievalEngine] = None,
+        vector_engine: Optional[VectorRetrievalEngine] = None,
+        pruned_engine: Optional[PrunedRetrievalEngine] = None,
+        hybrid: bool = False,
+        session_factory: Optional[Callable[[Optional[str]], ContextManager[Session]]] = None,
+        stage_budgets: Optional[Dict[str, float]] = None,
+        fusion_candidates: int = FUSION_CANDIDATES,
+        rrf_k: int = RRF_K
+    ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        logger.info(f"RAG Service initialized (chunk_size={chunk_size}, overlap={chunk_overlap})")
+        self.sparse_engine = sparse_engine
+        self.vector_engine = vector_engine
+        self.pruned_engine = pruned_engine
+        self.session_factory = session_factory
+        self.fusion_candidates = fusion_candidates
+        self.rrf_k = rrf_k
+        self._abandoned_stages: Set[asyncio.Future] = set()
+        self.unranked_queries = 0
+        
+        stage_budgets = stage_budgets or {}
+        self.stages: List[RetrievalStage] = []
+        if hybrid or vector_engine is None:
+            lexical_rank = self._bm25_rank
+            if sparse_engine is not None:
+                lexical_rank = sparse_engine.rank
+            elif pruned_engine is not None:
+                lexical_rank = pruned_engine.rank
+            self.stages.append(
+                RetrievalStage(STAGE_LEXICAL, lexical_rank, stage_budgets.get(STAGE_LEXICAL, DEFAULT_STAGE_BUDGET))
+            )
+        if vector_engine is not None:
+            self.stages.append(
+                RetrievalStage(STAGE_VECTOR, vector_engine.rank, stage_budgets.get(STAGE_VECTOR, DEFAULT_STAGE_BUDGET))
+            )
+        
+        logger.info(
+            f"RAG Service initialized (chunk_size={chunk_size}, overlap={chunk_overlap}, engine={self.engine_name})"
+        )
+    
+    @property
+    def engine_name(self) -> str:
+        if len(self.stages) > 1:
+            return "hybrid"
+        if self.vector_engine is not None:
+            return "vector"
+        if self.sparse_engine is not None:
+            return "sparse"
+        return "pruned" if self.pruned_engine is not None else "sql"
     
     def chunk_document(self, content: str) -> List[Dict[str, any]]:
         if not content:
@@ -63,10 +190,12 @@ class RAGService:
         return chunks
     
     def process_document(self, db: Session, document: Document) -> int:
+        self.remove_document_index(db, document.id)
         db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete()
         
         chunks = self.chunk_document(document.content)
         
+        chunk_rows = []
         for chunk_data in chunks:
             chunk = DocumentChunk(
                 document_id=document.id,
@@ -76,11 +205,155 @@ class RAGService:
                 end_char=chunk_data["end_char"]
             )
             db.add(chunk)
+            chunk_rows.append(chunk)
         
-        db.commit()
-        logger.info(f"Created {len(chunks)} chunks for document {document.id}")
+        db.flush()
+        postings = [row for chunk in chunk_rows for row in chunk_term_rows(document.id, chunk.id, chunk.content)]
+        if postings:
+            db.execute(insert(ChunkTerm), postings)
+        if self.vector_engine is not None:
+            self.vector_engine.embed_chunks(db, document.id, chunk_rows)
+        document.chunk_count = len(chunks)
+        document.term_count = sum(row["frequency"] for row in postings)
+        db.flush()
+        
+        logger.info(f"Created {len(chunks)} chunks and {len(postings)} postings for document {document.id}")
         return len(chunks)
     
+    def remove_document_index(self, db: Session, document_id: str):
+        db.query(ChunkTerm).filter(ChunkTerm.document_id == document_id).delete()
+        db.query(ChunkEmbedding).filter(ChunkEmbedding.document_id == document_id).delete()
+        for engine in (self.sparse_engine, self.pruned_engine, self.vector_engine):
+            if engine is not None:
+                engine.invalidate(document_id)
+    
+    def search(self, db: Session, document_ids: List[str], query: str, top_k: int = 3) -> List[DocumentChunk]:
+        if not document_ids:
+            return []
+        
+        candidates = self._stage_candidates(top_k)
+        rankings = [stage.run(lambda: nullcontext(db), document_ids, query, candidates) for stage in self.stages]
+        return self._load_chunks(db, reciprocal_rank_fusion([r for r in rankings if r], self.rrf_k, top_k))
+    
+    async def _rank_concurrently(
+        self,
+        document_ids: List[str],
+        query: str,
+        top_k: int = 3,
+        consistency_key: Optional[str] = None
+    ) -> List[str]:
+        if not document_ids:
+            return []
+        
+        open_session = lambda: self.session_factory(consistency_key)
+        candidates = self._stage_candidates(top_k)
+        started_at = time.monotonic()
+        tasks = {
+            asyncio.ensure_future(asyncio.to_thread(stage.run, open_session, document_ids, query, candidates)): stage
+            for stage in self.stages
+        }
+        
+        rankings = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                now = time.monotonic()
+                overdue = [task for task in pending if started_at + tasks[task].budget <= now]
+                # Over-budget stages are only dropped once another stage has answered; until then
+                # the turn waits for whichever late result arrives first rather than getting no context.
+                if rankings:
+                    for task in overdue:
+                        stage = tasks[task]
+                        stage.skipped += 1
+                        logger.warning(f"Retrieval stage '{stage.name}' missed its {stage.budget}s budget, skipping it")
+                        pending.discard(task)
+                        self._abandoned_stages.add(task)
+                        task.add_done_callback(self._abandoned_stages.discard)
+                    if not pending:
+                        break
+                elif overdue and len(overdue) == len(pending):
+                    logger.warning("Every retrieval stage missed its budget, waiting for the first late result")
+                
+                budgets = [started_at + tasks[task].budget for task in pending if task not in overdue]
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, min(budgets) - now) if budgets else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    stage = tasks[task]
+                    if task.result() is not None:
+                        rankings[stage.name] = task.result()
+                        if time.monotonic() > started_at + stage.budget:
+                            stage.late_results += 1
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if not rankings:
+            self.unranked_queries += 1
+            logger.warning(f"Every retrieval stage failed, answering without context for query: '{query[:50]}...'")
+        return reciprocal_rank_fusion(
+            [rankings[stage.name] for stage in self.stages if stage.name in rankings], self.rrf_k, top_k
+        )
+    
+    def _stage_candidates(self, top_k: int) -> int:
+        return max(top_k, self.fusion_candidates) if len(self.stages) > 1 else top_k
+    
+    def _bm25_rank(self, db: Session, document_ids: List[str], query: str, top_k: int = 3) -> List[str]:
+        query_hashes = query_term_hashes(query)
+        if not query_hashes or not document_ids:
+            return []
+        
+        chunk_total, term_total = db.query(func.sum(Document.chunk_count), func.sum(Document.term_count)).filter(
+            Document.id.in_(document_ids)
+        ).one()
+        if not chunk_total:
+            return []
+        average_length = term_total / chunk_total
+        
+        in_scope = (ChunkTerm.term_hash.in_(query_hashes), ChunkTerm.document_id.in_(document_ids))
+        document_frequency = dict(
+            db.query(ChunkTerm.term_hash, func.count()).filter(*in_scope).group_by(ChunkTerm.term_hash).all()
+        )
+        if not document_frequency:
+            return []
+        
+        idf = case(
+            {
+                hashed: math.log(1 + (chunk_total - df + 0.5) / (df + 0.5))
+                for hashed, df in document_frequency.items()
+            },
+            value=ChunkTerm.term_hash,
+            else_=0.0
+        )
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * ChunkTerm.chunk_length / average_length)
+        score = func.sum(idf * ChunkTerm.frequency * (BM25_K1 + 1) / (ChunkTerm.frequency + length_norm))
+        
+        ranked = db.query(ChunkTerm.chunk_id).filter(*in_scope).group_by(ChunkTerm.chunk_id).order_by(
+            score.desc(), ChunkTerm.chunk_id
+        ).limit(top_k).all()
+        logger.info(f"BM25 search matched {len(ranked)} chunks for query: '{query[:50]}...'")
+        return [chunk_id for chunk_id, in ranked]
+    
+    def _load_chunks(self, db: Session, chunk_ids: List[str]) -> List[DocumentChunk]:
+        if not chunk_ids:
+            return []
+        chunks = {chunk.id: chunk for chunk in db.query(DocumentChunk).filter(DocumentChunk.id.in_(chunk_ids))}
+        return [chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks]
+    
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "engine": self.engine_name,
+            "rrf_k": self.rrf_k,
+            "fusion_candidates": self.fusion_candidates,
+            "unranked_queries": self.unranked_queries,
+            "stages": {stage.name: stage.get_stats() for stage in self.stages},
+            "sparse": self.sparse_engine.get_stats() if self.sparse_engine is not None else None,
+            "pruned": self.pruned_engine.get_stats() if self.pruned_engine is not None else None,
+            "vector": self.vector_engine.get_stats() if self.vector_engine is not None else None
+        }
+    
     def keyword_search(self, query: str, chunks: List[DocumentChunk], top_k: int = 3) -> List[DocumentChunk]:
         if not chunks:
             return []
@@ -114,23 +387,33 @@ class RAGService:
         if not document_ids:
             return ""
         
-        chunks = db.query(DocumentChunk).join(Document).filter(
-            Document.id.in_(document_ids)
-        ).all()
-        
-        if not chunks:
-            logger.warning(f"No chunks found for documents: {document_ids}")
+        return self.format_context(self.search(db, document_ids, query, top_k=top_k))
+    
+    async def retrieve_context_concurrently(
+        self,
+        document_ids: List[str],
+        query: str,
+        top_k: int = 3,
+        consistency_key: Optional[str] = None
+    ) -> str:
+        chunk_ids = await self._rank_concurrently(document_ids, query, top_k=top_k, consistency_key=consistency_key)
+        if not chunk_ids:
             return ""
         
-        top_chunks = self.keyword_search(query, chunks, top_k=top_k)
+        def load() -> str:
+            with self.session_factory(consistency_key) as db:
+                return self.format_context(self._load_chunks(db, chunk_ids))
         
-        if not top_chunks:
+        return await asyncio.to_thread(load)
+    
+    def format_context(self, chunks: List[DocumentChunk]) -> str:
+        if not chunks:
             return ""
         
         context_parts = []
-        for i, chunk in enumerate(top_chunks, 1):
+        for i, chunk in enumerate(chunks, 1):
             context_parts.append(f"[Context {i}]\n{chunk.content}")
         
         context = "\n\n".join(context_parts)
-        logger.info(f"Retrieved {len(top_chunks)} chunks ({len(context)} chars) for query")
+        logger.info(f"Retrieved {len(chunks)} chunks ({len(context)} chars) for query")
         return context
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Mapping, Optional
+
+from ..core.exceptions import DeadlineExceededException
+
+logger = logging.getLogger(__name__)
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else float("inf")
+
+    def resize(self, per_minute: float):
+        self.level = min(self.level, float(per_minute))
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+
+
+class RateLimitPermit:
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.actual_tokens: Optional[int] = None
+        self.rate_limited = False
+        self.started_at = time.monotonic()
+
+    def record_usage(self, actual_tokens: int):
+        self.actual_tokens = actual_tokens
+
+    def mark_rate_limited(self):
+        self.rate_limited = True
+
+
+class RateLimiter:
+
+    def __init__(
+        self,
+        requests_per_minute: float = 30,
+        tokens_per_minute: float = 6000,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        latency_target: float = 5.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.latency_target = latency_target
+
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._queue: Deque[object] = deque()
+        self._condition = asyncio.Condition()
+
+        self._admitted = 0
+        self._throttled = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int, timeout: Optional[float] = None):
+        try:
+            permit = await asyncio.wait_for(self._admit(estimated_tokens), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceededException(f"Timed out after {timeout:.2f}s waiting in the LLM rate limiter queue")
+        try:
+            yield permit
+        finally:
+            await self._release(permit)
+
+    async def _admit(self, estimated_tokens: int) -> RateLimitPermit:
+        ticket = object()
+        enqueued_at = time.monotonic()
+
+        async with self._condition:
+            self._queue.append(ticket)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    delay = None
+                    if self._queue[0] is ticket and self.in_flight < int(self.concurrency_limit):
+                        delay = self._time_until_available(estimated_tokens)
+                        if delay <= 0:
+                            break
+
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+                raise
+
+            self._queue.popleft()
+            self.requests.level -= 1
+            self.tokens.level -= min(estimated_tokens, self.tokens.capacity)
+            self.in_flight += 1
+            self._admitted += 1
+
+            waited = time.monotonic() - enqueued_at
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+            self._condition.notify_all()
+
+        return RateLimitPermit(estimated_tokens)
+
+    def _time_until_available(self, estimated_tokens: int) -> float:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(
+            self.blocked_until - now,
+            self.requests.time_until(1),
+            self.tokens.time_until(estimated_tokens)
+        )
+
+    async def _release(self, permit: RateLimitPermit):
+        latency = time.monotonic() - permit.started_at
+
+        async with self._condition:
+            self.in_flight -= 1
+
+            if permit.actual_tokens is not None:
+                refund = min(permit.tokens, self.tokens.capacity) - permit.actual_tokens
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level + refund)
+
+            if permit.rate_limited:
+                self._throttled += 1
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+            elif latency > self.latency_target:
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit * 0.9)
+            else:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1 / self.concurrency_limit
+                )
+
+            self._condition.notify_all()
+
+    def update_from_headers(self, headers: Mapping[str, str], status_code: int = 200):
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        if limit_tokens and limit_tokens.isdigit() and float(limit_tokens) != self.tokens.capacity:
+            self.tokens.resize(float(limit_tokens))
+
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests and remaining_requests.isdigit():
+            self.requests.level = min(self.requests.level, float(remaining_requests))
+            if int(remaining_requests) == 0:
+                self._block_for(parse_duration(headers.get("x-ratelimit-reset-requests")))
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens and remaining_tokens.isdigit():
+            self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+            if int(remaining_tokens) == 0:
+                self._block_for(parse_duration(headers.get("x-ratelimit-reset-tokens")))
+
+        if status_code == 429:
+            retry_after = parse_duration(headers.get("retry-after"))
+            self._block_for(retry_after if retry_after is not None else 1.0)
+
+    def _block_for(self, seconds: Optional[float]):
+        if seconds:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            logger.warning(f"LLM provider rate limit reached, pausing new requests for {seconds:.2f}s")
+
+    def get_stats(self) -> Dict[str, any]:
+        now = time.monotonic()
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self._max_queue_depth,
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "admitted": self._admitted,
+            "throttled": self._throttled,
+            "avg_wait_seconds": round(self._total_wait / self._admitted, 4) if self._admitted else 0.0,
+            "max_wait_seconds": round(self._max_wait, 4),
+            "blocked_for_seconds": round(max(self.blocked_until - now, 0.0), 3),
+            "requests_available": round(self.requests.level, 2),
+            "tokens_available": round(self.tokens.level, 2)
+        }
@@ -0,0 +1,106 @@
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from ..core.deadline import Deadline
+from ..core.exceptions import CircuitOpenException, LLMProviderException
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, LLMProviderException) and error.retryable
+
+    def next_delay(self, attempt: int, error: Exception, deadline: Optional[Deadline] = None) -> Optional[float]:
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if isinstance(error, LLMProviderException) and error.retry_after:
+            delay = max(delay, error.retry_after)
+
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+
+        self.retries += 1
+        return delay
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str = "llm", failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        state = self.state
+        if state == self.CLOSED:
+            return
+
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            logger.info(f"Circuit breaker '{self.name}' half-open, sending probe request")
+            return
+
+        self._rejected += 1
+        raise CircuitOpenException(f"Circuit breaker '{self.name}' is open; failing fast")
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit breaker '{self.name}' closed")
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._trips += 1
+                logger.warning(
+                    f"Circuit breaker '{self.name}' opened after {self._consecutive_failures} consecutive failures"
+                )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "trips": self._trips,
+            "rejected": self._rejected
+        }
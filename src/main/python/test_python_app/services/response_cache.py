@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_messages(messages: List[Dict[str, any]]) -> List[Dict[str, str]]:
+    return [
+        {"role": m.get("role", ""), "content": " ".join(m.get("content", "").split())}
+        for m in messages
+    ]
+
+
+def build_prompt_key(
+    messages: List[Dict[str, any]],
+    model: str,
+    temperature: float,
+    max_tokens: int
+) -> str:
+    material = json.dumps(
+        {
+            "messages": normalize_messages(messages),
+            "model": model,
+            "temperature": round(float(temperature), 3),
+            "max_tokens": max_tokens
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600.0,
+        sqlite_path: Optional[str] = None,
+        modes: Optional[Iterable[str]] = None,
+        zero_temperature_only: bool = False
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self.modes = set(modes) if modes else None
+        self.zero_temperature_only = zero_temperature_only
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._writes_since_purge = 0
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expired = 0
+
+        if sqlite_path:
+            self._open_disk_tier(sqlite_path)
+
+        logger.info(
+            f"Response cache initialized (max_entries={max_entries}, ttl={ttl_seconds}s, "
+            f"sqlite={sqlite_path or 'disabled'}, modes={sorted(self.modes) if self.modes else 'all'})"
+        )
+
+    def _open_disk_tier(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._disk = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def is_cacheable(self, mode: Optional[str], temperature: float) -> bool:
+        if self.zero_temperature_only and temperature != 0:
+            return False
+        if self.modes is not None and mode not in self.modes:
+            return False
+        return True
+
+    def get(self, key: str) -> Optional[Dict[str, any]]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    return dict(value)
+                del self._memory[key]
+                self._expired += 1
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._put_memory(key, value, row[1])
+                    self._disk_hits += 1
+                    return dict(value)
+
+            self._misses += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, any], ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            self._stores += 1
+
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._writes_since_purge += 1
+                if self._writes_since_purge >= 100:
+                    self._disk.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (time.time(),))
+                    self._writes_since_purge = 0
+
+    def _put_memory(self, key: str, value: Dict[str, any], expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_response_cache")
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def get_stats(self) -> Dict[str, any]:
+        hits = self._memory_hits + self._disk_hits
+        lookups = hits + self._misses
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": self._disk is not None,
+            "hits": hits,
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "stores": self._stores,
+            "evictions": self._evictions,
+            "expired": self._expired
+        }
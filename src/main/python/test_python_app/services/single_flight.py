@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamCall:
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Future] = None
+        self.waiters = 0
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced request onto in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        call = self._streams.get(key)
+        if call is None:
+            call = _StreamCall()
+            self._streams[key] = call
+            call.task = asyncio.ensure_future(self._pump(key, call, factory()))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced stream onto in-flight call {key[:12]}")
+
+        call.waiters += 1
+        index = 0
+        try:
+            while True:
+                if index < len(call.events):
+                    event = call.events[index]
+                    index += 1
+                    yield event
+                    continue
+
+                if call.finished:
+                    if call.error is not None:
+                        raise call.error
+                    return
+
+                await call.changed.wait()
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def _pump(self, key: str, call: _StreamCall, source: AsyncIterator[Any]):
+        try:
+            async for event in source:
+                call.events.append(event)
+                call.notify()
+        except asyncio.CancelledError as e:
+            call.error = e
+            raise
+        except Exception as e:
+            call.error = e
+        finally:
+            self._forget(self._streams, key, call)
+            call.finished = True
+            call.notify()
+            await source.aclose()
+
+    @staticmethod
+    def _forget(calls: Dict[str, Any], key: str, call: Any):
+        if calls.get(key) is call:
+            del calls[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._streams)
+        }
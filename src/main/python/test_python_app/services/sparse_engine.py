@@ -0,0 +1,131 @@
+import importlib.util
+import logging
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.terms import query_term_hashes, term_hash, tokenize_terms
+from ..models.domain.entities import Document, DocumentChunk
+from .document_cache import DocumentIndexCache
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+ENTRY_OVERHEAD_BYTES = 100
+
+
+def sparse_engine_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None and importlib.util.find_spec("scipy") is not None
+
+
+class DocumentMatrix:
+
+    def __init__(self, signature: Tuple[int, int], chunk_ids: List[str], chunk_terms: List[List[int]]):
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        self.signature = signature
+        self.chunk_ids = chunk_ids
+        self.columns: Dict[int, int] = {}
+        indptr, indices, data = [0], [], []
+        for hashes in chunk_terms:
+            counts: Dict[int, int] = {}
+            for hashed in hashes:
+                column = self.columns.setdefault(hashed, len(self.columns))
+                counts[column] = counts.get(column, 0) + 1
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        self.term_frequencies = csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+            shape=(len(chunk_ids), len(self.columns))
+        )
+        self.chunk_lengths = np.array([len(hashes) for hashes in chunk_terms], dtype=np.float32)
+        self.document_frequency = np.bincount(self.term_frequencies.indices, minlength=len(self.columns))
+        self.size = (
+            self.term_frequencies.data.nbytes + self.term_frequencies.indices.nbytes
+            + self.term_frequencies.indptr.nbytes + self.chunk_lengths.nbytes + self.document_frequency.nbytes
+            + ENTRY_OVERHEAD_BYTES * (len(self.columns) + len(chunk_ids))
+        )
+
+
+class SparseRetrievalEngine:
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        if not sparse_engine_available():
+            raise RuntimeError("The sparse retrieval engine requires the 'numpy' and 'scipy' packages")
+
+        self.max_bytes = max_bytes
+        self._cache = DocumentIndexCache(max_bytes)
+
+        logger.info(f"Sparse retrieval engine initialized (max_bytes={max_bytes})")
+
+    def rank(self, db: Session, document_ids: List[str], query: str, top_k: int = 3) -> List[str]:
+        import numpy as np
+
+        query_hashes = query_term_hashes(query)
+        if not query_hashes or not document_ids:
+            return []
+
+        signatures = {
+            document_id: (chunk_count, term_count)
+            for document_id, chunk_count, term_count in db.query(
+                Document.id, Document.chunk_count, Document.term_count
+            ).filter(Document.id.in_(document_ids))
+        }
+        matrices = [self._matrix(db, document_id, signature) for document_id, signature in signatures.items()]
+        matrices = [matrix for matrix in matrices if matrix.chunk_ids]
+        if not matrices:
+            return []
+
+        chunk_total = sum(len(matrix.chunk_ids) for matrix in matrices)
+        average_length = sum(float(matrix.chunk_lengths.sum()) for matrix in matrices) / chunk_total
+        document_frequency = np.zeros(len(query_hashes), dtype=np.float64)
+        for matrix in matrices:
+            for i, hashed in enumerate(query_hashes):
+                column = matrix.columns.get(hashed)
+                if column is not None:
+                    document_frequency[i] += matrix.document_frequency[column]
+        idf = np.log(1 + (chunk_total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        scores, chunk_ids = [], []
+        for matrix in matrices:
+            present = [(i, matrix.columns[h]) for i, h in enumerate(query_hashes) if h in matrix.columns]
+            if not present:
+                continue
+            positions, columns = zip(*present)
+            saturated = matrix.term_frequencies[:, list(columns)]
+            rows = np.repeat(np.arange(saturated.shape[0]), np.diff(saturated.indptr))
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * matrix.chunk_lengths[rows] / average_length)
+            saturated.data = saturated.data * (BM25_K1 + 1) / (saturated.data + length_norm)
+            scores.append(saturated @ idf[list(positions)])
+            chunk_ids.extend(matrix.chunk_ids)
+        if not scores:
+            return []
+
+        scores = np.concatenate(scores)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = sorted((i for i in top if scores[i] > 0), key=lambda i: (-scores[i], chunk_ids[i]))
+        return [chunk_ids[i] for i in top]
+
+    def invalidate(self, document_id: str):
+        self._cache.invalidate(document_id)
+
+    def _matrix(self, db: Session, document_id: str, signature: Tuple[int, int]) -> DocumentMatrix:
+        def build() -> DocumentMatrix:
+            chunks = db.query(DocumentChunk.id, DocumentChunk.content).filter(
+                DocumentChunk.document_id == document_id
+            ).order_by(DocumentChunk.chunk_index).all()
+            return DocumentMatrix(
+                signature,
+                [chunk_id for chunk_id, _ in chunks],
+                [[term_hash(term) for term in tokenize_terms(content)] for _, content in chunks]
+            )
+
+        return self._cache.get_or_build(document_id, signature, build)
+
+    def get_stats(self) -> Dict[str, any]:
+        return self._cache.get_stats()
@@ -0,0 +1,95 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from .llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+MEMORY_WINDOW = "window"
+MEMORY_SUMMARY = "summary"
+MEMORY_MODES = (MEMORY_WINDOW, MEMORY_SUMMARY)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running memory of a conversation between a user and BOT GPT. "
+    "Merge the new turns into the existing summary. Keep facts, names, numbers, decisions, open questions "
+    "and user preferences; drop small talk. Write compact prose in the third person. "
+    "Return only the updated summary."
+)
+
+
+class SummaryMemory:
+
+    def __init__(
+        self,
+        llm_service: LLMService,
+        trigger_tokens: int = 2000,
+        recent_tokens: int = 1500,
+        max_summary_tokens: int = 400
+    ):
+        self.llm_service = llm_service
+        self.trigger_tokens = trigger_tokens
+        self.recent_tokens = recent_tokens
+        self.max_summary_tokens = max_summary_tokens
+
+        self.refreshes = 0
+        self.failed_refreshes = 0
+        self.folded_messages = 0
+
+        logger.info(
+            f"Summary memory initialized (trigger={trigger_tokens}, recent={recent_tokens}, "
+            f"max_summary={max_summary_tokens} tokens)"
+        )
+
+    def should_refresh(self, unsummarized_tokens: int) -> bool:
+        return unsummarized_tokens > self.recent_tokens + self.trigger_tokens
+
+    def split_for_folding(self, messages: List[Dict[str, any]]) -> Tuple[List[Dict[str, any]], List[Dict[str, any]]]:
+        kept_tokens = 0
+        start = len(messages)
+        while start > 0 and kept_tokens + messages[start - 1]["tokens"] <= self.recent_tokens:
+            start -= 1
+            kept_tokens += messages[start]["tokens"]
+
+        fold_budget = self.llm_service.history_budget(self.max_summary_tokens) - 2 * self.max_summary_tokens
+        end, fold_tokens = 0, 0
+        while end < start and fold_tokens + messages[end]["tokens"] <= fold_budget:
+            fold_tokens += messages[end]["tokens"]
+            end += 1
+        return messages[:end], messages[end:]
+
+    def summary_message(self, summary: str) -> Dict[str, any]:
+        content = f"Summary of the earlier conversation:\n{summary}"
+        return {"role": "system", "content": content, "tokens": self.llm_service.estimate_tokens(content)}
+
+    async def summarize(self, previous_summary: Optional[str], messages: List[Dict[str, any]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            f"Existing summary:\n{previous_summary or '(none yet)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        try:
+            response = await self.llm_service.generate_response(
+                messages=[
+                    {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.0,
+                max_response_tokens=self.max_summary_tokens,
+                mode=MEMORY_SUMMARY
+            )
+        except Exception:
+            self.failed_refreshes += 1
+            raise
+
+        self.refreshes += 1
+        self.folded_messages += len(messages)
+        return response["content"].strip()
+
+    def get_stats(self) -> Dict[str, any]:
+        return {
+            "trigger_tokens": self.trigger_tokens,
+            "recent_tokens": self.recent_tokens,
+            "refreshes": self.refreshes,
+            "failed_refreshes": self.failed_refreshes,
+            "folded_messages": self.folded_messages
+        }
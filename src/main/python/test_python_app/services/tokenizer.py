@@ -0,0 +1,177 @@
+import hashlib
+import importlib.util
+import logging
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pre-tokenization split used by the cl100k BPE vocabulary, rewritten for the stdlib `re` module.
+PRETOKENIZE_PATTERN = re.compile(
+    r"'(?i:[sdmt]|ll|ve|re)"
+    r"|[^\r\n\w]?[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\s\w]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+
+class Tokenizer(ABC):
+    name = "base"
+    approximate = False
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        ...
+
+
+# Not a BPE: estimates each pre-tokenized piece from its length. Counts are approximate and are
+# corrected over time by TokenCounter calibration against the provider's reported usage.
+class HeuristicTokenizer(Tokenizer):
+    name = "heuristic"
+    approximate = True
+
+    def __init__(self, letters_per_token: int = 6, symbols_per_token: int = 2):
+        self.letters_per_token = letters_per_token
+        self.symbols_per_token = symbols_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        total = 0
+        for piece in PRETOKENIZE_PATTERN.findall(text):
+            stripped = piece.strip()
+            if not stripped:
+                total += 1 if "\n" in piece or "\r" in piece else 0
+            elif stripped[-1].isalpha():
+                total += max(1, math.ceil(len(stripped) / self.letters_per_token))
+            elif stripped.isdigit():
+                total += 1
+            else:
+                total += max(1, math.ceil(len(stripped) / self.symbols_per_token))
+        return total
+
+
+class TiktokenTokenizer(Tokenizer):
+
+    def __init__(self, encoding_name: str):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.name = f"tiktoken:{encoding_name}"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def _bpe_factory(encoding_name: str) -> Callable[[], Tokenizer]:
+    def factory() -> Tokenizer:
+        if importlib.util.find_spec("tiktoken") is not None:
+            try:
+                return TiktokenTokenizer(encoding_name)
+            except Exception as e:
+                logger.warning(f"Could not load tiktoken encoding '{encoding_name}': {str(e)}. Using heuristic tokenizer.")
+        return HeuristicTokenizer()
+    return factory
+
+
+# Llama 3 uses its own 128k BPE vocabulary, which tiktoken does not ship, so Llama models fall
+# back to the heuristic count unless a real tokenizer is registered for them.
+TOKENIZER_REGISTRY: Dict[str, Callable[[], Tokenizer]] = {
+    "gpt-4o": _bpe_factory("o200k_base"),
+    "gpt-4": _bpe_factory("cl100k_base"),
+    "gpt-3.5": _bpe_factory("cl100k_base"),
+}
+
+
+def register_tokenizer(model_prefix: str, factory: Callable[[], Tokenizer]):
+    TOKENIZER_REGISTRY[model_prefix.lower()] = factory
+
+
+def get_tokenizer(model: Optional[str]) -> Tokenizer:
+    model = (model or "").lower()
+    matches = [prefix for prefix in TOKENIZER_REGISTRY if model.startswith(prefix)]
+    if not matches:
+        return HeuristicTokenizer()
+    return TOKENIZER_REGISTRY[max(matches, key=len)]()
+
+
+class TokenCounter:
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        cache_size: int = 10000,
+        per_message_overhead: int = 4,
+        calibration_alpha: float = 0.2,
+        min_calibration_tokens: int = 16
+    ):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self.per_message_overhead = per_message_overhead
+        self.calibration_alpha = calibration_alpha
+        self.min_calibration_tokens = min_calibration_tokens
+        self.calibration_factor = 1.0
+
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._calibration_samples = 0
+
+    def raw_count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        count = self._cache.get(key)
+        if count is not None:
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return count
+
+        self._misses += 1
+        count = self.tokenizer.count(text)
+        self._cache[key] = count
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return count
+
+    def count(self, text: str) -> int:
+        raw = self.raw_count(text)
+        if raw == 0:
+            return 0
+        return max(1, round(raw * self.calibration_factor))
+
+    def raw_count_messages(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.raw_count(m.get("content", "")) + self.per_message_overhead for m in messages)
+
+    def observe_usage(self, estimated_prompt_tokens: int, actual_prompt_tokens: int):
+        if estimated_prompt_tokens < self.min_calibration_tokens or actual_prompt_tokens <= 0:
+            return
+
+        ratio = actual_prompt_tokens / estimated_prompt_tokens
+        factor = (1 - self.calibration_alpha) * self.calibration_factor + self.calibration_alpha * ratio
+        self.calibration_factor = min(2.0, max(0.5, factor))
+        self._calibration_samples += 1
+
+    def get_stats(self) -> Dict[str, any]:
+        lookups = self._hits + self._misses
+        return {
+            "tokenizer": self.tokenizer.name,
+            "tokenizer_approximate": self.tokenizer.approximate,
+            "cache_entries": len(self._cache),
+            "cache_size": self.cache_size,
+            "cache_hits": self._hits,
+            "cache_misses": self._misses,
+            "cache_hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "calibration_factor": round(self.calibration_factor, 4),
+            "calibration_samples": self._calibration_samples
+        }
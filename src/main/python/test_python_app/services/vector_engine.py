@@ -0,0 +1,227 @@
+import importlib.util
+import logging
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.terms import term_hash, tokenize_terms
+from ..models.domain.entities import ChunkEmbedding, Document, DocumentChunk
+from .document_cache import DocumentIndexCache
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 64
+TRIGRAM_WEIGHT = 0.5
+QUANTIZATION_SCALE = 127
+ENTRY_OVERHEAD_BYTES = 100
+
+
+def vector_engine_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None
+
+
+class HashingEmbedder:
+
+    def __init__(self, dimensions: int = 256, features: int = 2 ** 15, seed: int = 13):
+        import numpy as np
+
+        self.dimensions = dimensions
+        self.features = features
+        self.name = f"hashing-{features}x{dimensions}-s{seed}"
+        rng = np.random.default_rng(seed)
+        self.projection = rng.choice(np.array([-1, 1], dtype=np.int8), size=(features, dimensions))
+
+    def feature_counts(self, text: str) -> Dict[int, float]:
+        counts: Counter = Counter()
+        for term in tokenize_terms(text):
+            counts[term_hash(term) % self.features] += 1.0
+            padded = f"#{term}#"
+            for i in range(len(padded) - 2):
+                counts[term_hash(padded[i:i + 3]) % self.features] += TRIGRAM_WEIGHT
+        return counts
+
+    def embed(self, texts: List[str]):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = self.feature_counts(text)
+            if not counts:
+                continue
+            features = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            weights = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            vectors[row] = weights @ self.projection[features]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize(vector) -> bytes:
+    import numpy as np
+
+    return np.round(vector * QUANTIZATION_SCALE).astype(np.int8).tobytes()
+
+
+def dequantize(blobs: List[bytes], dimensions: int):
+    import numpy as np
+
+    vectors = np.frombuffer(b"".join(blobs), dtype=np.int8).reshape(len(blobs), dimensions).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class IVFIndex:
+
+    def __init__(self, vectors, lists: int, iterations: int = 8, seed: int = 0):
+        import numpy as np
+
+        lists = max(1, min(lists, len(vectors)))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)]
+        assignment = np.zeros(len(vectors), dtype=np.int64)
+        for _ in range(iterations if lists > 1 else 0):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            sizes = np.bincount(assignment, minlength=lists)
+            empty = sizes == 0
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms == 0, 1, norms)
+        if lists > 1:
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+
+        self.centroids = centroids
+        self.positions = np.argsort(assignment, kind="stable")
+        self.vectors = vectors[self.positions]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=lists))))
+
+    @property
+    def lists(self) -> int:
+        return len(self.centroids)
+
+    def search(self, query, top_k: int, nprobe: int) -> Tuple[List[float], List[int]]:
+        import numpy as np
+
+        nprobe = min(nprobe, self.lists)
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probed])
+        if len(candidates) == 0:
+            return [], []
+
+        similarities = self.vectors[candidates] @ query
+        k = min(top_k, len(candidates))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        return similarities[best].tolist(), self.positions[candidates[best]].tolist()
+
+    @property
+    def size(self) -> int:
+        return self.vectors.nbytes + self.centroids.nbytes + self.positions.nbytes + self.offsets.nbytes
+
+
+class DocumentVectors:
+
+    def __init__(self, signature: Tuple[int, int], chunk_ids: List[str], index: Optional[IVFIndex]):
+        self.signature = signature
+        self.chunk_ids = chunk_ids
+        self.index = index
+        self.size = (index.size if index is not None else 0) + ENTRY_OVERHEAD_BYTES * (len(chunk_ids) + 1)
+
+
+class VectorRetrievalEngine:
+
+    def __init__(
+        self,
+        embedder: Optional[HashingEmbedder] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        nprobe: int = 16,
+        min_ivf_chunks: int = 4096,
+        min_similarity: float = 0.2
+    ):
+        if not vector_engine_available():
+            raise RuntimeError("The vector retrieval engine requires the 'numpy' package")
+
+        self.embedder = embedder or HashingEmbedder()
+        self.max_bytes = max_bytes
+        self.nprobe = nprobe
+        self.min_ivf_chunks = min_ivf_chunks
+        self.min_similarity = min_similarity
+        self._cache = DocumentIndexCache(max_bytes)
+
+        logger.info(
+            f"Vector retrieval engine initialized (embedder={self.embedder.name}, nprobe={nprobe}, "
+            f"min_ivf_chunks={min_ivf_chunks}, max_bytes={max_bytes})"
+        )
+
+    def embed_chunks(self, db: Session, document_id: str, chunks: List[DocumentChunk]):
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[start:start + EMBED_BATCH_SIZE]
+            vectors = self.embedder.embed([chunk.content for chunk in batch])
+            db.execute(insert(ChunkEmbedding), [
+                {
+                    "chunk_id": chunk.id,
+                    "document_id": document_id,
+                    "model": self.embedder.name,
+                    "embedding": quantize(vector)
+                }
+                for chunk, vector in zip(batch, vectors)
+            ])
+        self.invalidate(document_id)
+
+    def rank(self, db: Session, document_ids: List[str], query: str, top_k: int = 3) -> List[str]:
+        query_vector = self.embedder.embed([query])[0]
+        if not query_vector.any() or not document_ids:
+            return []
+
+        signatures = db.query(Document.id, Document.chunk_count, Document.term_count).filter(
+            Document.id.in_(document_ids)
+        ).all()
+        scored = []
+        for document_id, chunk_count, term_count in signatures:
+            vectors = self._vectors(db, document_id, (chunk_count, term_count))
+            if not vectors.chunk_ids:
+                continue
+            similarities, positions = vectors.index.search(query_vector, top_k, self.nprobe)
+            scored.extend(
+                (similarity, vectors.chunk_ids[position])
+                for similarity, position in zip(similarities, positions)
+                if similarity >= self.min_similarity
+            )
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [chunk_id for _, chunk_id in scored[:top_k]]
+
+    def invalidate(self, document_id: str):
+        self._cache.invalidate(document_id)
+
+    def _vectors(self, db: Session, document_id: str, signature: Tuple[int, int]) -> DocumentVectors:
+        def build() -> DocumentVectors:
+            import numpy as np
+
+            rows = db.query(
+                DocumentChunk.id, DocumentChunk.content, ChunkEmbedding.model, ChunkEmbedding.embedding
+            ).outerjoin(ChunkEmbedding, ChunkEmbedding.chunk_id == DocumentChunk.id).filter(
+                DocumentChunk.document_id == document_id
+            ).order_by(DocumentChunk.chunk_index).all()
+            if not rows:
+                return DocumentVectors(signature, [], None)
+
+            stale = [i for i, row in enumerate(rows) if row.model != self.embedder.name]
+            vectors = np.zeros((len(rows), self.embedder.dimensions), dtype=np.float32)
+            stored = [i for i, row in enumerate(rows) if row.model == self.embedder.name]
+            if stored:
+                vectors[stored] = dequantize([rows[i].embedding for i in stored], self.embedder.dimensions)
+            if stale:
+                logger.info(f"Embedding {len(stale)} chunks of document {document_id} without stored vectors")
+                vectors[stale] = self.embedder.embed([rows[i].content for i in stale])
+
+            lists = 1 if len(rows) < self.min_ivf_chunks else int(math.sqrt(len(rows)))
+            return DocumentVectors(signature, [row.id for row in rows], IVFIndex(vectors, lists))
+
+        return self._cache.get_or_build(document_id, signature, build)
+
+    def get_stats(self) -> Dict[str, any]:
+        return {"embedder": self.embedder.name, "nprobe": self.nprobe, **self._cache.get_stats()}
@@ -0,0 +1,88 @@
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "main" / "python"))
+
+from sqlalchemy import insert, select
+
+from test_python_app.core.database import AsyncDatabaseManager
+from test_python_app.models.domain.entities import Conversation, ConversationMode, Message, MessageRole, User
+from test_python_app.services.conversation_service import ConversationService, MAX_RESPONSE_TOKENS
+from test_python_app.services.llm_service import LLMService
+from test_python_app.services.rag_service import RAGService
+
+CONVERSATION_SIZES = [100, 1000, 10000, 50000]
+TOKENS_PER_MESSAGE = 40
+ROUNDS = 20
+
+
+async def seed(db_manager: AsyncDatabaseManager, size: int) -> str:
+    async with db_manager.get_session() as db:
+        user = User(username=f"bench-{size}")
+        db.add(user)
+        await db.flush()
+        conversation = Conversation(user_id=user.id, mode=ConversationMode.OPEN_CHAT, sequence_counter=size)
+        db.add(conversation)
+        await db.flush()
+        await db.execute(insert(Message), [
+            {
+                "conversation_id": conversation.id,
+                "role": MessageRole.USER if i % 2 else MessageRole.ASSISTANT,
+                "content": "word " * TOKENS_PER_MESSAGE,
+                "tokens": TOKENS_PER_MESSAGE,
+                "sequence_number": i
+            }
+            for i in range(1, size + 1)
+        ])
+        return conversation.id
+
+
+async def time_rounds(db_manager: AsyncDatabaseManager, load) -> float:
+    samples = []
+    for _ in range(ROUNDS):
+        async with db_manager.get_session() as db:
+            started = time.perf_counter()
+            await load(db)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main():
+    db_manager = AsyncDatabaseManager(f"sqlite:///{tempfile.mktemp(suffix='.db')}")
+    await db_manager.create_tables()
+    llm_service = LLMService(provider="mock")
+    service = ConversationService(llm_service, RAGService(), db_manager=db_manager)
+    budget = llm_service.history_budget(MAX_RESPONSE_TOKENS)
+
+    print(f"token budget {budget}, {TOKENS_PER_MESSAGE} tokens/message, median of {ROUNDS} rounds")
+    print(f"{'messages':>10} {'full load + truncate (ms)':>27} {'tail load (ms)':>16} {'rows kept':>10}")
+    for size in CONVERSATION_SIZES:
+        conversation_id = await seed(db_manager, size)
+
+        async def full_load(db):
+            messages = (await db.scalars(
+                select(Message).where(Message.conversation_id == conversation_id).order_by(Message.sequence_number)
+            )).all()
+            return llm_service.truncate_history(
+                [{"role": m.role.value, "content": m.content, "tokens": m.tokens} for m in messages],
+                max_context_tokens=budget
+            )
+
+        async def tail_load(db):
+            return await service._load_history_tail(db, conversation_id, size, budget)
+
+        full_ms = await time_rounds(db_manager, full_load)
+        tail_ms = await time_rounds(db_manager, tail_load)
+        async with db_manager.get_session() as db:
+            kept = len(await tail_load(db))
+        print(f"{size:>10} {full_ms:>27.2f} {tail_ms:>16.2f} {kept:>10}")
+
+    await db_manager.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
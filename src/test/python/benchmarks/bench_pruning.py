@@ -0,0 +1,115 @@
+import heapq
+import math
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "main" / "python"))
+
+from test_python_app.services.pruned_engine import DocumentPostings, maxscore_top_k, saturation
+
+DOCUMENT_COUNTS = [10, 40, 160]
+CHUNKS_PER_DOCUMENT = 500
+VOCABULARY_SIZE = 20000
+WORDS_PER_CHUNK = 80
+QUERIES = 20
+TOP_K = 3
+
+
+def build_index(rng: random.Random, document: int, cumulative_weights: list) -> DocumentPostings:
+    postings = {}
+    lengths = []
+    for ordinal in range(CHUNKS_PER_DOCUMENT):
+        words = rng.randint(WORDS_PER_CHUNK // 2, WORDS_PER_CHUNK * 3 // 2)
+        terms = rng.choices(range(VOCABULARY_SIZE), cum_weights=cumulative_weights, k=words)
+        lengths.append(len(terms))
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, frequency in counts.items():
+            postings.setdefault(term, []).append((ordinal, frequency))
+    return DocumentPostings(
+        (CHUNKS_PER_DOCUMENT, sum(lengths)),
+        [f"doc{document}-chunk{ordinal}" for ordinal in range(CHUNKS_PER_DOCUMENT)],
+        lengths,
+        postings
+    )
+
+
+def exhaustive_top_k(indexes: list, idf: dict, average_length: float, top_k: int) -> list:
+    scores = {}
+    for index in indexes:
+        for term, weight in idf.items():
+            postings = index.terms.get(term)
+            if postings is None:
+                continue
+            for ordinal, frequency in zip(postings.ordinals, postings.frequencies):
+                chunk_id = index.chunk_ids[ordinal]
+                score = weight * saturation(frequency, index.chunk_lengths[ordinal], average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+    return heapq.nlargest(top_k, ((score, chunk_id) for chunk_id, score in scores.items()))
+
+
+def median_ms(fn, queries: list) -> float:
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    rng = random.Random(7)
+    cumulative_weights = []
+    total = 0.0
+    for rank in range(VOCABULARY_SIZE):
+        total += 1 / (rank + 1)
+        cumulative_weights.append(total)
+
+    print(
+        f"{CHUNKS_PER_DOCUMENT} chunks/document, ~{WORDS_PER_CHUNK} words/chunk, top_k={TOP_K}, "
+        f"median of {QUERIES} queries (two common + two mid-frequency terms)"
+    )
+    print(
+        f"{'documents':>10} {'chunks':>8} {'postings':>9} {'exhaustive (ms)':>16} "
+        f"{'maxscore (ms)':>14} {'scored':>8} {'speedup':>8}"
+    )
+
+    indexes = []
+    for document_count in DOCUMENT_COUNTS:
+        while len(indexes) < document_count:
+            indexes.append(build_index(rng, len(indexes), cumulative_weights))
+
+        chunk_total = len(indexes) * CHUNKS_PER_DOCUMENT
+        average_length = sum(index.signature[1] for index in indexes) / chunk_total
+        queries = []
+        for _ in range(QUERIES):
+            terms = [rng.randrange(0, 50) for _ in range(2)] + [rng.randrange(50, 2000) for _ in range(2)]
+            df = {term: sum(len(index.terms[term].ordinals) for index in indexes if term in index.terms) for term in terms}
+            queries.append({
+                term: math.log(1 + (chunk_total - n + 0.5) / (n + 0.5)) for term, n in df.items() if n
+            })
+
+        postings = statistics.median(
+            sum(len(index.terms[term].ordinals) for index in indexes for term in idf if term in index.terms)
+            for idf in queries
+        )
+        scored = statistics.median(maxscore_top_k(indexes, idf, average_length, TOP_K)[1] for idf in queries)
+        for idf in queries:
+            expected = [score for score, _ in exhaustive_top_k(indexes, idf, average_length, TOP_K)]
+            found = [score for score, _ in maxscore_top_k(indexes, idf, average_length, TOP_K)[0]]
+            assert all(math.isclose(a, b) for a, b in zip(found, expected)) and len(found) == len(expected)
+
+        exhaustive_ms = median_ms(lambda idf: exhaustive_top_k(indexes, idf, average_length, TOP_K), queries)
+        maxscore_ms = median_ms(lambda idf: maxscore_top_k(indexes, idf, average_length, TOP_K), queries)
+        print(
+            f"{document_count:>10} {chunk_total:>8} {postings:>9.0f} {exhaustive_ms:>16.2f} "
+            f"{maxscore_ms:>14.2f} {scored / postings:>8.1%} {exhaustive_ms / maxscore_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
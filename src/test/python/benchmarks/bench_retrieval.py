@@ -0,0 +1,83 @@
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "main" / "python"))
+
+from test_python_app.core.database import DatabaseManager
+from test_python_app.models.domain.entities import Document, DocumentChunk, User
+from test_python_app.services.rag_service import RAGService
+from test_python_app.services.sparse_engine import SparseRetrievalEngine, sparse_engine_available
+
+CHUNK_COUNTS = [100, 1000, 10000]
+VOCABULARY_SIZE = 20000
+WORDS_PER_CHUNK = 80
+DOCUMENTS = 4
+QUERIES = 20
+TOP_K = 3
+
+
+def build_corpus(rng: random.Random, chunk_count: int) -> list:
+    vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    paragraphs = [" ".join(rng.choices(vocabulary, weights, k=WORDS_PER_CHUNK)) for _ in range(chunk_count)]
+    per_document = chunk_count // DOCUMENTS
+    return ["\n\n".join(paragraphs[i:i + per_document]) for i in range(0, chunk_count, per_document)]
+
+
+def median_ms(fn) -> float:
+    samples = []
+    for _ in range(QUERIES):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    rng = random.Random(7)
+    engine = SparseRetrievalEngine() if sparse_engine_available() else None
+    print(f"{DOCUMENTS} documents, {WORDS_PER_CHUNK} words/chunk, top_k={TOP_K}, median of {QUERIES} queries")
+    print(f"{'chunks':>8} {'python loop (ms)':>17} {'sql bm25 (ms)':>14} {'sparse cold (ms)':>17} {'sparse warm (ms)':>17}")
+
+    for chunk_count in CHUNK_COUNTS:
+        db_manager = DatabaseManager(f"sqlite:///{tempfile.mktemp(suffix='.db')}")
+        db_manager.create_tables()
+        rag_service = RAGService(chunk_size=WORDS_PER_CHUNK * 4, chunk_overlap=20)
+        with db_manager.get_session() as db:
+            user = User(username=f"bench-{chunk_count}")
+            db.add(user)
+            db.flush()
+            document_ids = []
+            for i, content in enumerate(build_corpus(rng, chunk_count)):
+                document = Document(user_id=user.id, filename=f"doc{i}.txt", content=content, file_size=len(content))
+                db.add(document)
+                db.flush()
+                rag_service.process_document(db, document)
+                document_ids.append(document.id)
+
+        query = " ".join(f"term{rng.randrange(50, 2000)}" for _ in range(4))
+        with db_manager.get_session() as db:
+            def python_loop():
+                chunks = db.query(DocumentChunk).filter(DocumentChunk.document_id.in_(document_ids)).all()
+                return rag_service.keyword_search(query, chunks, top_k=TOP_K)
+
+            loop_ms = median_ms(python_loop)
+            sql_ms = median_ms(lambda: rag_service.search(db, document_ids, query, top_k=TOP_K))
+            cold_ms = warm_ms = float("nan")
+            if engine is not None:
+                started = time.perf_counter()
+                for document_id in document_ids:
+                    engine.invalidate(document_id)
+                engine.rank(db, document_ids, query, top_k=TOP_K)
+                cold_ms = (time.perf_counter() - started) * 1000
+                warm_ms = median_ms(lambda: engine.rank(db, document_ids, query, top_k=TOP_K))
+        print(f"{chunk_count:>8} {loop_ms:>17.2f} {sql_ms:>14.2f} {cold_ms:>17.2f} {warm_ms:>17.2f}")
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
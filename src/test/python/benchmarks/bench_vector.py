@@ -0,0 +1,77 @@
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "main" / "python"))
+
+import numpy as np
+
+from test_python_app.services.vector_engine import HashingEmbedder, IVFIndex
+
+CHUNK_COUNTS = [1000, 10000, 30000]
+VOCABULARY_SIZE = 5000
+TOPICS = 50
+WORDS_PER_CHUNK = 40
+QUERIES = 100
+TOP_K = 10
+NPROBES = [1, 4, 16]
+
+
+def build_corpus(rng: random.Random, chunk_count: int) -> list:
+    vocabulary = [f"word{i}" for i in range(VOCABULARY_SIZE)]
+    topics = [rng.sample(vocabulary, 60) for _ in range(TOPICS)]
+    chunks = []
+    for _ in range(chunk_count):
+        topic = rng.choice(topics)
+        words = rng.choices(topic, k=WORDS_PER_CHUNK // 2) + rng.choices(vocabulary, k=WORDS_PER_CHUNK // 2)
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def main():
+    rng = random.Random(11)
+    embedder = HashingEmbedder()
+    print(f"{embedder.name}, {WORDS_PER_CHUNK} words/chunk, {QUERIES} queries, recall@{TOP_K} against exact search")
+    print(
+        f"{'chunks':>8} {'embed (ms/chunk)':>17} {'build (ms)':>11} {'exact (ms)':>11} "
+        + " ".join(f"{f'nprobe={n} ms / recall':>22}" for n in NPROBES)
+    )
+
+    for chunk_count in CHUNK_COUNTS:
+        chunks = build_corpus(rng, chunk_count)
+        started = time.perf_counter()
+        vectors = embedder.embed(chunks)
+        embed_ms = (time.perf_counter() - started) * 1000 / chunk_count
+
+        started = time.perf_counter()
+        index = IVFIndex(vectors, lists=int(np.sqrt(chunk_count)))
+        build_ms = (time.perf_counter() - started) * 1000
+
+        queries = embedder.embed([" ".join(rng.sample(c.split(), 8)) for c in rng.sample(chunks, QUERIES)])
+        exact_samples, exact_results = [], []
+        for query in queries:
+            started = time.perf_counter()
+            similarities = vectors @ query
+            exact_results.append(set(np.argpartition(-similarities, TOP_K - 1)[:TOP_K].tolist()))
+            exact_samples.append(time.perf_counter() - started)
+
+        columns = []
+        for nprobe in NPROBES:
+            samples, hits = [], 0
+            for query, exact in zip(queries, exact_results):
+                started = time.perf_counter()
+                _, found = index.search(query, TOP_K, nprobe)
+                samples.append(time.perf_counter() - started)
+                hits += len(exact & set(found))
+            columns.append(f"{statistics.median(samples) * 1000:>12.3f} / {hits / (QUERIES * TOP_K):.3f}")
+
+        print(
+            f"{chunk_count:>8} {embed_ms:>17.3f} {build_ms:>11.1f} {statistics.median(exact_samples) * 1000:>11.3f} "
+            + " ".join(f"{c:>22}" for c in columns)
+        )
+
+
+if __name__ == "__main__":
+    main()
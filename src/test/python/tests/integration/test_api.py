@@ -1,7 +1,9 @@
 import pytest
 from fastapi.testclient import TestClient
 import os
+import json
 import tempfile
+import uuid
 from pathlib import Path
 
 os.environ["DATABASE_PATH"] = tempfile.mktemp(suffix=".db")
@@ -65,6 +67,19 @@ class TestHealthEndpoints:
         assert data["status"] == "UP"
         assert "timestamp" in data
         assert "database" in data
+        assert data["llm_circuit_breaker"] == "closed"
+    
+    def test_operations_metrics(self, client):
+        response = client.get("/api/operations/metrics")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["llm"]["provider"] == "mock"
+        assert "saturation" in data["llm"]["http_pool"]
+        assert data["database"]["sqlite_profile"] == "default"
+        assert data["database"]["writer"] is None
+        assert data["database"]["routing"]["replicas"] == []
+        assert "pinned_sessions" in data["database"]["async_routing"]
+        assert data["history_cache"]["max_bytes"] > 0
 
 
 class TestUserEndpoints:
@@ -100,6 +115,23 @@ class TestUserEndpoints:
         assert isinstance(users, list)
         assert len(users) > 0
     
+    def test_list_users_with_cursor(self, client):
+        for i in range(3):
+            client.post("/api/users", json={"username": f"paged_{i}_{uuid.uuid4().hex[:8]}"})
+        
+        first = client.get("/api/users?page_size=2&include_total=true")
+        assert first.status_code == 200
+        assert len(first.json()) == 2
+        assert int(first.headers["X-Total-Count"]) >= 3
+        
+        second = client.get(f"/api/users?page_size=2&cursor={first.headers['X-Next-Cursor']}")
+        assert second.status_code == 200
+        assert not {u["id"] for u in first.json()} & {u["id"] for u in second.json()}
+    
+    def test_list_users_rejects_bad_cursor(self, client):
+        response = client.get("/api/users?cursor=garbage")
+        assert response.status_code == 400
+    
     def test_get_user(self, client, test_user):
         response = client.get(f"/api/users/{test_user['id']}")
         assert response.status_code == 200
@@ -137,6 +169,28 @@ class TestDocumentEndpoints:
         assert isinstance(documents, list)
         assert len(documents) > 0
     
+    def test_list_documents_with_cursor(self, client, test_user):
+        for i in range(3):
+            client.post(
+                "/api/documents",
+                json={"user_id": test_user["id"], "filename": f"paged_{i}.txt", "content": "Paged content."}
+            )
+        
+        first = client.get(f"/api/documents?user_id={test_user['id']}&page_size=2&include_total=true")
+        assert first.status_code == 200
+        assert len(first.json()) == 2
+        assert int(first.headers["X-Total-Count"]) >= 3
+        
+        second = client.get(
+            f"/api/documents?user_id={test_user['id']}&page_size=2&cursor={first.headers['X-Next-Cursor']}"
+        )
+        assert second.status_code == 200
+        assert not {d["id"] for d in first.json()} & {d["id"] for d in second.json()}
+    
+    def test_list_documents_rejects_bad_cursor(self, client, test_user):
+        response = client.get(f"/api/documents?user_id={test_user['id']}&cursor=garbage")
+        assert response.status_code == 400
+    
     def test_get_document(self, client, test_document):
         response = client.get(f"/api/documents/{test_document['id']}")
         assert response.status_code == 200
@@ -197,14 +251,35 @@ class TestConversationEndpoints:
         assert "message" in data
     
     def test_list_conversations(self, client, test_user):
-        response = client.get(f"/api/conversations?user_id={test_user['id']}&page=1&page_size=10")
+        response = client.get(f"/api/conversations?user_id={test_user['id']}&page_size=10")
         assert response.status_code == 200
         data = response.json()
         assert "items" in data
-        assert "total" in data
-        assert "page" in data
+        assert "X-Total-Count" not in response.headers
         assert isinstance(data["items"], list)
     
+    def test_list_conversations_with_cursor(self, client, test_user):
+        for i in range(3):
+            client.post(
+                "/api/conversations",
+                json={"user_id": test_user["id"], "first_message": f"Paged {i}", "mode": "open_chat"}
+            )
+        
+        first = client.get(f"/api/conversations?user_id={test_user['id']}&page_size=2&include_total=true")
+        assert first.status_code == 200
+        assert len(first.json()["items"]) == 2
+        assert int(first.headers["X-Total-Count"]) >= 3
+        
+        second = client.get(
+            f"/api/conversations?user_id={test_user['id']}&page_size=2&cursor={first.headers['X-Next-Cursor']}"
+        )
+        assert second.status_code == 200
+        assert not {c["id"] for c in first.json()["items"]} & {c["id"] for c in second.json()["items"]}
+    
+    def test_list_conversations_rejects_bad_cursor(self, client, test_user):
+        response = client.get(f"/api/conversations?user_id={test_user['id']}&cursor=garbage")
+        assert response.status_code == 400
+    
     def test_get_conversation_detail(self, client, test_user):
         create_response = client.post(
             "/api/conversations",
@@ -245,6 +320,50 @@ class TestConversationEndpoints:
         assert data["conversation_id"] == conv_id
         assert data["message"]["role"] == "assistant"
     
+    def test_stream_message_to_conversation(self, client, test_user):
+        create_response = client.post(
+            "/api/conversations",
+            json={
+                "user_id": test_user["id"],
+                "first_message": "Hello",
+                "mode": "open_chat"
+            }
+        )
+        conv_id = create_response.json()["conversation_id"]
+        
+        response = client.post(
+            f"/api/conversations/{conv_id}/messages/stream",
+            json={
+                "content": "Tell me a story"
+            }
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            name, data = block.split("\n", 1)
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        
+        assert events[0][0] == "start"
+        assert events[-1][0] == "done"
+        streamed = "".join(data["content"] for name, data in events if name == "delta")
+        assert events[-1][1]["message"]["content"] == streamed
+        
+        messages = client.get(f"/api/conversations/{conv_id}").json()["messages"]
+        assert len(messages) == 4
+        assert [m["sequence_number"] for m in messages] == [1, 2, 3, 4]
+        assert messages[-1]["content"] == streamed
+    
+    def test_stream_message_to_nonexistent_conversation(self, client):
+        response = client.post(
+            "/api/conversations/nonexistent-id/messages/stream",
+            json={
+                "content": "Hello"
+            }
+        )
+        assert response.status_code == 404
+    
     def test_delete_conversation(self, client, test_user):
         create_response = client.post(
             "/api/conversations",
@@ -1,11 +1,50 @@
 import pytest
+import json
+from datetime import datetime
+import asyncio
+import anyio
+import httpx
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
 from unittest.mock import Mock, AsyncMock, patch
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from test_python_app.core.http_client import PooledHTTPClient
+from test_python_app.services.single_flight import SingleFlight
+from test_python_app.services.rate_limiter import RateLimiter, parse_duration
+from test_python_app.services.resilience import RetryPolicy, CircuitBreaker
+from test_python_app.core.deadline import Deadline
+from test_python_app.core.exceptions import (
+    CircuitOpenException, ClientDisconnectedException, DeadlineExceededException, InvalidCursorException,
+    LLMProviderException
+)
+from test_python_app.core.pagination import decode_cursor, encode_cursor
+from test_python_app.core.terms import MAX_QUERY_TERMS
+from test_python_app.core.database import AsyncDatabaseManager, DatabaseManager, to_async_url
+from test_python_app.core.routing import ReadYourWritesGuard, ReplicaSet, RoutingSession
+from test_python_app.controller.routes.v1.conversations import cancel_on_disconnect
+from test_python_app.services.response_cache import ResponseCache, build_prompt_key
+from test_python_app.services.tokenizer import TokenCounter, HeuristicTokenizer, Tokenizer, get_tokenizer, register_tokenizer
 
 from test_python_app.services.llm_service import LLMService
-from test_python_app.services.rag_service import RAGService
-from test_python_app.services.conversation_service import ConversationService
-from test_python_app.models.domain.entities import User, Conversation, Message, Document, DocumentChunk, ConversationMode, MessageRole
+from test_python_app.services.rag_service import RAGService, RetrievalStage, reciprocal_rank_fusion
+from test_python_app.services.history_cache import HistoryCache, message_size
+from test_python_app.services.message_index import MessageIndex
+from test_python_app.services.pruned_engine import DocumentPostings, PrunedRetrievalEngine, maxscore_top_k, saturation
+from test_python_app.services.sparse_engine import SparseRetrievalEngine, sparse_engine_available
+from test_python_app.services.vector_engine import (
+    HashingEmbedder, IVFIndex, VectorRetrievalEngine, dequantize, quantize, vector_engine_available
+)
+from test_python_app.services.summary_memory import SummaryMemory, SUMMARY_INSTRUCTIONS
+from test_python_app.services.conversation_service import (
+    ConversationService, DISCONNECT_DISCARD, DISCONNECT_PERSIST_PARTIAL
+)
+from test_python_app.models.domain.entities import (
+    User, Conversation, ConversationMemory, Message, MessageTerm, Document, ChunkTerm, ChunkEmbedding, ConversationMode, MessageRole
+)
 from test_python_app.models.schemas.request_schemas import CreateConversationRequest, AddMessageRequest
 
 
@@ -16,7 +55,18 @@ class TestLLMService:
         text = "Hello world"
         tokens = llm_service.estimate_tokens(text)
         assert tokens > 0
-        assert tokens == len(text) // 4
+        assert tokens == llm_service.token_counter.count(text)
+    
+    def test_truncate_history_uses_stored_tokens(self):
+        llm_service = LLMService(provider="mock")
+        messages = [
+            {"role": "user", "content": "old", "tokens": 500},
+            {"role": "assistant", "content": "older reply", "tokens": 10},
+            {"role": "user", "content": "latest", "tokens": 10}
+        ]
+        
+        truncated = llm_service.truncate_history(messages, max_context_tokens=100)
+        assert [m["content"] for m in truncated] == ["older reply", "latest"]
     
     def test_truncate_history_basic(self):
         llm_service = LLMService(provider="mock")
@@ -51,6 +101,19 @@ class TestLLMService:
         assert "model" in response
         assert len(response["content"]) > 0
     
+    @pytest.mark.asyncio
+    async def test_stream_mock_response(self):
+        llm_service = LLMService(provider="mock")
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        events = [event async for event in llm_service.stream_response(messages)]
+        deltas = [e["content"] for e in events if e["type"] == "delta"]
+        
+        assert len(deltas) > 1
+        assert events[-1]["type"] == "done"
+        assert "".join(deltas) == events[-1]["content"]
+        assert events[-1]["tokens_used"] > 0
+    
     def test_create_system_prompt_open_chat(self):
         llm_service = LLMService(provider="mock")
         prompt = llm_service.create_system_prompt("open_chat")
@@ -65,6 +128,679 @@ class TestLLMService:
         assert context in prompt
 
 
+class TestPooledHTTPClient:
+    
+    @staticmethod
+    def _completion_transport(calls):
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "pooled reply"}}],
+                "usage": {"total_tokens": 12},
+                "model": "llama-3.1-8b-instant"
+            })
+        return httpx.MockTransport(handler)
+    
+    @pytest.mark.asyncio
+    async def test_client_reused_across_calls(self):
+        calls = []
+        http_client = PooledHTTPClient(max_connections=4, transport=self._completion_transport(calls))
+        llm_service = LLMService(provider="groq", api_key="test-key", http_client=http_client)
+        
+        await llm_service.startup()
+        client = http_client.client
+        
+        for _ in range(3):
+            response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+            assert response["content"] == "pooled reply"
+        
+        assert http_client.client is client
+        assert len(calls) == 3
+        
+        stats = llm_service.get_stats()["http_pool"]
+        assert stats["total_requests"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["max_connections"] == 4
+        
+        await llm_service.shutdown()
+        assert http_client.client is None
+    
+    @pytest.mark.asyncio
+    async def test_saturation_tracking(self):
+        http_client = PooledHTTPClient(max_connections=1, transport=self._completion_transport([]))
+        
+        http_client._enter()
+        await http_client.post("https://example.test/v1/chat/completions", json={})
+        http_client._exit()
+        
+        stats = http_client.get_stats()
+        assert stats["peak_in_flight"] == 2
+        assert stats["saturated_requests"] == 1
+        await http_client.close()
+    
+    @pytest.mark.asyncio
+    async def test_stream_groq_response(self):
+        body = "".join(
+            f"data: {chunk}\n\n" for chunk in [
+                '{"model": "llama-3.1-8b-instant", "choices": [{"delta": {"content": "Hel"}}]}',
+                '{"choices": [{"delta": {"content": "lo"}}]}',
+                '{"choices": [], "usage": {"total_tokens": 9}}',
+                "[DONE]"
+            ]
+        )
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        )
+        llm_service = LLMService(provider="groq", api_key="test-key", http_client=PooledHTTPClient(transport=transport))
+        
+        events = [event async for event in llm_service.stream_response([{"role": "user", "content": "Hi"}])]
+        
+        assert [e["content"] for e in events if e["type"] == "delta"] == ["Hel", "lo"]
+        assert events[-1]["content"] == "Hello"
+        assert events[-1]["tokens_used"] == 9
+        assert events[-1]["model"] == "llama-3.1-8b-instant"
+        await llm_service.shutdown()
+    
+    def test_http2_falls_back_without_h2(self):
+        with patch("test_python_app.core.http_client.importlib.util.find_spec", return_value=None):
+            http_client = PooledHTTPClient(http2=True)
+        assert http_client.http2 is False
+
+
+class TestTokenCounter:
+    
+    def test_heuristic_tokenizer_counts_pieces(self):
+        tokenizer = HeuristicTokenizer()
+        assert tokenizer.count("") == 0
+        assert tokenizer.count("Hello world") == 2
+        assert tokenizer.count("Hello, how are you?") == 6
+    
+    def test_cache_keyed_by_content(self):
+        counter = TokenCounter(HeuristicTokenizer(), cache_size=2)
+        counter.count("first text")
+        counter.count("first text")
+        counter.count("second text")
+        counter.count("third text")
+        
+        stats = counter.get_stats()
+        assert stats["cache_hits"] == 1
+        assert stats["cache_misses"] == 3
+        assert stats["cache_entries"] == 2
+    
+    def test_calibration_against_provider_usage(self):
+        counter = TokenCounter(HeuristicTokenizer(), calibration_alpha=1.0)
+        text = "word " * 40
+        raw = counter.count(text)
+        
+        counter.observe_usage(estimated_prompt_tokens=100, actual_prompt_tokens=150)
+        assert counter.calibration_factor == 1.5
+        assert counter.count(text) == round(raw * 1.5)
+        
+        counter.observe_usage(estimated_prompt_tokens=4, actual_prompt_tokens=400)
+        assert counter.calibration_factor == 1.5
+    
+    def test_tokenizer_registry_per_model(self):
+        class FixedTokenizer(Tokenizer):
+            name = "fixed"
+            
+            def count(self, text):
+                return 7
+        
+        register_tokenizer("fixed-model", FixedTokenizer)
+        assert get_tokenizer("fixed-model-v2").count("anything") == 7
+        assert isinstance(get_tokenizer("unknown-model"), HeuristicTokenizer)
+    
+    def test_llama_counts_are_labelled_approximate(self):
+        counter = TokenCounter(get_tokenizer("llama-3-8b-instruct"))
+        assert counter.get_stats()["tokenizer_approximate"] is True
+        
+        with pytest.raises(TypeError):
+            Tokenizer()
+    
+    @pytest.mark.asyncio
+    async def test_provider_usage_calibrates_and_strips_tokens(self):
+        payloads = []
+        
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "reply"}}],
+                "usage": {"prompt_tokens": 60, "completion_tokens": 3, "total_tokens": 63}
+            })
+        
+        llm_service = LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=PooledHTTPClient(transport=httpx.MockTransport(handler))
+        )
+        messages = [{"role": "user", "content": "tell me about tokenizers " * 5, "tokens": 25}]
+        
+        response = await llm_service.generate_response(messages)
+        
+        assert payloads[0]["messages"] == [{"role": "user", "content": messages[0]["content"]}]
+        assert response["prompt_tokens"] == 60
+        assert response["completion_tokens"] == 3
+        assert llm_service.token_counter.get_stats()["calibration_samples"] == 1
+        await llm_service.shutdown()
+
+
+class TestResponseCache:
+    
+    def test_prompt_key_normalizes_whitespace_only(self):
+        a = build_prompt_key([{"role": "user", "content": "Hi  there"}], "m", 0.7, 100)
+        b = build_prompt_key([{"role": "user", "content": " Hi there ", "tokens": 3}], "m", 0.7, 100)
+        c = build_prompt_key([{"role": "user", "content": "Hi there"}], "m", 0.0, 100)
+        d = build_prompt_key([{"role": "user", "content": "hi there"}], "m", 0.7, 100)
+        assert a == b
+        assert a != c
+        assert a != d
+    
+    def test_lru_eviction_and_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", {"content": "A"})
+        cache.set("b", {"content": "B"})
+        cache.get("a")
+        cache.set("c", {"content": "C"})
+        
+        assert cache.get("b") is None
+        assert cache.get("a")["content"] == "A"
+        
+        cache.set("expired", {"content": "old"}, ttl_seconds=-1)
+        assert cache.get("expired") is None
+        
+        stats = cache.get_stats()
+        assert stats["evictions"] == 2
+        assert stats["expired"] == 1
+    
+    def test_sqlite_tier_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        writer = ResponseCache(sqlite_path=path)
+        writer.set("key", {"content": "from disk"})
+        
+        reader = ResponseCache(sqlite_path=path)
+        assert reader.get("key")["content"] == "from disk"
+        assert reader.get("key")["content"] == "from disk"
+        assert reader.get_stats()["disk_hits"] == 1
+        assert reader.get_stats()["memory_hits"] == 1
+        writer.close()
+        reader.close()
+    
+    def test_mode_and_temperature_opt_in(self):
+        cache = ResponseCache(modes=["open_chat"], zero_temperature_only=True)
+        assert cache.is_cacheable("open_chat", 0)
+        assert not cache.is_cacheable("open_chat", 0.7)
+        assert not cache.is_cacheable("grounded_rag", 0)
+    
+    @pytest.mark.asyncio
+    async def test_generate_response_served_from_cache(self):
+        llm_service = LLMService(provider="mock", response_cache=ResponseCache())
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        first = await llm_service.generate_response(messages, mode="open_chat")
+        second = await llm_service.generate_response(messages, mode="open_chat")
+        
+        assert "cached" not in first
+        assert second["cached"] is True
+        assert second["content"] == first["content"]
+        assert llm_service.get_stats()["response_cache"]["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_case_distinct_prompts_miss_cache(self):
+        llm_service = LLMService(provider="mock", response_cache=ResponseCache())
+        
+        await llm_service.generate_response([{"role": "user", "content": "Polish"}], mode="open_chat")
+        response = await llm_service.generate_response([{"role": "user", "content": "polish"}], mode="open_chat")
+        
+        assert "cached" not in response
+        assert llm_service.get_stats()["response_cache"]["hits"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_warm_cache_from_jsonl(self, tmp_path):
+        faq = tmp_path / "faq.jsonl"
+        faq.write_text(
+            json.dumps({"prompt": "What are your hours?", "response": "We are open 9-5."}) + "\n"
+            + json.dumps({"prompt": "hi"}) + "\n"
+        )
+        llm_service = LLMService(provider="mock", response_cache=ResponseCache())
+        
+        assert await llm_service.warm_response_cache(str(faq)) == 2
+        
+        messages = [
+            {"role": "system", "content": llm_service.create_system_prompt("open_chat")},
+            {"role": "user", "content": " What are  your hours?", "tokens": 5}
+        ]
+        response = await llm_service.generate_response(messages, mode="open_chat")
+        assert response["cached"] is True
+        assert response["content"] == "We are open 9-5."
+
+
+class TestSingleFlight:
+    
+    @staticmethod
+    def _slow_llm_service(calls, status_code=200):
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(status_code, json={
+                "choices": [{"message": {"content": "shared reply"}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+            })
+        
+        http_client = PooledHTTPClient(transport=httpx.MockTransport(handler))
+        return LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=http_client,
+            retry_policy=RetryPolicy(max_attempts=1)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_share_upstream_call(self):
+        calls = []
+        llm_service = self._slow_llm_service(calls)
+        messages = [{"role": "user", "content": "What is FastAPI?"}]
+        
+        results = await asyncio.gather(*[llm_service.generate_response(messages) for _ in range(5)])
+        
+        assert len(calls) == 1
+        assert all(r["content"] == "shared reply" for r in results)
+        assert llm_service.get_stats()["single_flight"]["coalesced"] == 4
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_waiters_receive_same_error(self):
+        calls = []
+        llm_service = self._slow_llm_service(calls, status_code=500)
+        messages = [{"role": "user", "content": "What is FastAPI?"}]
+        
+        results = await asyncio.gather(
+            *[llm_service.generate_response(messages) for _ in range(3)],
+            return_exceptions=True
+        )
+        
+        assert len(calls) == 1
+        assert all(isinstance(r, Exception) for r in results)
+        assert len({str(r) for r in results}) == 1
+        await llm_service.shutdown()
+    
+    @staticmethod
+    def _timeout_honouring_llm_service(calls, delay, body):
+        async def handler(request):
+            calls.append(request)
+            read_timeout = request.extensions["timeout"]["read"]
+            if read_timeout < delay:
+                await asyncio.sleep(read_timeout)
+                raise httpx.ReadTimeout("read timeout", request=request)
+            await asyncio.sleep(delay)
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        
+        http_client = PooledHTTPClient(transport=httpx.MockTransport(handler))
+        return LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=http_client,
+            retry_policy=RetryPolicy(max_attempts=1)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_coalesced_callers_keep_their_own_deadlines(self):
+        calls = []
+        body = json.dumps({"choices": [{"message": {"content": "shared reply"}}]})
+        llm_service = self._timeout_honouring_llm_service(calls, 0.3, body)
+        messages = [{"role": "user", "content": "What is FastAPI?"}]
+        
+        leader, follower = await asyncio.gather(
+            llm_service.generate_response(messages, deadline=Deadline(0.1)),
+            llm_service.generate_response(messages, deadline=Deadline(5)),
+            return_exceptions=True
+        )
+        
+        assert isinstance(leader, DeadlineExceededException)
+        assert follower["content"] == "shared reply"
+        assert len(calls) == 1
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_coalesced_streams_keep_their_own_deadlines(self):
+        calls = []
+        body = 'data: {"choices": [{"delta": {"content": "shared reply"}}]}\n\ndata: [DONE]\n\n'
+        llm_service = self._timeout_honouring_llm_service(calls, 0.3, body)
+        messages = [{"role": "user", "content": "What is FastAPI?"}]
+        
+        async def consume(deadline):
+            return [event async for event in llm_service.stream_response(messages, deadline=deadline)]
+        
+        leader, follower = await asyncio.gather(
+            consume(Deadline(0.1)), consume(Deadline(5)), return_exceptions=True
+        )
+        
+        assert isinstance(leader, DeadlineExceededException)
+        assert follower[-1]["content"] == "shared reply"
+        assert len(calls) == 1
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_stream_fan_out(self):
+        single_flight = SingleFlight()
+        started = []
+        
+        async def source():
+            started.append(True)
+            for i in range(3):
+                await asyncio.sleep(0.01)
+                yield i
+        
+        async def consume():
+            return [event async for event in single_flight.stream("key", source)]
+        
+        results = await asyncio.gather(consume(), consume(), consume())
+        
+        assert len(started) == 1
+        assert results == [[0, 1, 2]] * 3
+        assert single_flight.get_stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_upstream_cancelled_when_all_waiters_leave(self):
+        single_flight = SingleFlight()
+        cancelled = asyncio.Event()
+        
+        async def slow_call():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        first = asyncio.ensure_future(single_flight.do("key", slow_call))
+        second = asyncio.ensure_future(single_flight.do("key", slow_call))
+        await asyncio.sleep(0)
+        
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+        
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+class TestRateLimiter:
+    
+    def test_parse_duration(self):
+        assert parse_duration("2m59.56s") == pytest.approx(179.56)
+        assert parse_duration("7.66s") == pytest.approx(7.66)
+        assert parse_duration("250ms") == pytest.approx(0.25)
+        assert parse_duration("3") == 3.0
+        assert parse_duration(None) is None
+    
+    @pytest.mark.asyncio
+    async def test_callers_queue_on_concurrency_limit(self):
+        limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+        order = []
+        
+        async def call(name):
+            async with limiter.acquire(10):
+                order.append(f"start-{name}")
+                await asyncio.sleep(0.02)
+                order.append(f"end-{name}")
+        
+        await asyncio.gather(call("a"), call("b"))
+        
+        assert order == ["start-a", "end-a", "start-b", "end-b"]
+        assert limiter.get_stats()["max_wait_seconds"] >= 0.015
+        assert limiter.get_stats()["queue_depth"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_token_budget_paces_callers(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+        
+        async with limiter.acquire(6000):
+            pass
+        async with limiter.acquire(10):
+            pass
+        
+        assert limiter.get_stats()["max_wait_seconds"] >= 0.08
+    
+    @pytest.mark.asyncio
+    async def test_aimd_adjusts_concurrency(self):
+        limiter = RateLimiter(initial_concurrency=4, latency_target=5.0)
+        
+        async with limiter.acquire(10):
+            pass
+        assert limiter.concurrency_limit == pytest.approx(4.25)
+        
+        async with limiter.acquire(10) as permit:
+            permit.mark_rate_limited()
+        assert limiter.concurrency_limit == pytest.approx(2.125)
+    
+    @pytest.mark.asyncio
+    async def test_429_is_queued_and_retried(self):
+        responses = [
+            httpx.Response(429, headers={"retry-after": "0.05"}, json={"error": "rate limited"}),
+            httpx.Response(200, headers={"x-ratelimit-remaining-tokens": "5000"}, json={
+                "choices": [{"message": {"content": "after retry"}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+            })
+        ]
+        limiter = RateLimiter()
+        llm_service = LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=PooledHTTPClient(transport=httpx.MockTransport(lambda request: responses.pop(0))),
+            rate_limiter=limiter
+        )
+        
+        response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        
+        assert response["content"] == "after retry"
+        stats = llm_service.get_stats()["rate_limiter"]
+        assert stats["throttled"] == 1
+        assert stats["admitted"] == 2
+        assert stats["max_wait_seconds"] >= 0.04
+        assert stats["tokens_available"] <= 5000
+        await llm_service.shutdown()
+
+
+class TestResilience:
+    
+    @staticmethod
+    def _llm_service(handler, **kwargs):
+        return LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=PooledHTTPClient(transport=httpx.MockTransport(handler)),
+            **kwargs
+        )
+    
+    @staticmethod
+    def _ok_response():
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "recovered"}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+        })
+    
+    @pytest.mark.asyncio
+    async def test_retries_retryable_errors_with_backoff(self):
+        responses = [httpx.Response(503), httpx.Response(502), self._ok_response()]
+        llm_service = self._llm_service(
+            lambda request: responses.pop(0),
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02)
+        )
+        
+        response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        
+        assert response["content"] == "recovered"
+        assert llm_service.get_stats()["retries"] == 2
+        assert llm_service.circuit_breaker.state == CircuitBreaker.CLOSED
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400, json={"error": "bad request"})
+        
+        llm_service = self._llm_service(handler, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01))
+        
+        with pytest.raises(LLMProviderException):
+            await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        assert len(calls) == 1
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_fails_fast_then_recovers(self):
+        responses = [httpx.Response(500), httpx.Response(500), self._ok_response()]
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+        llm_service = self._llm_service(
+            lambda request: responses.pop(0),
+            retry_policy=RetryPolicy(max_attempts=1),
+            circuit_breaker=breaker,
+            coalesce_requests=False
+        )
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        for _ in range(2):
+            with pytest.raises(LLMProviderException):
+                await llm_service.generate_response(messages)
+        
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenException):
+            await llm_service.generate_response(messages)
+        
+        await asyncio.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        response = await llm_service.generate_response(messages)
+        assert response["content"] == "recovered"
+        assert breaker.state == CircuitBreaker.CLOSED
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_deadline_bounds_upstream_call(self):
+        async def handler(request):
+            await asyncio.sleep(1)
+            return self._ok_response()
+        
+        llm_service = self._llm_service(handler, retry_policy=RetryPolicy(max_attempts=1))
+        
+        with pytest.raises(DeadlineExceededException):
+            await llm_service.generate_response(
+                [{"role": "user", "content": "Hello"}],
+                deadline=Deadline(0.05)
+            )
+        await llm_service.shutdown()
+    
+    def test_deadline_from_header_is_capped(self, monkeypatch):
+        monkeypatch.setenv("REQUEST_TIMEOUT_SECONDS", "30")
+        assert Deadline.from_header("5").timeout_seconds == 5
+        assert Deadline.from_header("500").timeout_seconds == 30
+        assert Deadline.from_header(None).timeout_seconds == 30
+        assert Deadline.from_header("abc").timeout_seconds == 30
+
+
+class TestProviderFailover:
+    
+    @staticmethod
+    def _completion(content):
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+        })
+    
+    def _stand_in_servers(self, routes):
+        async def handler(request):
+            delay, response = routes[request.url.host]
+            await asyncio.sleep(delay)
+            return response() if callable(response) else response
+        return PooledHTTPClient(transport=httpx.MockTransport(handler))
+    
+    def _llm_service(self, routes, **kwargs):
+        return LLMService(
+            provider="primary",
+            http_client=self._stand_in_servers(routes),
+            provider_configs={
+                "primary": {"base_url": "http://primary.local/v1", "api_keys": ["key-a"], "model": "primary-model"},
+                "backup": {"base_url": "http://backup.local/v1", "api_keys": ["key-b"], "model": "backup-model"}
+            },
+            fallback_providers=["backup"],
+            retry_policy=RetryPolicy(max_attempts=1),
+            coalesce_requests=False,
+            **kwargs
+        )
+    
+    def test_targets_follow_provider_order_and_keys(self):
+        llm_service = LLMService(
+            provider="groq",
+            provider_configs={"groq": {"api_keys": ["k1", "k2"]}, "openai": {"api_keys": ["k3"]}},
+            fallback_providers=["openai"]
+        )
+        
+        assert [t.name for t in llm_service.targets] == ["groq", "groq#2", "openai"]
+        assert llm_service.targets[2].url == "https://api.openai.com/v1/chat/completions"
+        assert llm_service.circuit_breaker is llm_service.targets[0].circuit_breaker
+    
+    @pytest.mark.asyncio
+    async def test_fails_over_to_next_provider(self):
+        llm_service = self._llm_service({
+            "primary.local": (0, httpx.Response(503)),
+            "backup.local": (0, lambda: self._completion("from backup"))
+        })
+        
+        response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        
+        assert response["content"] == "from backup"
+        stats = llm_service.get_stats()
+        assert stats["hedging"]["failovers"] == 1
+        assert stats["providers"]["primary"]["failures"] == 1
+        assert stats["providers"]["backup"]["requests"] == 1
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_hedges_slow_primary_and_takes_first_winner(self):
+        llm_service = self._llm_service({
+            "primary.local": (1.0, lambda: self._completion("from primary")),
+            "backup.local": (0, lambda: self._completion("from backup"))
+        }, hedging_enabled=True, hedge_initial_delay=0.05)
+        
+        started = asyncio.get_event_loop().time()
+        response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        
+        assert response["content"] == "from backup"
+        assert asyncio.get_event_loop().time() - started < 0.5
+        stats = llm_service.get_stats()
+        assert stats["hedging"]["hedges_sent"] == 1
+        assert stats["providers"]["backup"]["hedge_wins"] == 1
+        assert stats["providers"]["primary"]["circuit_breaker"] == CircuitBreaker.CLOSED
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self):
+        llm_service = self._llm_service({
+            "primary.local": (0, lambda: self._completion("from primary")),
+            "backup.local": (0, lambda: self._completion("from backup"))
+        }, hedging_enabled=True, hedge_initial_delay=0.5)
+        
+        response = await llm_service.generate_response([{"role": "user", "content": "Hello"}])
+        
+        assert response["content"] == "from primary"
+        assert llm_service.get_stats()["hedging"]["hedges_sent"] == 0
+        assert llm_service.get_stats()["providers"]["backup"]["requests"] == 0
+        await llm_service.shutdown()
+    
+    def test_hedge_delay_tracks_p95_latency(self):
+        llm_service = self._llm_service({}, hedging_enabled=True, hedge_min_delay=0.05, hedge_initial_delay=2.0)
+        primary = llm_service.targets[0]
+        
+        assert llm_service._hedge_delay(primary) == 2.0
+        for i in range(100):
+            primary.latency.record(0.1 if i < 95 else 1.5)
+        assert llm_service._hedge_delay(primary) == 1.5
+        
+        for _ in range(200):
+            primary.latency.record(0.001)
+        assert llm_service._hedge_delay(primary) == 0.05
+
+
 class TestRAGService:
     
     def test_chunk_document_basic(self):
@@ -112,6 +848,367 @@ class TestRAGService:
         assert len(results) == 0
 
 
+class TestBM25Retrieval:
+    
+    @staticmethod
+    def _database_with_documents(rag_service, contents):
+        db_manager = DatabaseManager(f"sqlite:///{tempfile.mktemp(suffix='.db')}")
+        db_manager.create_tables()
+        document_ids = []
+        with db_manager.get_session() as db:
+            user = User(username="reader")
+            db.add(user)
+            db.flush()
+            for i, content in enumerate(contents):
+                document = Document(user_id=user.id, filename=f"doc{i}.txt", content=content, file_size=len(content))
+                db.add(document)
+                db.flush()
+                rag_service.process_document(db, document)
+                document_ids.append(document.id)
+        return db_manager, document_ids
+    
+    def test_ranks_chunks_of_attached_documents_only(self):
+        rag_service = RAGService(chunk_size=60, chunk_overlap=10)
+        db_manager, (handbook, other) = self._database_with_documents(rag_service, [
+            "Vacation policy: employees get twenty days of vacation.\n\n"
+            "Expense policy: keep receipts for every expense.\n\n"
+            "Security: lock your laptop when you leave your desk.",
+            "Vacation rentals by the sea, vacation vacation vacation."
+        ])
+        
+        with db_manager.get_session() as db:
+            results = rag_service.search(db, [handbook], "how many vacation days do employees get", top_k=2)
+            assert results[0].content.startswith("Vacation policy")
+            assert all(chunk.document_id == handbook for chunk in results)
+            assert rag_service.search(db, [handbook], "submarine") == []
+            
+            context = rag_service.retrieve_context(db, [handbook, other], "expense receipts", top_k=1)
+            assert context.startswith("[Context 1]\n") and context.endswith("keep receipts for every expense.")
+            assert "[Context 2]" not in context
+            assert db.get(Document, handbook).chunk_count == 3
+        db_manager.close()
+    
+    def test_reprocessing_and_deletion_replace_postings(self):
+        rag_service = RAGService(chunk_size=500)
+        db_manager, (document_id,) = self._database_with_documents(rag_service, ["Old text about llamas"])
+        
+        with db_manager.get_session() as db:
+            document = db.get(Document, document_id)
+            document.content = "New text about alpacas"
+            rag_service.process_document(db, document)
+        
+        with db_manager.get_session() as db:
+            assert rag_service.search(db, [document_id], "llamas") == []
+            assert [c.content for c in rag_service.search(db, [document_id], "alpacas")] == ["New text about alpacas"]
+            assert db.scalar(select(func.count()).select_from(ChunkTerm)) == 4
+            db.query(ChunkTerm).filter(ChunkTerm.document_id == document_id).delete()
+            db.delete(db.get(Document, document_id))
+        
+        with db_manager.get_session() as db:
+            assert db.scalar(select(func.count()).select_from(ChunkTerm)) == 0
+        db_manager.close()
+
+
+
+class TestPrunedRetrievalEngine:
+    
+    @staticmethod
+    def _synthetic_indexes(rng, documents, chunks_per_document, vocabulary=300):
+        weights = [1 / (rank + 1) for rank in range(vocabulary)]
+        indexes = []
+        for d in range(documents):
+            chunk_terms = [
+                rng.choices(range(vocabulary), weights, k=rng.randint(20, 60)) for _ in range(chunks_per_document)
+            ]
+            postings = {}
+            for ordinal, terms in enumerate(chunk_terms):
+                for term in set(terms):
+                    postings.setdefault(term, []).append((ordinal, terms.count(term)))
+            indexes.append(DocumentPostings(
+                (chunks_per_document, sum(len(terms) for terms in chunk_terms)),
+                [f"d{d}-c{ordinal}" for ordinal in range(chunks_per_document)],
+                [len(terms) for terms in chunk_terms],
+                postings
+            ))
+        return indexes
+    
+    def test_maxscore_matches_exhaustive_scoring_and_skips_postings(self):
+        import math
+        import random
+        
+        rng = random.Random(11)
+        indexes = self._synthetic_indexes(rng, documents=20, chunks_per_document=100)
+        chunk_total = 2000
+        average_length = sum(index.signature[1] for index in indexes) / chunk_total
+        
+        for query in ([0, 1, 57], [2, 140, 9, 33], [0, 299]):
+            df = {t: sum(len(i.terms[t].ordinals) for i in indexes if t in i.terms) for t in query}
+            idf = {t: math.log(1 + (chunk_total - n + 0.5) / (n + 0.5)) for t, n in df.items() if n}
+            exhaustive = {}
+            for index in indexes:
+                for term, weight in idf.items():
+                    postings = index.terms.get(term)
+                    for ordinal, tf in zip(postings.ordinals, postings.frequencies) if postings else []:
+                        chunk_id = index.chunk_ids[ordinal]
+                        length = index.chunk_lengths[ordinal]
+                        exhaustive[chunk_id] = exhaustive.get(chunk_id, 0.0) + weight * saturation(
+                            tf, length, average_length
+                        )
+            expected = sorted(exhaustive.items(), key=lambda item: (-item[1], item[0]))[:5]
+            
+            ranked, scored = maxscore_top_k(indexes, idf, average_length, top_k=5)
+            assert [chunk_id for _, chunk_id in ranked] == [chunk_id for chunk_id, _ in expected]
+            assert all(abs(score - exhaustive[chunk_id]) < 1e-9 for score, chunk_id in ranked)
+            assert scored < sum(df.values()) / 2
+    
+    def test_matches_database_ranking_and_invalidates(self):
+        engine = PrunedRetrievalEngine()
+        pruned_rag = RAGService(chunk_size=60, chunk_overlap=10, pruned_engine=engine)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(
+            pruned_rag, TestSparseRetrievalEngine.CONTENTS
+        )
+        sql_rag = RAGService(chunk_size=60, chunk_overlap=10)
+        
+        with db_manager.get_session() as db:
+            assert pruned_rag.engine_name == "pruned"
+            for query in ("vacation days", "laptop receipts", "expense policy for laptop", "unknown words"):
+                expected = [c.id for c in sql_rag.search(db, document_ids, query, top_k=3)]
+                assert [c.id for c in pruned_rag.search(db, document_ids, query, top_k=3)] == expected
+            
+            document = db.get(Document, document_ids[0])
+            document.content = "Parental leave: sixteen weeks."
+            pruned_rag.process_document(db, document)
+            assert [c.content for c in pruned_rag.search(db, document_ids, "parental leave")] == [document.content]
+        
+        stats = engine.get_stats()
+        assert stats["queries"] == 5 and stats["invalidations"] == 1
+        assert 0 < stats["scored_postings"] <= stats["postings"]
+        db_manager.close()
+
+
+@pytest.mark.skipif(not sparse_engine_available(), reason="numpy and scipy are not installed")
+class TestSparseRetrievalEngine:
+    
+    CONTENTS = [
+        "\n\n".join([
+            "Vacation policy: employees get twenty days of vacation.",
+            "Expense policy: keep receipts for every expense.",
+            "Security: lock your laptop when you leave your desk.",
+            "Vacation carry over: up to five unused vacation days roll over."
+        ]),
+        "Laptop procurement: request a laptop through the IT portal.\n\nReceipts are scanned by finance."
+    ]
+    
+    def test_matches_database_ranking(self):
+        engine = SparseRetrievalEngine()
+        sparse_rag = RAGService(chunk_size=60, chunk_overlap=10, sparse_engine=engine)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(sparse_rag, self.CONTENTS)
+        sql_rag = RAGService(chunk_size=60, chunk_overlap=10)
+        
+        with db_manager.get_session() as db:
+            for query in ("vacation days", "laptop receipts", "expense policy for laptop", "unknown words"):
+                expected = [c.id for c in sql_rag.search(db, document_ids, query, top_k=3)]
+                assert [c.id for c in sparse_rag.search(db, document_ids, query, top_k=3)] == expected
+        
+        stats = engine.get_stats()
+        assert stats["documents"] == 2
+        assert stats["misses"] == 2
+        assert stats["hits"] == 6
+        db_manager.close()
+    
+    def test_long_queries_are_capped_like_the_database_ranking(self):
+        engine = SparseRetrievalEngine()
+        sparse_rag = RAGService(chunk_size=60, chunk_overlap=10, sparse_engine=engine)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(sparse_rag, self.CONTENTS)
+        sql_rag = RAGService(chunk_size=60, chunk_overlap=10)
+        query = " ".join(f"filler{i}" for i in range(MAX_QUERY_TERMS)) + " laptop"
+        
+        with db_manager.get_session() as db:
+            expected = [c.id for c in sql_rag.search(db, document_ids, query, top_k=3)]
+            assert [c.id for c in sparse_rag.search(db, document_ids, query, top_k=3)] == expected
+            assert engine.rank(db, document_ids, query) == []
+        db_manager.close()
+    
+    def test_reprocessing_invalidates_and_cache_is_byte_capped(self):
+        engine = SparseRetrievalEngine()
+        rag_service = RAGService(chunk_size=60, chunk_overlap=10, sparse_engine=engine)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(rag_service, self.CONTENTS)
+        
+        with db_manager.get_session() as db:
+            rag_service.search(db, document_ids, "vacation")
+            document = db.get(Document, document_ids[0])
+            document.content = "Parental leave: sixteen weeks."
+            rag_service.process_document(db, document)
+            assert engine.get_stats()["invalidations"] == 1
+            assert [c.content for c in rag_service.search(db, document_ids, "parental leave")] == [document.content]
+        
+        small = SparseRetrievalEngine(max_bytes=engine.get_stats()["resident_bytes"] - 1)
+        rag_service.sparse_engine = small
+        with db_manager.get_session() as db:
+            rag_service.search(db, document_ids, "laptop")
+            stats = small.get_stats()
+            assert stats["resident_bytes"] <= stats["max_bytes"]
+            assert stats["documents"] < 2
+        db_manager.close()
+
+
+@pytest.mark.skipif(not vector_engine_available(), reason="numpy is not installed")
+class TestVectorRetrieval:
+    
+    def test_embeddings_tolerate_word_forms_and_survive_quantization(self):
+        import numpy as np
+        
+        embedder = HashingEmbedder()
+        policy, variant, unrelated = embedder.embed([
+            "vacation days policy", "policies about vacations and day off", "lock the laptop at your desk"
+        ])
+        
+        assert np.isclose(np.linalg.norm(policy), 1.0)
+        assert policy @ variant > 0.3
+        assert policy @ variant > policy @ unrelated + 0.2
+        restored = dequantize([quantize(policy)], embedder.dimensions)[0]
+        assert len(quantize(policy)) == embedder.dimensions
+        assert restored @ policy > 0.999
+    
+    def test_ivf_recall_against_exact_search(self):
+        import numpy as np
+        
+        rng = np.random.default_rng(3)
+        centers = rng.normal(size=(20, 64))
+        vectors = (centers[rng.integers(0, 20, size=3000)] + 0.3 * rng.normal(size=(3000, 64))).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index = IVFIndex(vectors, lists=55)
+        
+        hits = 0
+        for query in vectors[rng.choice(3000, size=50, replace=False)]:
+            exact = set(np.argsort(-(vectors @ query))[:10].tolist())
+            _, found = index.search(query, 10, nprobe=8)
+            hits += len(exact & set(found))
+        assert hits / 500 >= 0.9
+    
+    def test_ingestion_stores_vectors_and_search_uses_them(self):
+        engine = VectorRetrievalEngine()
+        rag_service = RAGService(chunk_size=60, chunk_overlap=10, vector_engine=engine)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(
+            rag_service, TestSparseRetrievalEngine.CONTENTS
+        )
+        
+        with db_manager.get_session() as db:
+            embeddings = db.query(ChunkEmbedding).all()
+            assert len(embeddings) == sum(db.get(Document, d).chunk_count for d in document_ids)
+            assert {len(e.embedding) for e in embeddings} == {256}
+            
+            assert RAGService().search(db, document_ids, "vacations") == []
+            results = rag_service.search(db, document_ids, "vacations", top_k=2)
+            assert results and all("Vacation" in chunk.content for chunk in results)
+            assert rag_service.search(db, document_ids, "zzzz qqqq") == []
+            
+            db.query(ChunkEmbedding).update({"model": "retired-model"})
+            engine.invalidate(document_ids[0])
+            assert rag_service.search(db, document_ids, "vacations", top_k=2) == results
+        
+        assert engine.get_stats()["documents"] == 2
+        db_manager.close()
+
+
+
+class TestHybridRetrieval:
+    
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60, limit=3)
+        assert fused == ["a", "c", "b"]
+        assert reciprocal_rank_fusion([["b", "a"]], limit=1) == ["b"]
+        assert reciprocal_rank_fusion([]) == []
+    
+    @pytest.mark.asyncio
+    async def test_stage_missing_its_budget_is_skipped(self):
+        released = threading.Event()
+        
+        def stalled_rank(db, document_ids, query, top_k=3):
+            released.wait(5)
+            return ["c9"]
+        
+        rag_service = RAGService(session_factory=lambda consistency_key: nullcontext())
+        rag_service.stages = [
+            RetrievalStage("fast", lambda db, document_ids, query, top_k=3: ["c2", "c1", "c3"][:top_k]),
+            RetrievalStage("stalled", stalled_rank, budget=0.05)
+        ]
+        
+        started_at = time.monotonic()
+        assert await rag_service._rank_concurrently(["d1"], "query", top_k=2) == ["c2", "c1"]
+        assert time.monotonic() - started_at < 1
+        stats = rag_service.get_stats()["stages"]
+        assert stats["stalled"]["skipped"] == 1 and stats["stalled"]["latency_p50"] is None
+        assert stats["fast"]["skipped"] == 0 and stats["fast"]["mean_candidates"] == 3.0
+        
+        released.set()
+        await asyncio.gather(*rag_service._abandoned_stages)
+        assert rag_service.get_stats()["stages"]["stalled"]["latency_p50"] > 0.04
+    
+    @pytest.mark.asyncio
+    async def test_last_stage_over_budget_falls_back_to_its_late_result(self):
+        def slow_rank(db, document_ids, query, top_k=3):
+            time.sleep(0.1)
+            return ["c1"]
+        
+        rag_service = RAGService(session_factory=lambda consistency_key: nullcontext())
+        rag_service.stages = [RetrievalStage("lexical", slow_rank, budget=0.02)]
+        
+        assert await rag_service._rank_concurrently(["d1"], "query") == ["c1"]
+        stats = rag_service.get_stats()
+        assert stats["stages"]["lexical"]["skipped"] == 0
+        assert stats["stages"]["lexical"]["late_results"] == 1
+        assert stats["unranked_queries"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_query_without_any_ranking_is_counted(self):
+        def broken_rank(db, document_ids, query, top_k=3):
+            raise RuntimeError("index unavailable")
+        
+        rag_service = RAGService(session_factory=lambda consistency_key: nullcontext())
+        rag_service.stages = [RetrievalStage("lexical", broken_rank), RetrievalStage("vector", broken_rank)]
+        
+        assert await rag_service._rank_concurrently(["d1"], "query") == []
+        assert rag_service.get_stats()["unranked_queries"] == 1
+    
+    def test_failing_stage_is_left_out_of_fusion(self):
+        def broken_rank(db, document_ids, query, top_k=3):
+            raise RuntimeError("index unavailable")
+        
+        rag_service = RAGService()
+        rag_service.stages = [
+            RetrievalStage("lexical", lambda db, document_ids, query, top_k=3: ["c1"]),
+            RetrievalStage("broken", broken_rank)
+        ]
+        rag_service._load_chunks = lambda db, chunk_ids: chunk_ids
+        
+        assert rag_service.search(None, ["d1"], "query") == ["c1"]
+        assert rag_service.get_stats()["stages"]["broken"]["failures"] == 1
+    
+    @pytest.mark.skipif(not vector_engine_available(), reason="numpy is not installed")
+    def test_hybrid_search_fuses_lexical_and_vector_rankings(self):
+        rag_service = RAGService(chunk_size=60, chunk_overlap=10, vector_engine=VectorRetrievalEngine(), hybrid=True)
+        db_manager, document_ids = TestBM25Retrieval._database_with_documents(
+            rag_service, TestSparseRetrievalEngine.CONTENTS
+        )
+        
+        with db_manager.get_session() as db:
+            assert rag_service.engine_name == "hybrid"
+            lexical = rag_service._bm25_rank(db, document_ids, "vacations", top_k=5)
+            vector = rag_service.vector_engine.rank(db, document_ids, "vacations", top_k=5)
+            assert lexical == [] and vector
+            
+            results = rag_service.search(db, document_ids, "vacations", top_k=2)
+            assert [chunk.id for chunk in results] == vector[:2]
+            assert rag_service.search(db, document_ids, "expense receipts", top_k=1)[0].content.endswith(
+                "keep receipts for every expense."
+            )
+        
+        stats = rag_service.get_stats()["stages"]
+        assert stats["lexical"]["runs"] == 2 and stats["vector"]["runs"] == 2
+        db_manager.close()
+
+
 class TestConversationService:
     
     def test_generate_title(self):
@@ -128,29 +1225,874 @@ class TestConversationService:
         assert title.endswith("...")
     
     @pytest.mark.asyncio
-    async def test_create_conversation_basic(self):
+    async def test_create_conversation_basic(self, async_database):
         llm_service = LLMService(provider="mock")
         rag_service = RAGService()
-        service = ConversationService(llm_service, rag_service)
-        
-        db = Mock(spec=Session)
-        
-        mock_user = Mock(spec=User)
-        mock_user.id = "user-123"
-        db.query.return_value.filter.return_value.first.return_value = mock_user
+        db_manager = async_database
+        async with db_manager.get_session() as db:
+            user = User(username="basic-user")
+            db.add(user)
         
+        service = ConversationService(llm_service, rag_service, db_manager=db_manager)
         request = CreateConversationRequest(
-            user_id="user-123",
+            user_id=user.id,
             first_message="Hello, how are you?",
             mode="open_chat"
         )
         
-        db.add = Mock()
-        db.flush = Mock()
-        db.commit = Mock()
+        response = await service.create_conversation(request)
+        
+        assert response.message.sequence_number == 2
+        assert response.message.role == MessageRole.ASSISTANT
+        assert response.total_tokens > 0
+        detail = await service.get_conversation_detail(response.conversation_id)
+        assert [m.content for m in detail.messages][0] == "Hello, how are you?"
+        
+        with pytest.raises(ValueError):
+            await service.create_conversation(CreateConversationRequest(
+                user_id="missing-user",
+                first_message="Hello",
+                mode="open_chat"
+            ))
+
+
+async def _async_database(**kwargs):
+    db_manager = AsyncDatabaseManager(f"sqlite:///{tempfile.mktemp(suffix='.db')}", **kwargs)
+    await db_manager.create_tables()
+    return db_manager
+
+
+async def _conversation_database(**kwargs):
+    db_manager = await _async_database(**kwargs)
+    async with db_manager.get_session() as db:
+        user = User(username="turn-user")
+        db.add(user)
+        await db.flush()
+        conversation = Conversation(
+            user_id=user.id,
+            title="Turns",
+            mode=ConversationMode.OPEN_CHAT,
+            total_tokens=2,
+            message_count=2,
+            last_sequence_number=2,
+            sequence_counter=2,
+            last_message_preview="Hello"
+        )
+        db.add(conversation)
+        await db.flush()
+        db.add(Message(conversation_id=conversation.id, role=MessageRole.USER, content="Hi", tokens=1, sequence_number=1))
+        db.add(Message(conversation_id=conversation.id, role=MessageRole.ASSISTANT, content="Hello", tokens=1, sequence_number=2))
+        conversation_id = conversation.id
+    return db_manager, conversation_id
+
+
+@pytest.fixture
+async def async_database():
+    db_manager = await _async_database()
+    yield db_manager
+    await db_manager.dispose()
+
+
+@pytest.fixture
+async def conversation_database():
+    db_manager, conversation_id = await _conversation_database()
+    yield db_manager, conversation_id
+    await db_manager.dispose()
+
+
+async def _stored_messages(db_manager, conversation_id):
+    async with db_manager.get_session() as db:
+        messages = await db.scalars(
+            select(Message).where(Message.conversation_id == conversation_id).order_by(Message.sequence_number)
+        )
+        return [(m.sequence_number, m.role, m.content) for m in messages]
+
+
+async def _conversation_tokens(db_manager, conversation_id):
+    async with db_manager.get_session() as db:
+        return await db.scalar(select(Conversation.total_tokens).where(Conversation.id == conversation_id))
+
+
+def _slow_groq_service(handler):
+    return LLMService(
+        provider="groq",
+        api_key="test-key",
+        http_client=PooledHTTPClient(transport=httpx.MockTransport(handler)),
+        coalesce_requests=False
+    )
+
+
+class TestAsyncDatabase:
+    
+    def test_async_url_uses_async_drivers(self):
+        assert to_async_url("sqlite:///./data/botgpt.db") == "sqlite+aiosqlite:///./data/botgpt.db"
+        assert to_async_url("postgresql://bot:secret@db/botgpt") == "postgresql+asyncpg://bot:secret@db/botgpt"
+        assert to_async_url("postgresql+asyncpg://db/botgpt") == "postgresql+asyncpg://db/botgpt"
+    
+    @pytest.mark.asyncio
+    async def test_session_rolls_back_on_error(self):
+        db_manager = await _async_database()
+        
+        with pytest.raises(RuntimeError):
+            async with db_manager.get_session() as db:
+                db.add(User(username="rolled-back"))
+                await db.flush()
+                raise RuntimeError("boom")
+        
+        async with db_manager.get_session() as db:
+            assert await db.scalar(select(func.count(User.id))) == 0
+        await db_manager.dispose()
+
+
+class TestSQLiteProductionProfile:
+    
+    @staticmethod
+    def _database():
+        db_manager = DatabaseManager(
+            f"sqlite:///{tempfile.mktemp(suffix='.db')}",
+            sqlite_profile="production",
+            read_pool_size=4
+        )
+        db_manager.create_tables()
+        return db_manager
+    
+    def test_pragmas_and_read_only_readers(self):
+        db_manager = self._database()
+        
+        with db_manager.get_read_session() as db:
+            assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert db.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert db.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            with pytest.raises(Exception):
+                db.execute(text("INSERT INTO users (id, username) VALUES ('x', 'reader')"))
+        db_manager.close()
+    
+    def test_concurrent_writes_are_group_committed(self):
+        db_manager = self._database()
+        started, release = threading.Event(), threading.Event()
+        
+        def blocking_write(db):
+            started.set()
+            release.wait(timeout=5)
+            db.add(User(username="first"))
+        
+        first = db_manager.writer.submit(blocking_write)
+        started.wait(timeout=5)
+        futures = [
+            db_manager.writer.submit(lambda db, i=i: db.add(User(username=f"user-{i}")))
+            for i in range(20)
+        ]
+        release.set()
+        first.result(timeout=5)
+        for future in futures:
+            future.result(timeout=5)
+        
+        stats = db_manager.get_stats()["writer"]
+        assert stats["jobs"] == 21
+        assert stats["batches"] == 2
+        assert stats["max_batch"] == 20
+        with db_manager.get_read_session() as db:
+            assert db.query(User).count() == 21
+        db_manager.close()
+    
+    def test_failed_write_does_not_abort_batch(self):
+        db_manager = self._database()
+        started, release = threading.Event(), threading.Event()
+        db_manager.writer.submit(lambda db: started.set() or release.wait(timeout=5))
+        started.wait(timeout=5)
+        
+        def failing_write(db):
+            db.add(User(username="doomed"))
+            db.flush()
+            raise ValueError("bad write")
+        
+        ok = db_manager.writer.submit(lambda db: db.add(User(username="kept")))
+        failed = db_manager.writer.submit(failing_write)
+        release.set()
+        
+        ok.result(timeout=5)
+        with pytest.raises(ValueError):
+            failed.result(timeout=5)
+        with db_manager.get_read_session() as db:
+            assert [u.username for u in db.query(User)] == ["kept"]
+        assert db_manager.get_stats()["writer"]["failed_jobs"] == 1
+        db_manager.close()
+    
+    @pytest.mark.asyncio
+    async def test_async_turns_use_single_writer_and_read_only_readers(self):
+        db_manager, conversation_id = await _conversation_database(
+            sqlite_profile="production", read_pool_size=2, consistency_guard=ReadYourWritesGuard()
+        )
+        
+        async with db_manager.get_read_session() as db:
+            assert (await db.execute(text("PRAGMA query_only"))).scalar() == 1
+            assert (await db.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert db_manager.engine.pool.size() == 1
+        
+        service = ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager)
+        replica_reads = db_manager.get_stats()["routing"]["replica_reads"]
+        await service.get_conversation_detail(conversation_id)
+        assert db_manager.get_stats()["routing"]["replica_reads"] > replica_reads
+        
+        await asyncio.gather(*[
+            service.add_message(conversation_id, AddMessageRequest(content=f"q{i}")) for i in range(4)
+        ])
+        assert [seq for seq, _, _ in await _stored_messages(db_manager, conversation_id)] == list(range(1, 11))
+        await db_manager.dispose()
+
+
+class TestReadReplicaRouting:
+    
+    @staticmethod
+    def _engine(path):
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        User.metadata.create_all(bind=engine)
+        return engine
+    
+    def test_reads_go_to_replicas_and_writes_stick_to_primary(self):
+        primary = self._engine(tempfile.mktemp(suffix=".db"))
+        replicas = [self._engine(tempfile.mktemp(suffix=".db")) for _ in range(2)]
+        replica_set = ReplicaSet(primary, replicas)
+        RoutingSessionLocal = sessionmaker(class_=RoutingSession, replica_set=replica_set, autoflush=False)
+        
+        with RoutingSessionLocal() as db:
+            db.add(User(username="written"))
+            db.commit()
+        
+        for _ in range(2):
+            with RoutingSessionLocal() as db:
+                assert db.query(User).count() == 0
+        
+        with RoutingSessionLocal() as db:
+            db.add(User(username="sticky"))
+            db.flush()
+            assert db.query(User).filter(User.username == "sticky").count() == 1
+            db.rollback()
+        
+        stats = replica_set.get_stats()
+        assert [replica["reads"] for replica in stats["replicas"]] == [1, 1]
+        assert stats["primary_statements"] >= 3
+    
+    def test_read_your_writes_window(self):
+        guard = ReadYourWritesGuard(window_seconds=0.05, max_keys=2)
+        guard.mark_written("conversation-1")
+        
+        assert guard.requires_primary("conversation-1")
+        assert not guard.requires_primary("conversation-2")
+        assert not guard.requires_primary(None)
+        
+        time.sleep(0.06)
+        assert not guard.requires_primary("conversation-1")
+        assert guard.requires_primary("conversation-1", replica_lag=10.0)
+        
+        guard.mark_written("conversation-2")
+        guard.mark_written("conversation-3")
+        assert not guard.requires_primary("conversation-1", replica_lag=10.0)
+    
+    def test_recent_writer_reads_from_primary(self):
+        db_manager = DatabaseManager(
+            f"sqlite:///{tempfile.mktemp(suffix='.db')}",
+            sqlite_profile="production",
+            consistency_guard=ReadYourWritesGuard()
+        )
+        db_manager.create_tables()
+        
+        with db_manager.get_read_session("user:1") as db:
+            assert db.query(User).count() == 0
+        db_manager.mark_written("user:1")
+        with db_manager.get_read_session("user:1") as db:
+            assert db.query(User).count() == 0
+        
+        routing = db_manager.get_stats()["routing"]
+        assert routing["replica_reads"] == 1
+        assert routing["pinned_sessions"] == 1
+        assert routing["primary_statements"] == 1
+        db_manager.close()
+    
+    @pytest.mark.asyncio
+    async def test_conversation_reads_are_pinned_after_a_turn(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        db_manager.consistency_guard = ReadYourWritesGuard()
+        service = ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager)
+        
+        await service.get_conversation_detail(conversation_id)
+        assert db_manager.get_stats()["routing"]["pinned_sessions"] == 0
+        
+        await service.add_message(conversation_id, AddMessageRequest(content="Question"))
+        detail = await service.get_conversation_detail(conversation_id)
+        
+        assert len(detail.messages) == 4
+        assert db_manager.get_stats()["routing"]["pinned_sessions"] == 1
+
+
+class TestKeysetPagination:
+    
+    def test_cursor_round_trip_and_rejects_garbage(self):
+        cursor = encode_cursor(datetime(2024, 5, 1, 12, 30), "conversation-1")
+        
+        assert decode_cursor(cursor) == (datetime(2024, 5, 1, 12, 30), "conversation-1")
+        with pytest.raises(InvalidCursorException):
+            decode_cursor("not-a-cursor")
+    
+    @pytest.mark.asyncio
+    async def test_conversation_pages_walk_ties_without_gaps(self, async_database):
+        db_manager = async_database
+        async with db_manager.get_session() as db:
+            user = User(username="pager")
+            db.add(user)
+            await db.flush()
+            for i in range(5):
+                db.add(Conversation(user_id=user.id, title=f"c{i}", mode=ConversationMode.OPEN_CHAT))
+            user_id = user.id
+        service = ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager)
+        
+        seen, cursor = [], None
+        while True:
+            page = await service.get_conversations(user_id, page_size=2, cursor=cursor)
+            seen.extend(item.id for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+        assert (await service.get_conversations(user_id, include_total=True))["total"] == 5
+
+
+class TestConversationCounters:
+    
+    @pytest.mark.asyncio
+    async def test_turns_maintain_counters_and_list_skips_messages(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        service = ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager)
+        response = await service.add_message(conversation_id, AddMessageRequest(content="Question"))
+        
+        statements = []
+        event.listen(
+            db_manager.engine.sync_engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+        async with db_manager.get_session() as db:
+            user_id = await db.scalar(select(Conversation.user_id).where(Conversation.id == conversation_id))
+        page = await service.get_conversations(user_id)
+        
+        summary = page["items"][0]
+        assert summary.message_count == 4
+        assert summary.last_message == response.message.content[:100]
+        assert not any("FROM messages" in statement for statement in statements)
+        async with db_manager.get_session() as db:
+            assert await db.scalar(
+                select(Conversation.last_sequence_number).where(Conversation.id == conversation_id)
+            ) == 4
+    
+    def test_backfill_migration_adds_and_fills_counters(self):
+        path = tempfile.mktemp(suffix=".db")
+        legacy = create_engine(f"sqlite:///{path}")
+        User.metadata.create_all(bind=legacy)
+        with legacy.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX ix_conversations_user_updated_id")
+            conn.exec_driver_sql("DROP INDEX ux_messages_conversation_sequence")
+            for column in ("message_count", "last_sequence_number", "last_message_preview", "sequence_counter"):
+                conn.exec_driver_sql(f"ALTER TABLE conversations DROP COLUMN {column}")
+            for column in ("chunk_count", "term_count"):
+                conn.exec_driver_sql(f"ALTER TABLE documents DROP COLUMN {column}")
+            conn.exec_driver_sql("DROP TABLE chunk_terms")
+            conn.exec_driver_sql("INSERT INTO users (id, username, created_at, updated_at) VALUES ('u1', 'legacy', '2024-01-01', '2024-01-01')")
+            conn.exec_driver_sql(
+                "INSERT INTO conversations (id, user_id, mode, is_active, total_tokens, created_at, updated_at) "
+                "VALUES ('c1', 'u1', 'OPEN_CHAT', 1, 0, '2024-01-01', '2024-01-02')"
+            )
+            for sequence, content in ((1, "first"), (2, "second"), (2, "racing"), (3, "x" * 150)):
+                conn.exec_driver_sql(
+                    "INSERT INTO messages (id, conversation_id, role, content, tokens, sequence_number, created_at) "
+                    f"VALUES ('m-{content}', 'c1', 'USER', '{content}', 1, {sequence}, '2024-01-01')"
+                )
+            conn.exec_driver_sql(
+                "INSERT INTO documents (id, user_id, filename, content, file_size, created_at) "
+                "VALUES ('d1', 'u1', 'zoo.txt', 'Giraffes eat leaves', 19, '2024-01-01')"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO document_chunks (id, document_id, content, chunk_index, start_char, end_char) "
+                "VALUES ('k1', 'd1', 'Giraffes eat leaves', 0, 0, 19)"
+            )
+        legacy.dispose()
+        
+        db_manager = DatabaseManager(f"sqlite:///{path}")
+        db_manager.create_tables()
+        db_manager.create_tables()
+        
+        with db_manager.get_session() as db:
+            conversation = db.query(Conversation).one()
+            assert conversation.message_count == 4
+            assert conversation.last_sequence_number == 4
+            assert conversation.sequence_counter == 4
+            assert db.scalars(select(Message.sequence_number).order_by(Message.sequence_number)).all() == [1, 2, 3, 4]
+            assert conversation.last_message_preview == "x" * 100
+            assert str(conversation.updated_at).startswith("2024-01-02")
+            assert db.execute(text("SELECT version FROM schema_migrations")).scalars().all() == [
+                "0001_conversation_counters", "0002_keyset_indexes", "0003_sequence_allocator", "0004_message_terms",
+                "0005_chunk_terms"
+            ]
+            assert db.scalar(select(func.count()).select_from(MessageTerm)) == 4
+            document = db.get(Document, "d1")
+            assert (document.chunk_count, document.term_count) == (1, 3)
+            assert [chunk.id for chunk in RAGService().search(db, ["d1"], "what do giraffes eat")] == ["k1"]
+        db_manager.close()
+
+
+class TestHistoryCache:
+    
+    @staticmethod
+    def _message(content, tokens=1):
+        return {"role": "user", "content": content, "tokens": tokens}
+    
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = HistoryCache(max_bytes=3 * message_size(self._message("x" * 100)))
+        for name in ("a", "b", "c"):
+            cache.put(name, 1, [self._message("x" * 100)])
+        cache.get("a", 1)
+        cache.put("d", 1, [self._message("x" * 100)])
+        
+        assert cache.get("b", 1) is None
+        assert cache.get("a", 1) is not None
+        assert cache.get("a", 2) is None
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["entries"] == 3
+        assert stats["resident_bytes"] <= stats["max_bytes"]
+        assert stats["hit_rate"] == 0.5
+    
+    def test_append_checks_version_and_trims_to_budget(self):
+        cache = HistoryCache()
+        cache.put("c", 2, [self._message("one", 5), self._message("two", 5)])
+        
+        cache.append("c", expected_version=2, message=self._message("three", 5), version=3, token_budget=10)
+        assert [m["content"] for m in cache.get("c", 3)] == ["two", "three"]
+        
+        cache.append("c", expected_version=7, message=self._message("late"), version=8, token_budget=10)
+        assert len(cache) == 0
+    
+    @pytest.mark.asyncio
+    async def test_active_conversation_skips_history_reads(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        cache = HistoryCache()
+        service = ConversationService(
+            LLMService(provider="mock"), RAGService(), db_manager=db_manager, history_cache=cache
+        )
+        
+        with patch.object(service, "_load_history_tail", wraps=service._load_history_tail) as loader:
+            for i in range(3):
+                await service.add_message(conversation_id, AddMessageRequest(content=f"q{i}"))
+        
+        assert loader.call_count == 1
+        assert cache.get_stats()["hits"] == 2
+        async with db_manager.get_session() as db:
+            from_db = await service._load_history_tail(db, conversation_id, 8, 10**6)
+        assert cache.get(conversation_id, 8) == [service._prompt_message(m) for m in from_db]
+        
+        await service.delete_conversation(conversation_id)
+        assert len(cache) == 0
+    
+    @pytest.mark.asyncio
+    async def test_overlapping_turns_never_cache_a_gap(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        cache = HistoryCache()
+        
+        async def handler(request):
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+        
+        service = ConversationService(
+            _slow_groq_service(handler),
+            RAGService(),
+            db_manager=db_manager,
+            history_cache=cache
+        )
+        
+        await asyncio.gather(*[service.add_message(conversation_id, AddMessageRequest(content=f"q{i}")) for i in range(3)])
+        await service.add_message(conversation_id, AddMessageRequest(content="after"))
+        
+        async with db_manager.get_session() as db:
+            from_db = await service._load_history_tail(db, conversation_id, 10, 10**6)
+        assert cache.get(conversation_id, 10) == [service._prompt_message(m) for m in from_db]
+
+
+class TestSummaryMemory:
+    
+    def test_split_keeps_recent_window_verbatim(self):
+        memory = SummaryMemory(LLMService(provider="mock"), trigger_tokens=10, recent_tokens=10)
+        messages = [{"role": "user", "content": f"m{i}", "tokens": 4, "sequence_number": i} for i in range(1, 7)]
+        
+        folded, recent = memory.split_for_folding(messages)
+        
+        assert [m["sequence_number"] for m in folded] == [1, 2, 3, 4]
+        assert [m["sequence_number"] for m in recent] == [5, 6]
+        assert not memory.should_refresh(20)
+        assert memory.should_refresh(21)
+    
+    @pytest.mark.asyncio
+    async def test_prompt_is_rolling_summary_plus_recent_window(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        summary_prompts = []
+        chat_prompts = []
+        
+        async def handler(request):
+            messages = json.loads(request.content)["messages"]
+            if messages[0]["content"] == SUMMARY_INSTRUCTIONS:
+                summary_prompts.append(messages[-1]["content"])
+                content = f"summary {len(summary_prompts)}"
+            else:
+                chat_prompts.append(messages)
+                content = "reply " * 8
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+        
+        llm_service = _slow_groq_service(handler)
+        memory = SummaryMemory(llm_service, trigger_tokens=30, recent_tokens=30, max_summary_tokens=50)
+        service = ConversationService(
+            llm_service, RAGService(), db_manager=db_manager, history_cache=HistoryCache(), memory=memory
+        )
+        
+        for i in range(12):
+            await service.add_message(conversation_id, AddMessageRequest(content=f"question {i} " + "word " * 8))
+            await service.wait_for_summaries()
+        
+        assert len(summary_prompts) >= 2
+        assert "Existing summary:\n(none yet)" in summary_prompts[0]
+        assert "Existing summary:\nsummary 1" in summary_prompts[1]
+        assert "question 0" in summary_prompts[0]
+        assert "question 0" not in summary_prompts[1]
+        
+        async with db_manager.get_session() as db:
+            stored = await db.get(ConversationMemory, conversation_id)
+            assert stored.summary == f"summary {len(summary_prompts)}"
+            assert stored.summarized_tokens == await db.scalar(
+                select(func.sum(Message.tokens)).where(
+                    Message.conversation_id == conversation_id,
+                    Message.sequence_number <= stored.summarized_through
+                )
+            )
+            summarized_through = stored.summarized_through
+        
+        await service.add_message(conversation_id, AddMessageRequest(content="final question"))
+        prompt = chat_prompts[-1]
+        assert prompt[1] == {"role": "system", "content": f"Summary of the earlier conversation:\nsummary {len(summary_prompts)}"}
+        assert prompt[-1] == {"role": "user", "content": "final question"}
+        recent = [m["content"] for m in prompt[2:]]
+        stored_messages = await _stored_messages(db_manager, conversation_id)
+        assert recent == [c for seq, _, c in stored_messages if summarized_through < seq <= len(stored_messages) - 1]
+        assert sum(llm_service.estimate_tokens(c) for c in recent[:-1]) <= 30 + 30 + 30
+        
+        await service.delete_conversation(conversation_id)
+        async with db_manager.get_session() as db:
+            assert await db.get(ConversationMemory, conversation_id) is None
+
+
+class TestMessageRecall:
+    
+    @staticmethod
+    def _recording_service(db_manager, prompts, history_tokens):
+        async def handler(request):
+            prompts.append(json.loads(request.content)["messages"])
+            return httpx.Response(200, json={"choices": [{"message": {"content": "noted"}}]})
+        
+        llm_service = LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=PooledHTTPClient(transport=httpx.MockTransport(handler)),
+            coalesce_requests=False,
+            max_tokens=1000 + history_tokens
+        )
+        return ConversationService(
+            llm_service, RAGService(), db_manager=db_manager, message_index=MessageIndex(max_turns=1, recall_tokens=40)
+        )
+    
+    @pytest.mark.asyncio
+    async def test_relevant_older_turn_joins_recent_window(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        prompts = []
+        service = self._recording_service(db_manager, prompts, history_tokens=80)
+        
+        await service.add_message(conversation_id, AddMessageRequest(content="My giraffe is called Jasper"))
+        for i in range(15):
+            await service.add_message(conversation_id, AddMessageRequest(content=f"unrelated filler number {i}"))
+        await service.add_message(conversation_id, AddMessageRequest(content="Remind me of my giraffe name"))
+        
+        contents = [m["content"] for m in prompts[-1][1:]]
+        assert contents[:2] == ["My giraffe is called Jasper", "noted"]
+        assert "unrelated filler number 0" not in contents
+        assert contents[-3:] == ["unrelated filler number 14", "noted", "Remind me of my giraffe name"]
+        assert sum(service.llm_service.estimate_tokens(c) for c in contents) <= 80
+        assert service.message_index.get_stats()["recalled_turns"] >= 1
+    
+    @pytest.mark.asyncio
+    async def test_discarded_turn_leaves_no_postings(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        prompts = []
+        service = self._recording_service(db_manager, prompts, history_tokens=80)
+        await service.add_message(conversation_id, AddMessageRequest(content="kept words"))
+        
+        async def cancelled(*args, **kwargs):
+            raise asyncio.CancelledError()
+        
+        with patch.object(service.llm_service, "generate_response", cancelled):
+            with pytest.raises(asyncio.CancelledError):
+                await service.add_message(conversation_id, AddMessageRequest(content="dropped words"))
+        
+        async with db_manager.get_session() as db:
+            sequences = (await db.scalars(
+                select(MessageTerm.sequence_number).where(MessageTerm.conversation_id == conversation_id).distinct()
+            )).all()
+        assert sorted(sequences) == [3, 4]
+        
+        await service.delete_conversation(conversation_id)
+        async with db_manager.get_session() as db:
+            assert await db.scalar(select(func.count()).select_from(MessageTerm)) == 0
+
+
+class TestConversationPhases:
+    
+    @pytest.mark.asyncio
+    async def test_session_is_released_during_llm_call(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        open_sessions = []
+        observed = []
+        get_session = db_manager.get_session
+        
+        @asynccontextmanager
+        async def tracked_session():
+            open_sessions.append(1)
+            try:
+                async with get_session() as db:
+                    yield db
+            finally:
+                open_sessions.pop()
+        
+        db_manager.get_session = tracked_session
+        
+        async def handler(request):
+            observed.append(len(open_sessions))
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "phased reply"}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+            })
+        
+        service = ConversationService(_slow_groq_service(handler), RAGService(), db_manager=db_manager)
+        response = await service.add_message(conversation_id, AddMessageRequest(content="Question"))
         
+        assert observed == [0]
+        assert response.message.content == "phased reply"
+        assert response.message.sequence_number == 4
+        assert response.total_tokens == 2 + service.llm_service.estimate_tokens("Question") + 2
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_turns_reserve_distinct_sequences(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        
+        async def handler(request):
+            await asyncio.sleep(0.02)
+            content = json.loads(request.content)["messages"][-1]["content"]
+            return httpx.Response(200, json={"choices": [{"message": {"content": f"re: {content}"}}]})
+        
+        service = ConversationService(_slow_groq_service(handler), RAGService(), db_manager=db_manager)
+        await asyncio.gather(*[
+            service.add_message(conversation_id, AddMessageRequest(content=f"q{i}")) for i in range(3)
+        ])
+        
+        stored = (await _stored_messages(db_manager, conversation_id))
+        assert [seq for seq, _, _ in stored] == list(range(1, 9))
+        for seq, role, content in stored[2:]:
+            if role == MessageRole.ASSISTANT:
+                question = next(c for s, r, c in stored if s == seq - 1)
+                assert content == f"re: {question}"
+    
+    @pytest.mark.asyncio
+    async def test_detail_orders_concurrent_turns_by_sequence(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        
+        async def handler(request):
+            content = json.loads(request.content)["messages"][-1]["content"]
+            await asyncio.sleep(0.2 if content == "slow" else 0.01)
+            return httpx.Response(200, json={"choices": [{"message": {"content": f"re: {content}"}}]})
+        
+        service = ConversationService(_slow_groq_service(handler), RAGService(), db_manager=db_manager)
+        slow = asyncio.ensure_future(service.add_message(conversation_id, AddMessageRequest(content="slow")))
+        await asyncio.sleep(0.05)
+        await service.add_message(conversation_id, AddMessageRequest(content="fast"))
+        await slow
+        
+        detail = await service.get_conversation_detail(conversation_id)
+        assert [m.sequence_number for m in detail.messages] == list(range(1, 7))
+    
+    @pytest.mark.asyncio
+    async def test_history_tail_stops_at_the_token_budget(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        async with db_manager.get_session() as db:
+            for sequence in range(3, 123):
+                db.add(Message(
+                    conversation_id=conversation_id, role=MessageRole.USER, content=f"m{sequence}",
+                    tokens=10, sequence_number=sequence
+                ))
+        service = ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager)
+        
+        async with db_manager.get_session() as db:
+            tail = await service._load_history_tail(db, conversation_id, up_to_sequence=120, token_budget=705)
+            everything = await service._load_history_tail(db, conversation_id, up_to_sequence=122, token_budget=10**6)
+        
+        assert [m.sequence_number for m in tail] == list(range(51, 121))
+        assert [m.sequence_number for m in everything] == list(range(1, 123))
+    
+    @pytest.mark.asyncio
+    async def test_separate_workers_allocate_from_the_database_counter(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        workers = [
+            ConversationService(LLMService(provider="mock"), RAGService(), db_manager=db_manager) for _ in range(2)
+        ]
+        
+        responses = await asyncio.gather(*[
+            worker.add_message(conversation_id, AddMessageRequest(content=f"q{i}")) for i, worker in enumerate(workers)
+        ])
+        
+        assert sorted(r.message.sequence_number for r in responses) == [4, 6]
+        assert [seq for seq, _, _ in await _stored_messages(db_manager, conversation_id)] == list(range(1, 7))
         with pytest.raises(Exception):
-            await service.create_conversation(db, request)
+            async with db_manager.get_session() as db:
+                db.add(Message(conversation_id=conversation_id, role=MessageRole.USER, content="dup", sequence_number=3))
+    
+    @pytest.mark.asyncio
+    async def test_deadline_compensates_user_message(self, conversation_database):
+        db_manager, conversation_id = conversation_database
+        
+        async def handler(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "too late"}}]})
+        
+        service = ConversationService(_slow_groq_service(handler), RAGService(), db_manager=db_manager)
+        with pytest.raises(DeadlineExceededException):
+            await service.add_message(conversation_id, AddMessageRequest(content="Question"), deadline=Deadline(0.05))
+        
+        assert len((await _stored_messages(db_manager, conversation_id))) == 2
+        assert await _conversation_tokens(db_manager, conversation_id) == 2
+
+
+class TestDisconnectHandling:
+    
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_generation_and_discards_turn(self, conversation_database):
+        calls = []
+        
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(5)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "too late"}}]})
+        
+        llm_service = LLMService(
+            provider="groq",
+            api_key="test-key",
+            http_client=PooledHTTPClient(transport=httpx.MockTransport(handler))
+        )
+        db_manager, conversation_id = conversation_database
+        service = ConversationService(llm_service, RAGService(), db_manager=db_manager)
+        http_request = Mock()
+        http_request.is_disconnected = AsyncMock(return_value=True)
+        
+        started = asyncio.get_event_loop().time()
+        with pytest.raises(ClientDisconnectedException):
+            await cancel_on_disconnect(
+                http_request,
+                service.add_message(conversation_id, AddMessageRequest(content="Long question")),
+                poll_interval=0.02
+            )
+        
+        assert asyncio.get_event_loop().time() - started < 1
+        assert len(calls) == 1
+        await asyncio.sleep(0.01)
+        assert llm_service.get_stats()["single_flight"]["in_flight"] == 0
+        assert llm_service.get_stats()["http_pool"]["in_flight"] == 0
+        assert len((await _stored_messages(db_manager, conversation_id))) == 2
+        await llm_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_stream_disconnect_persists_partial_content(self, conversation_database):
+        llm_service = LLMService(provider="mock", mock_stream_delay=0.01)
+        db_manager, conversation_id = conversation_database
+        service = ConversationService(
+            llm_service,
+            RAGService(),
+            disconnect_policy=DISCONNECT_PERSIST_PARTIAL,
+            db_manager=db_manager
+        )
+        
+        streamed = []
+        events = service.stream_message(conversation_id, AddMessageRequest(content="Tell me a story"))
+        async for event in events:
+            if event["event"] == "delta":
+                streamed.append(event["data"]["content"])
+                if len(streamed) == 3:
+                    break
+        await events.aclose()
+        await asyncio.sleep(0.01)
+        
+        stored = (await _stored_messages(db_manager, conversation_id))
+        assert stored[2] == (3, MessageRole.USER, "Tell me a story")
+        assert stored[3] == (4, MessageRole.ASSISTANT, "".join(streamed))
+    
+    @pytest.mark.asyncio
+    async def test_stream_cancellation_discards_turn(self, conversation_database):
+        llm_service = LLMService(provider="mock", mock_stream_delay=0.05)
+        db_manager, conversation_id = conversation_database
+        service = ConversationService(llm_service, RAGService(), db_manager=db_manager)
+        
+        async def consume():
+            async for _ in service.stream_message(conversation_id, AddMessageRequest(content="Tell me a story")):
+                pass
+        
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.12)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.01)
+        
+        assert len((await _stored_messages(db_manager, conversation_id))) == 2
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("policy", [DISCONNECT_DISCARD, DISCONNECT_PERSIST_PARTIAL])
+    async def test_task_group_cancellation_still_compensates(self, conversation_database, policy):
+        llm_service = LLMService(provider="mock", mock_stream_delay=0.05)
+        db_manager, conversation_id = conversation_database
+        service = ConversationService(llm_service, RAGService(), disconnect_policy=policy, db_manager=db_manager)
+        
+        streamed = []
+        events = service.stream_message(conversation_id, AddMessageRequest(content="Tell me a story"))
+        
+        async def send_body():
+            try:
+                async for event in events:
+                    if event["event"] == "delta":
+                        streamed.append(event["data"]["content"])
+            finally:
+                await events.aclose()
+        
+        # Starlette cancels a disconnected StreamingResponse by cancelling its task group scope
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(send_body)
+            await anyio.sleep(0.12)
+            task_group.cancel_scope.cancel()
+        await asyncio.sleep(0.01)
+        
+        stored = (await _stored_messages(db_manager, conversation_id))
+        if policy == DISCONNECT_DISCARD:
+            assert len(stored) == 2
+        else:
+            assert streamed
+            assert stored[2] == (3, MessageRole.USER, "Tell me a story")
+            assert stored[3] == (4, MessageRole.ASSISTANT, "".join(streamed))
+    
+    def test_unknown_policy_is_rejected(self):
+        with pytest.raises(ValueError):
+            ConversationService(LLMService(provider="mock"), RAGService(), disconnect_policy="keep_everything")
 
 
 class TestEndToEndWorkflow: